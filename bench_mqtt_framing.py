@@ -0,0 +1,124 @@
+"""
+MQTT接收分帧基准测试：对比旧的 bytes 拼接/切片方式与 PacketFramer。
+模拟ESP32发送的Base64摄像头帧按不同大小的TCP分段到达，统计每帧在用户态复制的字节数和耗时
+（不含从内核读取数据本身的那一次复制）。
+
+用法: python bench_mqtt_framing.py [帧数]
+"""
+import sys
+import time
+import base64
+import struct
+from core.mqtt_framer import PacketFramer
+
+
+def encode_length(length):
+    encoded = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        encoded.append(byte | 128 if length else byte)
+        if not length:
+            return bytes(encoded)
+
+
+def camera_packet(size):
+    topic = "siot/摄像头".encode("utf-8")
+    image = b"\xff\xd8" + bytes(range(256)) * (size // 256) + b"\xff\xd9"
+    body = struct.pack(">H", len(topic)) + topic + b"data:image/jpeg;base64," + base64.b64encode(image)
+    return bytes([0x30]) + encode_length(len(body)) + body
+
+
+def split_stream(stream, chunk_size):
+    return [stream[i:i + chunk_size] for i in range(0, len(stream), chunk_size)]
+
+
+def decode_remaining_length(data, pos):
+    multiplier, value = 1, 0
+    while True:
+        byte = data[pos]
+        value += (byte & 127) * multiplier
+        multiplier *= 128
+        pos += 1
+        if not byte & 128:
+            return value, pos
+
+
+def legacy_framing(chunks):
+    """旧实现：buffer += data，buffer = buffer[total_length:]，payload = packet[pos:]"""
+    copied = 0
+    packets = 0
+    buffer = b""
+    for data in chunks:
+        copied += len(buffer) + len(data)
+        buffer += data
+        while len(buffer) >= 2:
+            remaining, header_end = decode_remaining_length(buffer, 1)
+            total = header_end + remaining
+            if len(buffer) < total:
+                break
+            packet = buffer[:total]
+            buffer = buffer[total:]
+            copied += total + len(buffer)
+            topic_len = struct.unpack(">H", packet[header_end:header_end + 2])[0]
+            payload = packet[header_end + 2 + topic_len:]
+            copied += len(payload)
+            packets += 1
+    return packets, copied
+
+
+class ChunkSocket:
+    """按分段返回数据的假套接字；与TCP一样，缓冲区放不下的部分留到下一次 recv_into"""
+
+    def __init__(self, chunks):
+        self.chunks = list(reversed(chunks))
+
+    def recv_into(self, view, size):
+        if not self.chunks:
+            return 0
+        data = self.chunks.pop()
+        n = min(size, len(data))
+        view[:n] = data[:n]
+        if n < len(data):
+            self.chunks.append(data[n:])
+        return n
+
+
+def framer_framing(chunks):
+    """PacketFramer：recv_into 到可增长缓冲区，包与载荷都是 memoryview 切片"""
+    framer = PacketFramer()
+    sock = ChunkSocket(chunks)
+    packets = 0
+    while framer.recv_into(sock, 262144):
+        while True:
+            item = framer.next_packet()
+            if item is None:
+                break
+            _, packet = item
+            remaining, header_end = decode_remaining_length(packet, 1)
+            topic_len = struct.unpack(">H", packet[header_end:header_end + 2])[0]
+            payload = packet[header_end + 2 + topic_len:]
+            packets += 1
+    return packets, framer.bytes_copied
+
+
+def run(frames=50, image_size=200 * 1024):
+    packet = camera_packet(image_size)
+    stream = packet * frames
+    print(f"每帧 {len(packet) / 1024:.0f} KB (Base64), 共 {frames} 帧\n")
+    print(f"{'分段大小':>10} | {'实现':<12} | {'每帧复制':>12} | {'复制/帧大小':>10} | {'耗时':>9}")
+    print("-" * 66)
+    for chunk_size in (1460, 16 * 1024, 256 * 1024):
+        chunks = split_stream(stream, chunk_size)
+        for name, func in (("bytes 拼接", legacy_framing), ("PacketFramer", framer_framing)):
+            start = time.perf_counter()
+            packets, copied = func(chunks)
+            elapsed = time.perf_counter() - start
+            assert packets == frames, (name, packets)
+            per_frame = copied / frames
+            print(f"{chunk_size:>10} | {name:<12} | {per_frame / 1024:>9.0f} KB | {per_frame / len(packet):>9.2f}x | "
+                  f"{elapsed * 1000:>6.1f} ms")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
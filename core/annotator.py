@@ -0,0 +1,124 @@
+import cv2
+import math
+import threading
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+_font_cache = {}
+_font_lock = threading.Lock()
+
+
+def get_label_font(size=20):
+    """加载标签字体（只在第一次调用时读取字体文件）"""
+    with _font_lock:
+        font = _font_cache.get(size)
+        if font is None:
+            # Load Font (Try Microsoft YaHei)
+            try:
+                font = ImageFont.truetype("msyh.ttc", size)
+            except:
+                try:
+                    font = ImageFont.truetype("simhei.ttf", size)
+                except:
+                    font = ImageFont.load_default()
+            _font_cache[size] = font
+        return font
+
+
+class Annotator:
+    """
+    基于OpenCV/NumPy的检测结果绘制器。
+    每个类别的 "EN (中文) " 标签和每个置信度文本只用PIL渲染一次并缓存为BGR精灵图，
+    之后每帧只需画矩形框并把精灵图拷贝到画面上。
+    """
+
+    BOX_COLOR = (0, 255, 0)      # BGR
+    TEXT_COLOR = (0, 0, 0)       # RGB (PIL)
+    LABEL_BG = (0, 255, 0)       # RGB (PIL)
+    BOX_THICKNESS = 3
+    PADDING = 2
+
+    def __init__(self, font_size=20):
+        self.font = get_label_font(font_size)
+        # 所有精灵图使用相同高度，保证类别名和置信度拼接后基线对齐
+        try:
+            ascent, descent = self.font.getmetrics()
+        except AttributeError:
+            ascent, descent = font_size, 0
+        self.text_offset = 0
+        try:
+            # 去掉字体顶部的留白，与原PIL绘制的标签高度接近
+            self.text_offset = self.font.getbbox("Ag中")[1]
+        except Exception:
+            pass
+        self.sprite_height = ascent + descent - self.text_offset + self.PADDING * 2
+        self._class_sprites = {}
+        self._conf_sprites = {}
+
+    def render_sprite(self, text, pad_left=0, pad_right=0):
+        try:
+            text_width = math.ceil(self.font.getlength(text))
+        except AttributeError:
+            text_width = self.font.getbbox(text)[2]
+        width = max(1, text_width + pad_left + pad_right)
+
+        img = Image.new("RGB", (width, self.sprite_height), self.LABEL_BG)
+        draw = ImageDraw.Draw(img)
+        draw.text((pad_left, self.PADDING - self.text_offset), text, fill=self.TEXT_COLOR, font=self.font)
+        # RGB -> BGR，保存为连续内存方便直接切片拷贝
+        return np.ascontiguousarray(np.asarray(img)[:, :, ::-1])
+
+    def class_sprite(self, name_en, name_cn):
+        key = (name_en, name_cn)
+        sprite = self._class_sprites.get(key)
+        if sprite is None:
+            sprite = self.render_sprite(f"{name_en} ({name_cn}) ", pad_left=self.PADDING)
+            self._class_sprites[key] = sprite
+        return sprite
+
+    def conf_sprite(self, confidence):
+        # 置信度只显示两位小数，最多只有101种文本
+        text = f"{confidence:.2f}"
+        sprite = self._conf_sprites.get(text)
+        if sprite is None:
+            sprite = self.render_sprite(text, pad_right=self.PADDING)
+            self._conf_sprites[text] = sprite
+        return sprite
+
+    @staticmethod
+    def blit(image, sprite, x, y):
+        """把精灵图拷贝到 (x, y)，自动裁剪超出画面的部分"""
+        img_h, img_w = image.shape[:2]
+        sp_h, sp_w = sprite.shape[:2]
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + sp_w, img_w), min(y + sp_h, img_h)
+        if x0 >= x1 or y0 >= y1:
+            return
+        image[y0:y1, x0:x1] = sprite[y0 - y:y1 - y, x0 - x:x1 - x]
+
+    def draw(self, image, detections):
+        """Draw boxes and "English (Chinese) conf" labels on a copy of the image"""
+        annotated = image.copy()
+        boxes = detections.boxes_for(image.shape).astype(np.int32).tolist()
+        for (x1, y1, x2, y2), conf, cls_id in zip(boxes, detections.conf.tolist(), detections.cls.tolist()):
+            cv2.rectangle(annotated, (x1, y1), (x2, y2), self.BOX_COLOR, self.BOX_THICKNESS)
+
+            class_sprite = self.class_sprite(detections.class_name_en(cls_id), detections.class_name_cn(cls_id))
+            conf_sprite = self.conf_sprite(conf)
+            label_y = y1 - self.sprite_height
+            self.blit(annotated, class_sprite, x1, label_y)
+            self.blit(annotated, conf_sprite, x1 + class_sprite.shape[1], label_y)
+        return annotated
+
+
+_annotator = None
+_annotator_lock = threading.Lock()
+
+
+def get_annotator():
+    """进程共享的绘制器，精灵图缓存在所有推理线程之间复用"""
+    global _annotator
+    with _annotator_lock:
+        if _annotator is None:
+            _annotator = Annotator()
+        return _annotator
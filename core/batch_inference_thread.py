@@ -1,68 +1,148 @@
 import cv2
 import os
+import time
+import numpy as np
 from PySide6.QtCore import QThread, Signal
 from core.inference import YoloInference
+from core.result_cache import get_result_cache
 
 class BatchInferenceThread(QThread):
-    progress_updated = Signal(int, int, str)
-    result_ready = Signal(str, object, object, list)
+    progress_updated = Signal(int, int, str, float)  # current, total, message, throughput (images/s)
+    result_ready = Signal(str, object, object)  # filename, image, Detections
     batch_finished = Signal(int)
     error_occurred = Signal(str)
 
-    def __init__(self, image_paths, model_path, conf_threshold, classes_dict, device="cpu"):
+    def __init__(self, image_paths, model_path, conf_threshold, classes_dict, device="cpu", batch_size=8, backend="torch", tiling_config=None):
         super().__init__()
         self.image_paths = image_paths
         self.model_path = model_path
         self.conf_threshold = conf_threshold
         self.classes_dict = classes_dict
         self.device = device
+        self.backend = backend
+        self.batch_size = max(1, int(batch_size))
+        # High-resolution images: each image is sliced and its tiles are batched instead
+        self.tiling = tiling_config if tiling_config and tiling_config.get("enabled", False) else None
         self.running = True
         self.results = []
 
     def run(self):
+        self.yolo = None
         try:
-            self.yolo = YoloInference(self.model_path, self.conf_threshold, self.classes_dict, self.device)
+            self.yolo = YoloInference(self.model_path, self.conf_threshold, self.classes_dict, self.device, self.backend)
             total = len(self.image_paths)
-            
-            for idx, path in enumerate(self.image_paths):
+            processed = 0
+            start_time = time.time()
+
+            for chunk_start in range(0, total, self.batch_size):
                 if not self.running:
                     break
-                
-                try:
-                    filename = os.path.basename(path)
-                    self.progress_updated.emit(idx + 1, total, f"正在处理: {filename}")
-                    
-                    img = cv2.imread(path)
+
+                chunk_paths = self.image_paths[chunk_start:chunk_start + self.batch_size]
+
+                # Read the whole chunk first, skipping unreadable files.
+                # Duplicate files (same bytes) are answered from the result cache
+                # and only decoded/inferred once.
+                cache = get_result_cache()
+                self.yolo.sync_active_model()
+                settings = self.yolo.cache_settings()
+                if self.tiling:
+                    settings += (self.tiling.get("tile_size", 640), self.tiling.get("overlap", 0.2),
+                                 self.tiling.get("include_full", True))
+                entries = []   # [path, image, detections, inference_time]
+                pending = {}   # cache key -> indices into entries still waiting for inference
+                orig_shapes = {}  # cache key -> original (h, w) when decoded at reduced size
+                for path in chunk_paths:
+                    try:
+                        data = np.fromfile(path, np.uint8)
+                    except OSError:
+                        data = None
+                    if data is None or data.size == 0:
+                        self.error_occurred.emit(f"无法读取图片: {os.path.basename(path)}")
+                        continue
+                    key = cache.make_key(data, settings)
+                    if key in pending:
+                        pending[key].append(len(entries))
+                        entries.append([path, None, None, 0.0])
+                        continue
+                    cached = cache.get(key)
+                    if cached is not None:
+                        entries.append([path, cached[0], cached[1], 0.0])
+                        continue
+                    if self.tiling:
+                        # Tiling needs the full-resolution image
+                        img = cv2.imdecode(data, cv2.IMREAD_COLOR)
+                    else:
+                        img, orig_shapes[key] = self.yolo.decode(data)
                     if img is None:
-                        self.error_occurred.emit(f"无法读取图片: {filename}")
+                        self.error_occurred.emit(f"无法读取图片: {os.path.basename(path)}")
+                        continue
+                    pending[key] = [len(entries)]
+                    entries.append([path, img, None, 0.0])
+
+                if pending:
+                    keys = list(pending)
+                    images = [entries[pending[k][0]][1] for k in keys]
+                    try:
+                        # Headless: detections only, the UI draws the result it actually shows
+                        if self.tiling:
+                            outputs = [self.predict_tiled(img) for img in images]
+                        else:
+                            outputs = self.yolo.predict_batch(images, self.batch_size, annotate=False,
+                                                              orig_shapes=[orig_shapes.get(k) for k in keys])
+                    except Exception as e:
+                        first = entries[pending[keys[0]][0]][0]
+                        self.error_occurred.emit(f"处理图片 {os.path.basename(first)} 等 {len(images)} 张时出错: {str(e)}")
+                        outputs = []
+
+                    for key, img, (detections, _, inference_time) in zip(keys, images, outputs):
+                        cache.put(key, img, detections)
+                        for i, idx in enumerate(pending[key]):
+                            entries[idx][1:] = [img, detections, inference_time if i == 0 else 0.0]
+
+                for path, img, detections, inference_time in entries:
+                    if detections is None:
                         continue
-                    
-                    detections, annotated, inference_time = self.yolo.predict(img)
-                    
+                    filename = os.path.basename(path)
                     result = {
                         'path': path,
                         'filename': filename,
                         'original_image': img,
-                        'annotated_image': annotated,
                         'detections': detections,
                         'inference_time': inference_time
                     }
                     self.results.append(result)
-                    
-                    self.result_ready.emit(filename, img, annotated, detections)
-                    
-                except Exception as e:
-                    self.error_occurred.emit(f"处理图片 {os.path.basename(path)} 时出错: {str(e)}")
-                    continue
-            
+                    self.result_ready.emit(filename, img, detections)
+
+                processed += len(chunk_paths)
+                elapsed = time.time() - start_time
+                throughput = processed / elapsed if elapsed > 0 else 0.0
+                self.progress_updated.emit(processed, total, f"已处理: {os.path.basename(chunk_paths[-1])}", throughput)
+
             self.batch_finished.emit(len(self.results))
-            
+
         except Exception as e:
             self.error_occurred.emit(f"批量推理初始化失败: {str(e)}")
+        finally:
+            if self.yolo:
+                self.yolo.release()
+
+    def predict_tiled(self, img):
+        detections, _, inference_time, tile_times = self.yolo.predict_tiled(
+            img,
+            tile_size=self.tiling.get("tile_size", 640),
+            overlap=self.tiling.get("overlap", 0.2),
+            batch_size=self.batch_size,
+            include_full=self.tiling.get("include_full", True),
+            annotate=False
+        )
+        print(f"[BatchInferenceThread] 切块推理 {len(tile_times)} 块, 总耗时 {inference_time:.1f}ms, "
+              f"每块平均 {sum(tile_times) / len(tile_times):.1f}ms")
+        return detections, None, inference_time
 
     def stop(self):
         self.running = False
         self.wait()
 
     def get_results(self):
-        return self.results
\ No newline at end of file
+        return self.results
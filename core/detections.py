@@ -0,0 +1,123 @@
+import json
+import numpy as np
+
+
+class Detections:
+    """
+    一帧的检测结果，以连续的NumPy数组保存：
+        xyxy: (N, 4) float32 边界框
+        conf: (N,)   float32 置信度
+        cls:  (N,)   int32   类别ID
+        track_id: (N,) int32 跟踪ID，未经过跟踪器时为 None
+        orig_shape: 坐标所在的原图 (h, w)；缩小解码的帧上推理时设置，绘制时按实际帧缩放
+    热路径上不创建逐框的Python对象；界面和MQTT需要的字典/JSON视图按需生成并缓存。
+    迭代、下标和 len() 与原来的字典列表保持兼容。
+    """
+
+    __slots__ = ('xyxy', 'conf', 'cls', 'track_id', 'orig_shape', 'names', 'classes_dict', '_dicts')
+
+    def __init__(self, xyxy, conf, cls, names=None, classes_dict=None, track_id=None, orig_shape=None):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+        self.track_id = track_id
+        self.orig_shape = orig_shape
+        self.names = names or {}
+        self.classes_dict = classes_dict
+        self._dicts = None
+
+    @classmethod
+    def empty(cls, names=None, classes_dict=None):
+        return cls(np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int32),
+                   names, classes_dict)
+
+    @classmethod
+    def from_result(cls, r, names=None, classes_dict=None):
+        """从 ultralytics 的单张结果中一次性取出所有框"""
+        # boxes.data: (N, 6) [x1, y1, x2, y2, conf, cls]，跟踪模式下在cls前多一列id
+        data = r.boxes.data.cpu().numpy()
+        return cls(
+            np.ascontiguousarray(data[:, :4], dtype=np.float32),
+            np.ascontiguousarray(data[:, -2], dtype=np.float32),
+            data[:, -1].astype(np.int32),
+            names, classes_dict
+        )
+
+    def __len__(self):
+        return len(self.conf)
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __getitem__(self, index):
+        return self.to_list()[index]
+
+    def __repr__(self):
+        return f"Detections(n={len(self)})"
+
+    def select(self, index):
+        """按布尔掩码或下标数组取子集"""
+        return Detections(self.xyxy[index], self.conf[index], self.cls[index], self.names, self.classes_dict,
+                          None if self.track_id is None else self.track_id[index], self.orig_shape)
+
+    def rescaled(self, frame_shape, orig_shape):
+        """把在缩小帧 (frame_shape) 上得到的框映射回原图 (orig_shape) 坐标"""
+        sx = orig_shape[1] / frame_shape[1]
+        sy = orig_shape[0] / frame_shape[0]
+        xyxy = self.xyxy * np.array([sx, sy, sx, sy], np.float32)
+        return Detections(xyxy, self.conf, self.cls, self.names, self.classes_dict, self.track_id, tuple(orig_shape[:2]))
+
+    def boxes_for(self, frame_shape):
+        """返回适用于给定帧尺寸的框坐标（原图坐标的检测结果画在缩小帧上时缩放）"""
+        if self.orig_shape is None or tuple(frame_shape[:2]) == tuple(self.orig_shape):
+            return self.xyxy
+        sx = frame_shape[1] / self.orig_shape[1]
+        sy = frame_shape[0] / self.orig_shape[0]
+        return self.xyxy * np.array([sx, sy, sx, sy], np.float32)
+
+    def class_name_en(self, cls_id):
+        return self.names.get(cls_id, str(cls_id))
+
+    def class_name_cn(self, cls_id):
+        if self.classes_dict and str(cls_id) in self.classes_dict:
+            return self.classes_dict[str(cls_id)]
+        return "未知"
+
+    def class_names_cn(self):
+        return [self.class_name_cn(c) for c in self.cls.tolist()]
+
+    def to_list(self):
+        """字典视图（与旧版检测结果格式相同），首次访问时生成"""
+        if self._dicts is None:
+            self._dicts = [
+                {
+                    "class_id": c,
+                    "class_name_en": self.class_name_en(c),
+                    "class_name_cn": self.class_name_cn(c),
+                    "confidence": p,
+                    "bbox": box
+                }
+                for box, p, c in zip(self.xyxy.tolist(), self.conf.tolist(), self.cls.tolist())
+            ]
+            if self.track_id is not None:
+                for d, t in zip(self._dicts, self.track_id.tolist()):
+                    d["track_id"] = t
+        return self._dicts
+
+    def to_json(self):
+        return json.dumps(self.to_list(), ensure_ascii=False)
+
+
+def box_iou(a, b):
+    """
+    计算两组框的IoU矩阵。
+    a: (N, 4) xyxy, b: (M, 4) xyxy -> (N, M)
+    """
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), np.float32)
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(br - tl, 0, None).prod(axis=2)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
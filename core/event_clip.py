@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import queue
+import datetime
+import threading
+from collections import deque
+import cv2
+import numpy as np
+from core.annotator import get_annotator
+
+
+class EventClipBuffer:
+    """
+    事件触发录像：每路画面保留最近 pre_seconds 秒的JPEG环形缓冲（存压缩字节而不是原始数组，内存有上限），
+    检测到指定类别且置信度达到阈值时，把缓冲内容和之后 post_seconds 秒的画面保存为一个MP4片段。
+    目标一直在画面中时事件会不断延长，单个片段超过 max_clip_seconds 秒或 max_clip_mb 时先保存，再接着录下一段。
+    JPEG编码和触发判断在缓冲线程完成，片段写盘在单独的线程完成，调用方只做一次非阻塞入队。
+    """
+
+    def __init__(self, name, output_dir, trigger_classes=None, min_confidence=0.6, pre_seconds=5.0,
+                 post_seconds=5.0, fps=10, jpeg_quality=80, max_buffer_mb=64, queue_size=30,
+                 max_clip_seconds=60.0, max_clip_mb=128):
+        self.name = name
+        self.output_dir = output_dir
+        # 类别ID、英文名或中文名，空表示任意类别都触发
+        self.trigger_classes = {str(c).strip() for c in (trigger_classes or []) if str(c).strip()}
+        self.min_confidence = min_confidence
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.fps = fps
+        self.jpeg_params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        self.max_buffer_bytes = max_buffer_mb * 1024 * 1024
+        self.max_clip_seconds = max_clip_seconds
+        self.max_clip_bytes = max_clip_mb * 1024 * 1024
+        self.max_triggers = 100    # 每个片段最多记录的触发信息条数
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.ring = deque()        # (timestamp, jpeg_bytes)
+        self.ring_bytes = 0
+        self.last_sample = 0.0
+        self.event = None          # 正在收集的事件: {'frames', 'bytes', 'until', 'triggers', 'trigger_count', 'started'}
+        self.running = False
+        self._thread = None
+        self._writers = []
+        self.dropped = 0
+        self.clips = 0
+        self.last_clip = None
+
+    def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.running = True
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.running = False
+        if self._thread:
+            self._thread.join(timeout=5.0)
+        for writer in self._writers:
+            writer.join(timeout=10.0)
+
+    def write(self, frame, detections):
+        """提交一帧及其检测结果；缓冲线程跟不上时丢弃并返回 False"""
+        if not self.running:
+            return False
+        try:
+            self.queue.put_nowait((frame, detections, time.time()))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def matches(self, detections):
+        """返回满足触发条件的 [(类别名, 置信度), ...]"""
+        if detections is None or len(detections) == 0:
+            return []
+        hits = []
+        for cls_id, conf in zip(detections.cls.tolist(), detections.conf.tolist()):
+            if conf < self.min_confidence:
+                continue
+            name_cn = detections.class_name_cn(cls_id)
+            name_en = detections.class_name_en(cls_id)
+            if not self.trigger_classes or self.trigger_classes & {str(cls_id), name_cn, name_en}:
+                hits.append((name_cn if name_cn != "未知" else name_en, round(conf, 3)))
+        return hits
+
+    def run(self):
+        while self.running or not self.queue.empty():
+            try:
+                frame, detections, timestamp = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                self.check_event_end(time.time())
+                continue
+            try:
+                self.process(frame, detections, timestamp)
+            except Exception as e:
+                print(f"[EventClip] {self.name} 处理失败: {e}")
+        # 停止时把正在收集的事件直接保存
+        if self.event:
+            self.finish_event()
+
+    def process(self, frame, detections, timestamp):
+        hits = self.matches(detections)
+        if self.event and hits:
+            # 事件期间再次触发则延长录制
+            self.event['until'] = timestamp + self.post_seconds
+            self.add_triggers(hits)
+        # 按片段帧率采样，避免高帧率画面占满缓冲；只有开始事件的触发帧不受采样限制
+        if timestamp - self.last_sample < 1.0 / self.fps and not (hits and not self.event):
+            self.check_event_end(timestamp)
+            return
+        self.last_sample = timestamp
+
+        image = get_annotator().draw(frame, detections) if detections is not None and len(detections) else frame
+        ok, buf = cv2.imencode(".jpg", image, self.jpeg_params)
+        if not ok:
+            return
+        item = (timestamp, buf.tobytes())
+
+        if self.event:
+            self.event['frames'].append(item)
+            self.event['bytes'] += len(item[1])
+            if (timestamp - self.event['started'] >= self.max_clip_seconds
+                    or self.event['bytes'] >= self.max_clip_bytes):
+                # 片段达到上限：先保存，仍在录制时间内则接着开始下一段
+                until = self.event['until']
+                self.finish_event()
+                if timestamp < until:
+                    self.event = self.new_event([], until, timestamp)
+            else:
+                self.check_event_end(timestamp)
+        elif hits:
+            print(f"[EventClip] {self.name} 触发事件: {hits}")
+            self.event = self.new_event(list(self.ring) + [item], timestamp + self.post_seconds, timestamp)
+            self.add_triggers(hits)
+            self.ring.clear()
+            self.ring_bytes = 0
+        else:
+            self.push_ring(item)
+
+    def new_event(self, frames, until, started):
+        return {
+            'frames': frames,
+            'bytes': sum(len(data) for _, data in frames),
+            'until': until,
+            'triggers': [],
+            'trigger_count': 0,
+            'started': started
+        }
+
+    def add_triggers(self, hits):
+        event = self.event
+        event['trigger_count'] += len(hits)
+        room = self.max_triggers - len(event['triggers'])
+        if room > 0:
+            event['triggers'].extend(hits[:room])
+
+    def push_ring(self, item):
+        self.ring.append(item)
+        self.ring_bytes += len(item[1])
+        # 按时间和字节数双重限制
+        while self.ring and (item[0] - self.ring[0][0] > self.pre_seconds or self.ring_bytes > self.max_buffer_bytes):
+            _, old = self.ring.popleft()
+            self.ring_bytes -= len(old)
+
+    def check_event_end(self, now):
+        if self.event and now >= self.event['until']:
+            self.finish_event()
+
+    def finish_event(self):
+        event, self.event = self.event, None
+        if not event['frames']:
+            return
+        stamp = datetime.datetime.fromtimestamp(event['started']).strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(self.output_dir, f"{self.name}_event_{stamp}_{self.clips}.mp4")
+        self.clips += 1
+        self.last_clip = path
+        writer = threading.Thread(target=self.write_clip, args=(path, event), daemon=True)
+        writer.start()
+        self._writers = [w for w in self._writers if w.is_alive()] + [writer]
+
+    def write_clip(self, path, event):
+        """解码缓冲中的JPEG并按时间戳写成MP4，同时保存触发信息"""
+        frames = event['frames']
+        first = cv2.imdecode(np.frombuffer(frames[0][1], np.uint8), cv2.IMREAD_COLOR)
+        size = (first.shape[1], first.shape[0])
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), self.fps, size)
+        if not writer.isOpened():
+            print(f"[EventClip] 无法创建片段文件: {path}")
+            return
+        start = frames[0][0]
+        written = 0
+        for timestamp, data in frames:
+            image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                continue
+            if (image.shape[1], image.shape[0]) != size:
+                image = cv2.resize(image, size)
+            due = int((timestamp - start) * self.fps) + 1
+            while written < due:
+                writer.write(image)
+                written += 1
+        writer.release()
+
+        with open(os.path.splitext(path)[0] + ".json", "w", encoding="utf-8") as f:
+            json.dump({
+                'source': self.name,
+                'start': datetime.datetime.fromtimestamp(frames[0][0]).isoformat(),
+                'end': datetime.datetime.fromtimestamp(frames[-1][0]).isoformat(),
+                'trigger_count': event['trigger_count'],
+                'triggers': event['triggers']
+            }, f, ensure_ascii=False, indent=2)
+        print(f"[EventClip] 已保存事件片段: {path}")
+
+    def stats(self):
+        return {
+            'buffered_frames': len(self.ring),
+            'buffer_bytes': self.ring_bytes,
+            'recording': self.event is not None,
+            'clips': self.clips,
+            'dropped': self.dropped,
+            'last_clip': self.last_clip
+        }
@@ -0,0 +1,73 @@
+import cv2
+import numpy as np
+
+# JPEG DCT缩放解码：缩小倍数 -> OpenCV 读取标志
+REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# 带尺寸信息的SOF标记（排除 DHT=C4、JPG=C8、DAC=CC）
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def jpeg_size(data):
+    """只解析JPEG头中的SOF段，返回 (width, height)；不是JPEG或头不完整时返回 None"""
+    data = memoryview(data).cast("B")
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    i = 2
+    n = len(data)
+    while i + 4 <= n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            # 填充字节
+            i += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        length = (data[i + 2] << 8) | data[i + 3]
+        if marker in SOF_MARKERS:
+            if i + 9 > n:
+                return None
+            height = (data[i + 5] << 8) | data[i + 6]
+            width = (data[i + 7] << 8) | data[i + 8]
+            return width, height
+        if marker == 0xDA:
+            # 已到扫描数据，之后不会再有SOF
+            return None
+        i += 2 + length
+    return None
+
+
+def reduction_factor(width, height, min_size):
+    """满足缩小后长边仍不小于 min_size（模型输入尺寸）的最大缩小倍数"""
+    for factor, flag in REDUCED_FLAGS:
+        if max(width, height) / factor >= min_size:
+            return factor, flag
+    return 1, cv2.IMREAD_COLOR
+
+
+def decode_image(data, min_size=None):
+    """
+    解码编码后的图片字节。给定 min_size 时，对JPEG使用DCT缩放解码（1/2、1/4、1/8），
+    解码出的长边不小于 min_size，模型随后缩放到输入尺寸时不会损失细节。
+    返回 (frame, orig_shape)：orig_shape 为原图 (h, w)，没有缩小时为 None。
+    """
+    buf = data if isinstance(data, np.ndarray) else np.frombuffer(data, np.uint8)
+    size = jpeg_size(buf) if min_size else None
+    if size:
+        factor, flag = reduction_factor(size[0], size[1], min_size)
+        if factor > 1:
+            frame = cv2.imdecode(buf, flag)
+            if frame is not None:
+                width, height = size
+                # imdecode 会按EXIF方向旋转，原图宽高跟随解码结果的方向
+                if (frame.shape[1] > frame.shape[0]) != (width > height) and width != height:
+                    width, height = height, width
+                return frame, (height, width)
+    return cv2.imdecode(buf, cv2.IMREAD_COLOR), None
@@ -1,107 +1,249 @@
-from ultralytics import YOLO
-import cv2
 import time
-from PIL import Image, ImageDraw, ImageFont
-import numpy as np
 import os
 import sys
+from core.model_pool import get_model_pool
+from core.annotator import get_annotator
+from core.detections import Detections
+from core.result_cache import cached_decode_infer
+from core.tiling import tile_grid, merge_tile_detections
+from core.image_decode import decode_image
+
+def resolve_model_path(model_path):
+    """模型文件名 -> 程序目录（打包后为 _MEIPASS）下的完整路径"""
+    if getattr(sys, 'frozen', False):
+        base_path = sys._MEIPASS
+    else:
+        base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base_path, model_path)
+
 
 class YoloInference:
-    def __init__(self, model_path="yolov8n.pt", conf_threshold=0.5, classes_dict=None, device="cpu"):
-        if getattr(sys, 'frozen', False):
-            base_path = sys._MEIPASS
-        else:
-            base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        
-        self.model_path = os.path.join(base_path, model_path)
+    def __init__(self, model_path="yolov8n.pt", conf_threshold=0.5, classes_dict=None, device="cpu", backend="torch"):
+        self.model_path = resolve_model_path(model_path)
         self.conf_threshold = conf_threshold
         self.classes_dict = classes_dict
         self.device = device
+        self.backend = backend
         self.model = None
-        self.init_model()
+        # 跟随 ModelSwapThread 发布的模型热切换
+        self.follow_active = True
+        # 已有热切换发布的模型时直接从它开始：发布发生在界面更新配置之前，
+        # 此时按配置创建的实例会拿到旧模型却被当作已经同步
+        generation, handle = get_model_pool().acquire_active()
+        self.generation = generation
+        if handle is not None:
+            self.model_path, self.device, self.backend = handle.key
+            self.model = handle
+            print(f"[YoloInference] 使用已发布的模型: {os.path.basename(self.model_path)} ({self.device}/{self.backend})")
+        else:
+            self.init_model()
 
     def init_model(self):
+        pool = get_model_pool()
+        handle = None
+        if self.backend != "torch":
+            try:
+                handle = pool.acquire(self.model_path, self.device, self.backend)
+            except Exception as e:
+                # 导出或加载失败时回退到PyTorch
+                print(f"[YoloInference] {self.backend}后端不可用，回退到torch: {e}")
+                self.backend = "torch"
         try:
-            self.model = YOLO(self.model_path)
-            self.model.to(self.device)
-            print(f"[YoloInference] 模型已加载，使用设备: {self.device}")
+            # 从进程级模型池获取句柄，相同权重/设备只加载一次
+            if handle is None:
+                handle = pool.acquire(self.model_path, self.device, self.backend)
+            print(f"[YoloInference] 模型已加载，使用设备: {self.device}，后端: {self.backend}")
         except Exception as e:
             if self.device != "cpu":
                 raise Exception(f"GPU初始化失败: {str(e)}")
             else:
                 raise e
+        # 先获取新句柄再释放旧句柄，避免同一模型被卸载后重新加载
+        old_model = self.model
+        self.model = handle
+        if old_model is not None:
+            old_model.release()
+
+    def release(self):
+        """释放对共享模型的引用"""
+        if self.model is not None:
+            self.model.release()
+            self.model = None
+
+    def sync_active_model(self):
+        """
+        If a new model/device/backend was published by a hot swap, switch to it.
+        Called at the start of every predict, so the swap happens between frames
+        on the thread that owns this instance and never blocks on loading.
+        """
+        pool = get_model_pool()
+        if not self.follow_active or pool.generation == self.generation:
+            return
+        generation, handle = pool.acquire_active()
+        self.generation = generation
+        if handle is None:
+            return
+        self.model_path, self.device, self.backend = handle.key
+        old_model = self.model
+        self.model = handle
+        if old_model is not None:
+            old_model.release()
+        print(f"[YoloInference] 已热切换模型: {os.path.basename(self.model_path)} ({self.device}/{self.backend})")
 
     def set_device(self, device):
         self.device = device
         self.init_model()
 
-    def predict(self, image):
+    def set_backend(self, backend):
+        """切换推理后端，返回实际生效的后端（导出失败时为torch）"""
+        self.backend = backend
+        self.init_model()
+        return self.backend
+
+    def decode(self, data):
+        """
+        Decode encoded image bytes, using a reduced-size JPEG decode whose long
+        side still covers the model input size.
+        Returns (frame, orig_shape); pass orig_shape to predict() so boxes are
+        reported in original image coordinates.
+        """
+        return decode_image(data, get_model_pool().imgsz)
+
+    def predict(self, image, annotate=True, orig_shape=None):
         """
         Run inference on an image.
         Args:
             image: numpy array (cv2 image)
+            annotate: draw the detections on a copy of the image; pass False
+                      when only detections are needed (annotated_frame is None)
+            orig_shape: (h, w) of the original image when `image` was decoded
+                        at reduced size; boxes are scaled back to it
         Returns:
-            results: list of detections
-            annotated_frame: image with bounding boxes
+            results: Detections (iterates as detection dicts)
+            annotated_frame: image with bounding boxes, or None
             inference_time: time taken in ms
         """
+        self.sync_active_model()
+        return self._predict(image, annotate, orig_shape)
+
+    def _predict(self, image, annotate, orig_shape=None):
         start_time = time.time()
         results = self.model.predict(image, conf=self.conf_threshold, verbose=False)
         end_time = time.time()
         inference_time = (end_time - start_time) * 1000
 
-        # Convert to PIL for drawing Chinese
-        img_pil = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-        draw = ImageDraw.Draw(img_pil)
-        
-        # Load Font (Try Microsoft YaHei)
-        try:
-            font = ImageFont.truetype("msyh.ttc", 20)
-        except:
-            try:
-                font = ImageFont.truetype("simhei.ttf", 20)
-            except:
-                font = ImageFont.load_default()
-
-        detections = []
-        for r in results:
-            boxes = r.boxes
-            for box in boxes:
-                cls_id = int(box.cls[0])
-                # Original English Name
-                cls_name_en = self.model.names[cls_id]
-                # Chinese Name Lookup
-                cls_name_cn = "未知"
-                if self.classes_dict and str(cls_id) in self.classes_dict:
-                    cls_name_cn = self.classes_dict[str(cls_id)]
-                
-                conf = float(box.conf[0])
-                xyxy = box.xyxy[0].tolist()
-                
-                # Draw Box
-                x1, y1, x2, y2 = map(int, xyxy)
-                draw.rectangle([x1, y1, x2, y2], outline=(0, 255, 0), width=3)
-                
-                # Draw Label: English (Chinese)
-                label = f"{cls_name_en} ({cls_name_cn}) {conf:.2f}"
-                # Get text size
-                bbox = draw.textbbox((0, 0), label, font=font)
-                text_width = bbox[2] - bbox[0]
-                text_height = bbox[3] - bbox[1]
-                
-                # Draw label background
-                draw.rectangle([x1, y1 - text_height - 4, x1 + text_width + 4, y1], fill=(0, 255, 0))
-                draw.text((x1 + 2, y1 - text_height - 4), label, fill=(0, 0, 0), font=font)
-
-                detections.append({
-                    "class_id": cls_id,
-                    "class_name_en": cls_name_en,
-                    "class_name_cn": cls_name_cn,
-                    "confidence": conf,
-                    "bbox": xyxy
-                })
-
-        # Convert back to cv2
-        annotated_frame = cv2.cvtColor(np.array(img_pil), cv2.COLOR_RGB2BGR)
+        detections = self.parse_result(results[0], image.shape, orig_shape)
+        annotated_frame = self.draw_detections(image, detections) if annotate else None
 
         return detections, annotated_frame, inference_time
+
+    def predict_batch(self, images, batch_size=8, annotate=True, orig_shapes=None):
+        """
+        Run batched inference on a list of images.
+        Args:
+            images: list of numpy arrays (cv2 images)
+            batch_size: number of images fed to the model at once
+            annotate: same as predict()
+            orig_shapes: optional list of orig_shape per image, see predict()
+        Returns:
+            list of (detections, annotated_frame, inference_time) per image,
+            inference_time is the per-image share of the batch time in ms
+        """
+        self.sync_active_model()
+        return self._predict_batch(images, batch_size, annotate, orig_shapes)
+
+    def _predict_batch(self, images, batch_size, annotate, orig_shapes=None):
+        outputs = []
+        batch_size = max(1, int(batch_size))
+        orig_shapes = orig_shapes or [None] * len(images)
+        for i in range(0, len(images), batch_size):
+            chunk = images[i:i + batch_size]
+            start_time = time.time()
+            results = self.model.predict(chunk, conf=self.conf_threshold, verbose=False)
+            inference_time = (time.time() - start_time) * 1000 / len(chunk)
+
+            for image, r, orig_shape in zip(chunk, results, orig_shapes[i:i + batch_size]):
+                detections = self.parse_result(r, image.shape, orig_shape)
+                annotated_frame = self.draw_detections(image, detections) if annotate else None
+                outputs.append((detections, annotated_frame, inference_time))
+        return outputs
+
+    def predict_tiled(self, image, tile_size=640, overlap=0.2, batch_size=8, include_full=True, annotate=True):
+        """
+        Sliced inference for high-resolution images (drone/DSLR photos).
+        The image is cut into overlapping tiles that are fed to the model in
+        batches, so small objects keep their native resolution.
+        Args:
+            image: numpy array (cv2 image)
+            tile_size: tile edge length in pixels
+            overlap: fraction of the tile shared with its neighbour (0-0.9)
+            batch_size: number of tiles fed to the model at once
+            include_full: also run one downsampled full-image pass so large
+                          objects cut by tile borders are still found
+            annotate: same as predict()
+        Returns:
+            detections: merged Detections in full-image coordinates (class-aware NMS)
+            annotated_frame: image with bounding boxes, or None
+            inference_time: total time in ms
+            tile_times: per-tile time in ms (batch time shared per tile)
+        """
+        self.sync_active_model()
+        h, w = image.shape[:2]
+        tiles = tile_grid(h, w, tile_size, max(0.0, min(overlap, 0.9)))
+        if len(tiles) == 1:
+            # 图片不比切块大，直接整图推理
+            detections, annotated_frame, inference_time = self._predict(image, annotate)
+            return detections, annotated_frame, inference_time, [inference_time]
+
+        start_time = time.time()
+        crops = [image[y1:y2, x1:x2] for x1, y1, x2, y2 in tiles]
+        outputs = self._predict_batch(crops, batch_size, annotate=False)
+        parts = [(d, (x1, y1)) for (d, _, _), (x1, y1, _, _) in zip(outputs, tiles)]
+        tile_times = [t for _, _, t in outputs]
+        if include_full:
+            full, _, _ = self._predict(image, annotate=False)
+            parts.append((full, (0, 0)))
+
+        detections = merge_tile_detections(parts, self.model.names, self.classes_dict)
+        inference_time = (time.time() - start_time) * 1000
+        annotated_frame = self.draw_detections(image, detections) if annotate else None
+        return detections, annotated_frame, inference_time, tile_times
+
+    def cache_settings(self):
+        """Settings that change the result for identical image bytes"""
+        return (self.model_path, self.device, self.backend, self.conf_threshold)
+
+    def predict_encoded(self, data, annotate=False):
+        """
+        Run inference on encoded image bytes (JPEG/PNG) through the result cache.
+        Byte-identical payloads skip both decoding and inference.
+        Returns:
+            frame: decoded image, or None if decoding failed
+            detections, annotated_frame, inference_time: same as predict(),
+            inference_time is 0 on a cache hit
+        """
+        self.sync_active_model()
+        settings = self.cache_settings()
+        inference_time = 0.0
+
+        def infer(frame, orig_shape):
+            nonlocal inference_time
+            detections, _, inference_time = self._predict(frame, False, orig_shape)
+            return detections, settings
+
+        frame, detections, _ = cached_decode_infer(data, settings, infer, get_model_pool().imgsz)
+        if frame is None:
+            return None, None, None, 0.0
+        annotated_frame = self.draw_detections(frame, detections) if annotate else None
+        return frame, detections, annotated_frame, inference_time
+
+    def parse_result(self, r, image_shape=None, orig_shape=None):
+        """Convert one ultralytics result into an array-backed Detections"""
+        detections = Detections.from_result(r, self.model.names, self.classes_dict)
+        if orig_shape is not None:
+            detections = detections.rescaled(image_shape, orig_shape)
+        return detections
+
+    def draw_detections(self, image, detections):
+        """Draw boxes and "English (Chinese) conf" labels on a copy of the image"""
+        return get_annotator().draw(image, detections)
@@ -0,0 +1,241 @@
+import time
+import threading
+from core.inference import YoloInference
+from core.model_pool import get_model_pool
+from core.pipeline import FpsMeter
+
+
+class InferenceRequest:
+    """一次待推理的帧；推理线程完成后通过 done 事件唤醒提交方"""
+
+    __slots__ = ('frame', 'orig_shape', 'submitted_at', 'done', 'detections', 'settings')
+
+    def __init__(self, frame, orig_shape=None):
+        self.frame = frame
+        self.orig_shape = orig_shape
+        self.submitted_at = time.perf_counter()
+        self.done = threading.Event()
+        self.detections = None
+        self.settings = None      # 实际运行推理的模型的结果缓存键设置
+
+
+class SchedulerSource:
+    """
+    一路输入源（摄像头、HTTP流、MQTT等）在调度器中的最新帧槽。
+    每路最多只有一帧在等待，新帧会替换尚未被取走的旧帧（旧帧的等待方拿到 None）。
+    """
+
+    def __init__(self, scheduler, name, priority=1.0):
+        self.scheduler = scheduler
+        self.name = name
+        self.priority = max(float(priority), 0.01)
+        self.pending = None
+        self.vtime = 0.0          # 加权公平调度的虚拟时间，每服务一帧增加 1/priority
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0
+        self.wait_ms = 0.0        # 排队等待时间（指数滑动平均）
+        self.fps = FpsMeter()
+
+    def infer(self, frame, orig_shape=None, timeout=None):
+        """提交一帧并等待结果，返回 Detections；被新帧替换、超时或调度器停止时返回 None"""
+        request = InferenceRequest(frame, orig_shape)
+        self.scheduler.submit(self, request)
+        if not request.done.wait(timeout):
+            return None
+        return request.detections
+
+    def infer_with_settings(self, frame, orig_shape=None, timeout=None):
+        """同 infer，另外返回实际运行这一帧的模型的结果缓存键设置（热切换后与提交时可能不同）"""
+        request = InferenceRequest(frame, orig_shape)
+        self.scheduler.submit(self, request)
+        if not request.done.wait(timeout):
+            return None, None
+        return request.detections, request.settings
+
+    def close(self):
+        self.scheduler.unregister(self)
+
+
+class InferenceScheduler:
+    """
+    多路输入共享一个模型的推理调度器。
+    - 每路输入只保留最新一帧，推理跟不上时丢弃旧帧
+    - 在最大延迟预算内等待更多输入，把不同来源的帧组成一个批次送入模型
+    - 按优先级加权公平：虚拟时间最小的来源优先进入批次，高优先级来源虚拟时间增长更慢
+    """
+
+    def __init__(self, model_path, conf_threshold, classes_dict, device="cpu", backend="torch",
+                 max_batch=4, max_latency_ms=30):
+        self.model_path = model_path
+        self.conf_threshold = conf_threshold
+        self.classes_dict = classes_dict
+        self.device = device
+        self.backend = backend
+        self.max_batch = max(1, int(max_batch))
+        self.max_latency = max_latency_ms / 1000.0
+        self._cond = threading.Condition()
+        self._sources = []
+        self._running = False
+        self._thread = None
+        self.yolo = None
+        self.batches = 0
+        self.batched_frames = 0
+        self.error = None
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=5.0)
+        self.wake_pending()
+
+    def wake_pending(self):
+        """唤醒所有还在等待的提交方（拿到 None）"""
+        with self._cond:
+            for source in self._sources:
+                if source.pending is not None:
+                    source.pending.done.set()
+                    source.pending = None
+
+    def is_running(self):
+        return self._running
+
+    def register(self, name, priority=1.0):
+        source = SchedulerSource(self, name, priority)
+        with self._cond:
+            # 新来源从当前最小虚拟时间开始，不会因为来得晚而长期霸占模型
+            source.vtime = min((s.vtime for s in self._sources), default=0.0)
+            self._sources.append(source)
+        return source
+
+    def unregister(self, source):
+        with self._cond:
+            if source in self._sources:
+                self._sources.remove(source)
+            if source.pending is not None:
+                source.pending.done.set()
+                source.pending = None
+
+    def submit(self, source, request):
+        with self._cond:
+            if not self._running:
+                request.done.set()
+                return
+            if source.pending is not None:
+                # 旧帧还没进入批次就被新帧替换
+                source.dropped += 1
+                source.pending.done.set()
+            source.pending = request
+            source.submitted += 1
+            self._cond.notify()
+
+    def next_batch(self):
+        """等待并取出下一批次，返回 [(source, request), ...]；停止时返回 None"""
+        with self._cond:
+            while self._running and not any(s.pending for s in self._sources):
+                self._cond.wait(0.5)
+            if not self._running:
+                return None
+
+            # 延迟预算：从最早的等待帧算起，最多等 max_latency 凑满批次
+            oldest = min(s.pending.submitted_at for s in self._sources if s.pending)
+            deadline = oldest + self.max_latency
+            while self._running:
+                ready = sum(1 for s in self._sources if s.pending)
+                remaining = deadline - time.perf_counter()
+                if ready >= min(self.max_batch, len(self._sources)) or remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if not self._running:
+                return None
+
+            candidates = sorted((s for s in self._sources if s.pending),
+                                key=lambda s: (s.vtime, s.pending.submitted_at))
+            batch = []
+            for source in candidates[:self.max_batch]:
+                batch.append((source, source.pending))
+                source.pending = None
+                source.vtime += 1.0 / source.priority
+            return batch
+
+    def run(self):
+        yolo = None
+        try:
+            yolo = YoloInference(self.model_path, self.conf_threshold, self.classes_dict, self.device, self.backend)
+            self.yolo = yolo
+            while True:
+                batch = self.next_batch()
+                if batch is None:
+                    break
+                yolo.conf_threshold = self.conf_threshold
+                start = time.perf_counter()
+                try:
+                    outputs = yolo.predict_batch([r.frame for _, r in batch], len(batch), annotate=False,
+                                                 orig_shapes=[r.orig_shape for _, r in batch])
+                    # predict_batch 开始时已同步热切换的模型，这里的设置对应实际运行的模型
+                    settings = yolo.cache_settings()
+                except Exception as e:
+                    print(f"[InferenceScheduler] 批次推理出错: {e}")
+                    outputs = [(None, None, 0.0)] * len(batch)
+                    settings = None
+
+                self.batches += 1
+                self.batched_frames += len(batch)
+                for (source, request), (detections, _, _) in zip(batch, outputs):
+                    wait_ms = (start - request.submitted_at) * 1000
+                    source.wait_ms = wait_ms if source.processed == 0 else source.wait_ms * 0.9 + wait_ms * 0.1
+                    source.processed += 1
+                    source.fps.tick()
+                    request.detections = detections
+                    request.settings = settings
+                    request.done.set()
+        except Exception as e:
+            self.error = str(e)
+            print(f"[InferenceScheduler] 初始化失败: {e}")
+        finally:
+            self._running = False
+            self.yolo = None
+            self.wake_pending()
+            if yolo:
+                yolo.release()
+
+    def cache_settings(self):
+        """
+        共享模型的结果缓存键设置（见 YoloInference.cache_settings），用于查找缓存。
+        模型还没加载完成或有尚未生效的热切换时返回 None，调用方应跳过缓存查找。
+        """
+        yolo = self.yolo
+        if yolo is None or (yolo.follow_active and yolo.generation != get_model_pool().generation):
+            return None
+        if yolo.conf_threshold != self.conf_threshold:
+            # 新的置信度阈值在下一批次才生效
+            return None
+        return yolo.cache_settings()
+
+    def stats(self):
+        with self._cond:
+            sources = list(self._sources)
+        return {
+            'avg_batch': self.batched_frames / self.batches if self.batches else 0.0,
+            'sources': [
+                {
+                    'name': s.name,
+                    'priority': s.priority,
+                    'fps': s.fps.fps(),
+                    'wait_ms': s.wait_ms,
+                    'submitted': s.submitted,
+                    'processed': s.processed,
+                    'dropped': s.dropped
+                }
+                for s in sources
+            ]
+        }
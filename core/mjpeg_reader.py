@@ -0,0 +1,242 @@
+import re
+import socket
+import threading
+from urllib.parse import urlsplit
+from core.pipeline import LatestFrameSlot, FpsMeter
+
+
+class ChunkedDecoder:
+    """HTTP Transfer-Encoding: chunked 解码（ESP32 的 httpd_resp_send_chunk 使用分块传输）"""
+
+    def __init__(self):
+        self.buf = bytearray()
+        self.remaining = 0      # 当前块还剩多少字节未读
+        self.skip_crlf = False  # 块数据后面的 \r\n
+
+    def feed(self, data):
+        self.buf += data
+        out = bytearray()
+        while True:
+            if self.remaining:
+                n = min(self.remaining, len(self.buf))
+                if n == 0:
+                    break
+                out += self.buf[:n]
+                del self.buf[:n]
+                self.remaining -= n
+                if self.remaining == 0:
+                    self.skip_crlf = True
+                continue
+            if self.skip_crlf:
+                if len(self.buf) < 2:
+                    break
+                del self.buf[:2]
+                self.skip_crlf = False
+            end = self.buf.find(b"\r\n")
+            if end < 0:
+                break
+            size = int(bytes(self.buf[:end]).split(b";")[0].strip() or b"0", 16)
+            del self.buf[:end + 2]
+            if size == 0:
+                raise EOFError("chunked stream ended")
+            self.remaining = size
+        return bytes(out)
+
+
+class MultipartParser:
+    """
+    multipart/x-mixed-replace 解析：按 boundary 切出每一帧JPEG。
+    有 Content-Length 时直接按长度截取，否则查找下一个 boundary。
+    """
+
+    def __init__(self, boundary):
+        boundary = boundary.strip('"')
+        if not boundary.startswith("--"):
+            boundary = "--" + boundary
+        self.marker = boundary.encode("latin-1")
+        self.buf = bytearray()
+        self.in_part = False     # 已读完part头，正在等待图片数据
+        self.part_length = None
+
+    def feed(self, data):
+        """送入新数据，返回其中解析出的完整JPEG列表"""
+        self.buf += data
+        frames = []
+        while True:
+            if not self.in_part:
+                idx = self.buf.find(self.marker)
+                if idx < 0:
+                    # 保留尾部，boundary 可能被拆在两次 recv 之间
+                    del self.buf[:max(0, len(self.buf) - len(self.marker))]
+                    break
+                header_end = self.buf.find(b"\r\n\r\n", idx)
+                if header_end < 0:
+                    del self.buf[:idx]
+                    break
+                headers = bytes(self.buf[idx + len(self.marker):header_end])
+                match = re.search(rb"content-length:\s*(\d+)", headers, re.IGNORECASE)
+                self.part_length = int(match.group(1)) if match else None
+                del self.buf[:header_end + 4]
+                self.in_part = True
+
+            if self.part_length is not None:
+                if len(self.buf) < self.part_length:
+                    break
+                jpeg = bytes(self.buf[:self.part_length])
+                del self.buf[:self.part_length]
+            else:
+                end = self.buf.find(self.marker)
+                if end < 0:
+                    break
+                jpeg = bytes(self.buf[:end]).rstrip(b"\r\n")
+                del self.buf[:end]
+
+            self.in_part = False
+            if jpeg.startswith(b"\xff\xd8"):
+                frames.append(jpeg)
+        return frames
+
+
+class MjpegReader:
+    """
+    低延迟MJPEG读取（ESP32-CAM 的 http://...:81/stream）。
+    后台线程直接从socket解析multipart，只保留最新一帧JPEG（不解码），
+    由推理阶段在需要时再解码；连接断开后按指数退避自动重连，不需要重启线程。
+    """
+
+    def __init__(self, url, timeout=5.0, min_backoff=0.5, max_backoff=10.0, recv_size=65536):
+        parts = urlsplit(url)
+        if parts.scheme != "http":
+            raise ValueError(f"仅支持 http:// MJPEG 流: {url}")
+        self.url = url
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        self.timeout = timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.recv_size = recv_size
+        self.slot = LatestFrameSlot()
+        self.fps = FpsMeter()
+        self.on_status = None           # 可选回调 (connected: bool, message: str)
+        self._stop = threading.Event()
+        self._thread = None
+        self._sock = None
+        self.frames = 0
+        self.bytes = 0
+        self.reconnects = 0
+        self.connected = False
+
+    def connect(self):
+        """建立连接并读取响应头，返回 (socket, parser, chunked decoder 或 None, 已读到的body)"""
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        try:
+            request = (f"GET {self.path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+                       f"Accept: multipart/x-mixed-replace\r\nConnection: keep-alive\r\n\r\n")
+            sock.sendall(request.encode("latin-1"))
+
+            head = bytearray()
+            while b"\r\n\r\n" not in head:
+                data = sock.recv(4096)
+                if not data:
+                    raise ConnectionError("连接在响应头之前关闭")
+                head += data
+                if len(head) > 65536:
+                    raise ValueError("HTTP响应头过长")
+            header_end = head.index(b"\r\n\r\n")
+            header_text = bytes(head[:header_end]).decode("latin-1")
+            body = bytes(head[header_end + 4:])
+
+            status_line, *header_lines = header_text.split("\r\n")
+            if " 200" not in status_line:
+                raise ConnectionError(f"HTTP错误: {status_line}")
+            headers = {}
+            for line in header_lines:
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+
+            match = re.search(r"boundary=([^;]+)", headers.get("content-type", ""))
+            if "multipart" not in headers.get("content-type", "") or not match:
+                raise ValueError(f"不是MJPEG流: {headers.get('content-type', '')}")
+            chunked = "chunked" in headers.get("transfer-encoding", "").lower()
+            return sock, MultipartParser(match.group(1)), ChunkedDecoder() if chunked else None, body
+        except Exception:
+            sock.close()
+            raise
+
+    def open(self):
+        """首次连接（同步，失败时抛出异常），成功后启动后台读取线程"""
+        connection = self.connect()
+        self._thread = threading.Thread(target=self.run, args=(connection,), daemon=True)
+        self._thread.start()
+
+    def run(self, connection):
+        backoff = self.min_backoff
+        while not self._stop.is_set():
+            if connection is None:
+                try:
+                    connection = self.connect()
+                except Exception as e:
+                    self.notify(False, f"正在重连 ({backoff:.1f}s): {e}")
+                    self._stop.wait(backoff)
+                    backoff = min(backoff * 2, self.max_backoff)
+                    continue
+                self.reconnects += 1
+
+            sock, parser, decoder, data = connection
+            self._sock = sock
+            self.connected = True
+            self.notify(True, "已连接")
+            try:
+                while not self._stop.is_set():
+                    if decoder:
+                        data = decoder.feed(data)
+                    for jpeg in parser.feed(data):
+                        self.frames += 1
+                        self.fps.tick()
+                        self.slot.put(jpeg)
+                        # 收到完整帧说明连接正常，重置退避时间
+                        backoff = self.min_backoff
+                    data = sock.recv(self.recv_size)
+                    if not data:
+                        raise ConnectionError("连接已关闭")
+                    self.bytes += len(data)
+            except Exception as e:
+                if not self._stop.is_set():
+                    print(f"[MjpegReader] 连接中断: {e}")
+            finally:
+                sock.close()
+                self._sock = None
+                self.connected = False
+                connection = None
+        self.slot.close()
+
+    def notify(self, connected, message):
+        if self.on_status:
+            self.on_status(connected, message)
+
+    def read_latest(self, timeout=None):
+        """等待新的一帧，返回 (jpeg_bytes, timestamp)，超时或已停止时返回 None"""
+        return self.slot.get(timeout)
+
+    def stop(self):
+        self._stop.set()
+        sock = self._sock
+        if sock is not None:
+            # 打断阻塞中的 recv
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._thread:
+            self._thread.join(timeout=2.0)
+        self.slot.close()
+
+    def stats(self):
+        return {
+            'connected': self.connected,
+            'frames': self.frames,
+            'bytes': self.bytes,
+            'reconnects': self.reconnects,
+            'dropped': self.slot.dropped
+        }
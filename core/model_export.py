@@ -0,0 +1,63 @@
+import os
+import shutil
+import hashlib
+from ultralytics import YOLO
+
+# 推理后端 -> ultralytics 导出格式及导出产物后缀
+BACKENDS = {
+    "torch": None,
+    "onnx": ".onnx",
+    # 早期按固定batch导出的IR不能处理批量推理，改名使其不再被复用；目录名必须以 _openvino_model 结尾
+    "openvino": "_dynamic_openvino_model",
+    # INT8量化模型需要校准图片，只能由 core/quantization.py 生成
+    "onnx_int8": "_int8.onnx",
+}
+
+# 以动态batch导出的后端，predict_batch / 视频批量推理一次会送入多张图片
+DYNAMIC_BACKENDS = {"onnx", "openvino"}
+
+EXPORT_CACHE_DIR = ".export_cache"
+
+
+def file_hash(path, length=12):
+    """计算权重文件内容的哈希，用于区分同名但内容不同的模型"""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()[:length]
+
+
+def export_artifact_path(model_path, backend, imgsz=640):
+    """导出产物缓存路径: <权重目录>/.export_cache/<名称>_<哈希>_<imgsz><后缀>"""
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    cache_dir = os.path.join(os.path.dirname(model_path), EXPORT_CACHE_DIR)
+    return os.path.join(cache_dir, f"{stem}_{file_hash(model_path)}_{imgsz}{BACKENDS[backend]}")
+
+
+def get_exported_model(model_path, backend, imgsz=640):
+    """
+    返回指定后端的模型文件路径，首次使用时从 .pt 导出并缓存，之后直接复用。
+    导出失败时抛出异常，由调用方决定是否回退到 torch。
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"不支持的推理后端: {backend}")
+    if BACKENDS[backend] is None:
+        return model_path
+
+    artifact = export_artifact_path(model_path, backend, imgsz)
+    if os.path.exists(artifact):
+        print(f"[ModelExport] 使用已缓存的{backend}模型: {artifact}")
+        return artifact
+    if backend == "onnx_int8":
+        raise FileNotFoundError("尚未生成INT8量化模型，请先在设置中执行INT8量化")
+
+    print(f"[ModelExport] 正在导出{backend}模型 (imgsz={imgsz})，首次导出需要一些时间...")
+    exported = YOLO(model_path).export(format=backend, imgsz=imgsz, dynamic=backend in DYNAMIC_BACKENDS, device="cpu")
+    if not exported or not os.path.exists(exported):
+        raise RuntimeError(f"{backend}模型导出失败")
+
+    os.makedirs(os.path.dirname(artifact), exist_ok=True)
+    shutil.move(str(exported), artifact)
+    print(f"[ModelExport] 导出完成: {artifact}")
+    return artifact
@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+import itertools
+from ultralytics import YOLO
+from core.model_export import get_exported_model
+
+
+def estimate_model_memory(model, model_path=None):
+    """估算模型占用的内存（参数 + 缓冲区字节数）"""
+    try:
+        net = model.model
+        return sum(t.numel() * t.element_size() for t in itertools.chain(net.parameters(), net.buffers()))
+    except Exception:
+        # 非PyTorch后端（或无法访问参数）时退化为权重文件大小
+        if model_path and os.path.isfile(model_path):
+            return os.path.getsize(model_path)
+        return 0
+
+
+class PooledModel:
+    """模型池中的一个条目：同一份 (model_path, device, backend) 只加载一次"""
+
+    def __init__(self, key, model, artifact_path=None):
+        self.key = key
+        self.model = model
+        self.artifact_path = artifact_path or key[0]
+        # 导出的模型（ONNX/OpenVINO）不能用 .to() 切换设备，需要在推理时指定
+        self.predict_kwargs = {} if key[2] == "torch" else {'device': key[1]}
+        # ultralytics 的 predictor 不是线程安全的，同一模型的推理需要串行化
+        self.lock = threading.Lock()
+        self.ref_count = 0
+        self.memory_bytes = estimate_model_memory(model, self.artifact_path)
+        self.loaded_at = time.time()
+        self.inference_count = 0
+
+
+class ModelHandle:
+    """线程安全的推理句柄，接口与 ultralytics YOLO 的 predict/names 保持一致"""
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+        self._released = False
+
+    @property
+    def key(self):
+        return self._entry.key
+
+    @property
+    def names(self):
+        return self._entry.model.names
+
+    def predict(self, source, **kwargs):
+        with self._entry.lock:
+            self._entry.inference_count += 1
+            return self._entry.model.predict(source, **self._entry.predict_kwargs, **kwargs)
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._pool.release(self._entry.key)
+
+
+class ModelPool:
+    """进程级共享模型池，按 (model_path, device, backend) 引用计数"""
+
+    def __init__(self, imgsz=640):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._load_locks = {}
+        # 导出ONNX/OpenVINO时使用的输入尺寸
+        self.imgsz = imgsz
+        # 热切换: 后台预加载完成后发布的生效模型，generation 每次发布加一
+        self.active_handle = None
+        self.generation = 0
+
+    @staticmethod
+    def make_key(model_path, device="cpu", backend="torch"):
+        return (os.path.abspath(model_path), device, backend)
+
+    def acquire(self, model_path, device="cpu", backend="torch"):
+        key = self.make_key(model_path, device, backend)
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        # 按key加锁加载，避免多个线程同时加载同一份权重，同时不阻塞其它模型
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.ref_count += 1
+                    return ModelHandle(self, entry)
+
+            model, artifact_path = self.load_model(key)
+            entry = PooledModel(key, model, artifact_path)
+            entry.ref_count = 1
+            with self._lock:
+                self._entries[key] = entry
+            print(f"[ModelPool] 已加载模型: {os.path.basename(key[0])} ({device}/{backend})")
+        return ModelHandle(self, entry)
+
+    def load_model(self, key):
+        model_path, device, backend = key
+        if backend == "torch":
+            model = YOLO(model_path)
+            model.to(device)
+            return model, model_path
+
+        artifact = get_exported_model(model_path, backend, self.imgsz)
+        return YOLO(artifact, task="detect"), artifact
+
+    def release(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.ref_count -= 1
+            if entry.ref_count > 0:
+                return
+            del self._entries[key]
+        print(f"[ModelPool] 已卸载模型: {os.path.basename(key[0])} ({key[1]}/{key[2]})")
+
+    def publish_active(self, handle):
+        """发布已预加载好的模型句柄，各推理实例在处理下一帧前切换过去"""
+        with self._lock:
+            old = self.active_handle
+            self.active_handle = handle
+            self.generation += 1
+        if old is not None:
+            old.release()
+
+    def acquire_active(self):
+        """获取当前生效模型的新引用，返回 (generation, handle)，未发布过时 handle 为 None"""
+        with self._lock:
+            if self.active_handle is None:
+                return self.generation, None
+            entry = self.active_handle._entry
+            entry.ref_count += 1
+            return self.generation, ModelHandle(self, entry)
+
+    def stats(self):
+        """返回当前已加载模型的统计信息"""
+        with self._lock:
+            entries = list(self._entries.values())
+        return [
+            {
+                'model_path': entry.key[0],
+                'device': entry.key[1],
+                'backend': entry.key[2],
+                'artifact_path': entry.artifact_path,
+                'ref_count': entry.ref_count,
+                'memory_bytes': entry.memory_bytes,
+                'inference_count': entry.inference_count,
+                'loaded_at': entry.loaded_at
+            }
+            for entry in entries
+        ]
+
+
+_model_pool = ModelPool()
+
+
+def get_model_pool():
+    return _model_pool
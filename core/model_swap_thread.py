@@ -0,0 +1,41 @@
+from PySide6.QtCore import QThread, Signal
+from core.inference import resolve_model_path
+from core.model_pool import get_model_pool
+
+class ModelSwapThread(QThread):
+    """
+    在后台加载新的模型/设备/后端，加载期间旧模型继续推理；
+    加载完成后发布到模型池，各推理线程在下一帧前原子切换，无需重启线程。
+    """
+    swap_finished = Signal(str, str, str)  # model_path, device, backend actually loaded
+    error_occurred = Signal(str)
+
+    def __init__(self, model_path, device="cpu", backend="torch"):
+        super().__init__()
+        self.model_path = model_path
+        self.device = device
+        self.backend = backend
+
+    def run(self):
+        pool = get_model_pool()
+        path = resolve_model_path(self.model_path)
+        backend = self.backend
+        try:
+            try:
+                handle = pool.acquire(path, self.device, backend)
+            except Exception as e:
+                if backend == "torch":
+                    raise
+                # 导出或加载失败时回退到PyTorch
+                print(f"[ModelSwapThread] {backend}后端不可用，回退到torch: {e}")
+                backend = "torch"
+                handle = pool.acquire(path, self.device, backend)
+
+            pool.publish_active(handle)
+            print(f"[ModelSwapThread] 新模型已就绪: {self.model_path} ({self.device}/{backend})")
+            self.swap_finished.emit(self.model_path, self.device, backend)
+        except Exception as e:
+            if self.device != "cpu":
+                self.error_occurred.emit(f"GPU初始化失败: {str(e)}")
+            else:
+                self.error_occurred.emit(f"模型加载失败: {str(e)}")
@@ -0,0 +1,67 @@
+import time
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    推理前的轻量变化检测：把画面缩小为灰度块均值图（默认64x36块），
+    与上次推理时的参考图逐块比较，没有明显变化时跳过推理并复用上次的检测结果。
+    """
+
+    def __init__(self, threshold=10, min_changed_blocks=2, refresh_interval=5.0, grid=(64, 36)):
+        self.threshold = threshold                  # 单个块灰度变化超过该值视为变化
+        self.min_changed_blocks = min_changed_blocks  # 变化块数达到该值才触发推理
+        self.refresh_interval = refresh_interval    # 即使画面没变化，最多间隔多少秒强制推理一次
+        self.grid = grid
+        self.reference = None
+        self.last_inference_time = 0.0
+        self.checked = 0
+        self.inferred = 0
+        self.skipped = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """根据 config.json 的 motion 配置创建，未启用时返回 None"""
+        if not config or not config.get("enabled", False):
+            return None
+        return cls(
+            threshold=config.get("threshold", 10),
+            min_changed_blocks=config.get("min_changed_blocks", 2),
+            refresh_interval=config.get("refresh_interval", 5.0)
+        )
+
+    def thumbnail(self, frame):
+        # 先缩小再转灰度，INTER_AREA 得到的每个像素就是对应块的均值
+        small = cv2.resize(frame, self.grid, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small.astype(np.int16)
+
+    def should_infer(self, frame):
+        """返回 True 表示需要推理；返回 False 时调用方应复用上一次的检测结果"""
+        self.checked += 1
+        thumb = self.thumbnail(frame)
+        now = time.time()
+
+        changed = True
+        if self.reference is not None and self.reference.shape == thumb.shape:
+            changed_blocks = np.count_nonzero(np.abs(thumb - self.reference) > self.threshold)
+            changed = changed_blocks >= self.min_changed_blocks
+
+        if changed or now - self.last_inference_time >= self.refresh_interval:
+            self.reference = thumb
+            self.last_inference_time = now
+            self.inferred += 1
+            return True
+
+        self.skipped += 1
+        return False
+
+    def stats(self):
+        return {
+            'checked': self.checked,
+            'inferred': self.inferred,
+            'skipped': self.skipped,
+            'saved_ratio': self.skipped / self.checked if self.checked else 0.0
+        }
@@ -0,0 +1,89 @@
+class PacketFramer:
+    """
+    MQTT接收缓冲与增量分帧。
+    数据直接 recv_into 到可增长的 bytearray 中，在原地解析剩余长度（变长编码），
+    完整的包以 memoryview 切片返回，不再为每个包复制整个缓冲区。
+    返回的切片只在处理下一次 recv_into 之前有效，需要跨线程保留时由调用方复制。
+    """
+
+    def __init__(self, initial_size=65536, max_packet_size=16 * 1024 * 1024, min_free=16384):
+        self.buf = bytearray(initial_size)
+        self.start = 0   # 第一个未处理字节
+        self.end = 0     # 已接收数据的末尾
+        self.max_packet_size = max_packet_size
+        # 空闲空间少于该值时才整理/扩容；不为凑满一次 recv 的大小而搬移未收完的大包
+        self.min_free = min_free
+        self.bytes_copied = 0   # 整理/扩容缓冲区时搬移的字节数（用于统计）
+
+    def __len__(self):
+        return self.end - self.start
+
+    def reset(self):
+        self.start = self.end = 0
+
+    def reserve(self, size):
+        """保证末尾至少有 size 字节的空闲空间"""
+        if len(self.buf) - self.end >= size:
+            return
+        pending = self.end - self.start
+        if self.start and pending + size <= len(self.buf):
+            # 把未处理的数据移到开头（最多是一个不完整的包）
+            view = memoryview(self.buf)
+            view[:pending] = view[self.start:self.end]
+            view.release()
+        else:
+            # 新建缓冲区而不是原地扩容：之前返回的切片可能仍然引用旧缓冲区
+            new_buf = bytearray(max(len(self.buf) * 2, pending + size))
+            new_buf[:pending] = memoryview(self.buf)[self.start:self.end]
+            self.buf = new_buf
+        self.bytes_copied += pending
+        self.start, self.end = 0, pending
+
+    def recv_into(self, sock, size=262144):
+        """从套接字读取最多 size 字节到缓冲区末尾，返回读取的字节数（0 表示连接关闭）"""
+        self.reserve(min(size, self.min_free))
+        size = min(size, len(self.buf) - self.end)
+        view = memoryview(self.buf)
+        try:
+            received = sock.recv_into(view[self.end:self.end + size], size)
+        finally:
+            view.release()
+        self.end += received
+        return received
+
+    def next_packet(self):
+        """
+        取出下一个完整的包，返回 (包类型, memoryview)；数据不足时返回 None。
+        剩余长度编码错误或超过 max_packet_size 时抛出 ValueError。
+        """
+        if self.end - self.start < 2:
+            return None
+        buf = self.buf
+        pos = self.start + 1
+        multiplier = 1
+        length = 0
+        while True:
+            if pos >= self.end:
+                return None
+            byte = buf[pos]
+            length += (byte & 127) * multiplier
+            pos += 1
+            if not byte & 128:
+                break
+            multiplier *= 128
+            if multiplier > 128 * 128 * 128:
+                raise ValueError("剩余长度编码错误")
+        if length > self.max_packet_size:
+            raise ValueError(f"数据包过大: {length} 字节")
+
+        total = pos - self.start + length
+        if self.end - self.start < total:
+            # 提前为整个包（以及下一个包的开头）预留空间，避免大包到达过程中多次搬移
+            self.reserve(total - (self.end - self.start) + self.min_free)
+            return None
+        packet_type = buf[self.start] >> 4
+        packet = memoryview(buf)[self.start:self.start + total]
+        self.start += total
+        if self.start == self.end:
+            self.start = self.end = 0
+        return packet_type, packet
@@ -1,20 +1,26 @@
 
-import cv2
-import numpy as np
 import time
 from PySide6.QtCore import QThread, Signal, QMutex, QWaitCondition
 from core.inference import YoloInference
+from core.motion_gate import MotionGate
+from core.result_cache import cached_decode_infer
+from core.model_pool import get_model_pool
 
 class MqttInferenceThread(QThread):
-    inference_finished = Signal(object, object)  # annotated_frame, detections
+    inference_finished = Signal(object, object)  # frame, detections (annotated on demand by the display)
     error_occurred = Signal(str)
 
-    def __init__(self, model_path="yolov8n.pt", conf_threshold=0.5, classes_dict=None, device="cpu"):
+    def __init__(self, model_path="yolov8n.pt", conf_threshold=0.5, classes_dict=None, device="cpu", backend="torch", motion_config=None, scheduler=None, priority=1.0):
         super().__init__()
         self.model_path = model_path
         self.conf_threshold = conf_threshold
         self.classes_dict = classes_dict
         self.device = device
+        self.backend = backend
+        self.motion_gate = MotionGate.from_config(motion_config)
+        # Optional shared InferenceScheduler (frames batched with the other sources)
+        self.scheduler = scheduler
+        self.priority = priority
         
         self.running = False
         self.mutex = QMutex()
@@ -26,12 +32,21 @@ class MqttInferenceThread(QThread):
         self.last_inference_time = 0
         self.min_interval = 0.05  # Max 20 FPS to prevent CPU flooding, though thread will mostly overlap
 
-    def set_config(self, conf_threshold, device):
-        """Update runtime configuration"""
+    def set_config(self, conf_threshold):
+        """Update runtime configuration.
+        Model/device/backend changes are hot-swapped through the model pool
+        (see ModelSwapThread) and picked up between frames."""
         self.conf_threshold = conf_threshold
-        # Note: changing device requires re-initializing the model which is complex in running thread.
-        # For now we only support updating confidence threshold easily. 
-        # Device change usually requires restarting the app or the thread.
+
+    def set_motion_config(self, motion_config):
+        """Replace the motion gate (None/disabled turns gating off)"""
+        self.motion_gate = MotionGate.from_config(motion_config)
+
+    def get_stats(self):
+        stats = {}
+        if self.motion_gate:
+            stats['motion'] = self.motion_gate.stats()
+        return stats
 
     def update_frame(self, image_bytes):
         """Thread-safe method to update the latest frame"""
@@ -44,10 +59,17 @@ class MqttInferenceThread(QThread):
 
     def run(self):
         self.running = True
+        yolo = None
+        source = None
         try:
-            # Initialize YOLO instance in this thread
-            yolo = YoloInference(self.model_path, self.conf_threshold, self.classes_dict, self.device)
-            print(f"[MqttInferenceThread] Model initialized on {self.device}")
+            if self.scheduler:
+                # Share the scheduler's model, batched with the other sources
+                source = self.scheduler.register("MQTT 服务端", self.priority)
+            else:
+                # Initialize YOLO instance in this thread
+                yolo = YoloInference(self.model_path, self.conf_threshold, self.classes_dict, self.device, self.backend)
+                print(f"[MqttInferenceThread] Model initialized on {self.device}")
+            detections = None
             
             while self.running:
                 self.mutex.lock()
@@ -68,21 +90,40 @@ class MqttInferenceThread(QThread):
                 if frame_bytes:
                     try:
                         t1 = time.time()
-                        nparr = np.frombuffer(frame_bytes, np.uint8)
-                        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                        
-                        if frame is not None:
+                        if yolo:
                             # Verify confidence threshold
                             yolo.conf_threshold = self.conf_threshold
-                            
-                            # print(f"[MqttInferenceThread] Predicting... Shape: {frame.shape}")
-                            detections, annotated, infer_time = yolo.predict(frame)
-                            t2 = time.time()
-                            print(f"[MqttInferenceThread] Inference done. Time: {infer_time:.1f}ms, Total: {(t2-t1)*1000:.1f}ms")
-                            
-                            self.inference_finished.emit(annotated, detections)
+                            # Pick up a hot-swapped model before the cache key is built
+                            yolo.sync_active_model()
+                            settings = yolo.cache_settings()
                         else:
+                            settings = self.scheduler.cache_settings()
+
+                        def infer(frame, orig_shape, last=detections):
+                            # Static scene: reuse the last detections instead of running YOLO (not cached)
+                            gate = self.motion_gate
+                            if last is not None and gate is not None and not gate.should_infer(frame):
+                                return last, None
+                            start = time.time()
+                            if yolo:
+                                result, _, _ = yolo.predict(frame, annotate=False, orig_shape=orig_shape)
+                                used_settings = settings
+                            else:
+                                # Cache under the model that actually ran (it may have been hot-swapped)
+                                result, used_settings = source.infer_with_settings(frame, orig_shape)
+                            print(f"[MqttInferenceThread] Inference done. Time: {(time.time() - start) * 1000:.1f}ms, "
+                                  f"Total: {(time.time() - t1) * 1000:.1f}ms")
+                            return result, used_settings
+
+                        # Byte-identical frame seen before: skip decode and inference entirely;
+                        # otherwise a reduced-size JPEG decode, boxes come back in original coordinates
+                        frame, result, _ = cached_decode_infer(frame_bytes, settings, infer, get_model_pool().imgsz)
+                        if frame is None:
                             print("[MqttInferenceThread] Frame decode failed (None)")
+                        elif result is not None:
+                            # None: the scheduler replaced or dropped this frame
+                            detections = result
+                            self.inference_finished.emit(frame, detections)
                             
                         # Small sleep to prevent absolutely zero idle time if flooding
                         # self.msleep(10) 
@@ -94,6 +135,11 @@ class MqttInferenceThread(QThread):
 
         except Exception as e:
              self.error_occurred.emit(f"Thread initialization error: {str(e)}")
+        finally:
+            if yolo:
+                yolo.release()
+            if source:
+                source.close()
         
         print("[MqttInferenceThread] Stopped")
 
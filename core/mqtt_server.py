@@ -1,4 +1,5 @@
 import socket
+import selectors
 import threading
 import time
 from PySide6.QtCore import QThread, Signal, QMutex
@@ -6,6 +7,10 @@ import json
 import struct
 from collections import deque
 import base64
+import zlib
+from collections import OrderedDict
+from core.mqtt_framer import PacketFramer
+from core.topic_trie import TopicTrie
 
 class MqttServer(QThread):
     client_connected = Signal(str, int)
@@ -16,21 +21,45 @@ class MqttServer(QThread):
     server_stopped = Signal()
     log_message = Signal(str)
 
-    def __init__(self, host="0.0.0.0", port=1883):
+    # 发送队列满时的处理策略
+    POLICIES = ("drop_oldest", "drop_camera", "disconnect")
+
+    def __init__(self, host="0.0.0.0", port=1883, max_queue_packets=100, max_queue_mb=8,
+                 slow_client_policy="drop_oldest", camera_topic="siot/摄像头", max_inflight=20,
+                 retry_interval=5.0, max_retries=3):
         super().__init__()
         self.host = host
         self.port = port
+        # 每个客户端发送队列的上限（包数/字节数），超过后按 slow_client_policy 处理：
+        # drop_oldest 丢弃最旧的消息，drop_camera 只丢弃摄像头画面，disconnect 断开该客户端
+        self.max_queue_packets = max_queue_packets
+        self.max_queue_bytes = int(max_queue_mb * 1024 * 1024)
+        self.slow_client_policy = slow_client_policy if slow_client_policy in self.POLICIES else "drop_oldest"
+        self.camera_topic = camera_topic
+        # QoS 1/2 下发：每个客户端最多 max_inflight 条未确认消息，其余在 qos_pending 中排队；
+        # 超过 retry_interval 秒未确认时带 DUP 标志重发，重发 max_retries 次后放弃
+        self.max_inflight = max_inflight
+        self.retry_interval = retry_interval
+        self.max_retries = max_retries
+        self.inflight_total = 0
+        self.last_retry_check = 0.0
         self.running = False
         self.server_socket = None
         self.clients = {}
         self.client_counter = 0
-        self.subscriptions = {}
+        self.subscriptions = TopicTrie()  # 订阅主题树（支持 +/# 通配符，写时复制）
         self.topics = {}
         self.mutex = QMutex()
         self.message_queue = deque(maxlen=1000)
         self.log_queue = deque(maxlen=1000)
         self.last_log_time = time.time()
         self.log_interval = 0.1
+        self.selector = None
+        self._wake_r = None
+        self._wake_w = None
+        self.loop_thread = None
+        self.pending_writes = set()  # 有待发送数据的客户端
+        self.pending_disconnects = set()  # 因发送队列溢出需要断开的客户端
 
     def get_local_ip(self):
         try:
@@ -65,11 +94,19 @@ class MqttServer(QThread):
             return "127.0.0.1"
 
     def run(self):
+        self.selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self.loop_thread = threading.get_ident()
         try:
             self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(5)
+            self.server_socket.listen(128)
+            self.server_socket.setblocking(False)
+            self.selector.register(self.server_socket, selectors.EVENT_READ, "accept")
+            self.selector.register(self._wake_r, selectors.EVENT_READ, "wake")
             
             self.running = True
             self.server_started.emit(self.port)
@@ -79,43 +116,91 @@ class MqttServer(QThread):
             self.log_message.emit(f"监听地址: {self.host}:{self.port}")
             self.log_message.emit(f"客户端请连接: {local_ip}:{self.port}")
             
+            # 单线程事件循环：所有客户端的收发都在这里完成，空闲时阻塞在 select 上不占用CPU
             while self.running:
-                try:
-                    self.server_socket.settimeout(0.1)
-                    client_socket, address = self.server_socket.accept()
-                    
-                    self.client_counter += 1
-                    client_id = f"client_{self.client_counter}"
-                    
-                    self.mutex.lock()
-                    self.clients[client_id] = {
-                        'socket': client_socket,
-                        'address': address,
-                        'connected': True
-                    }
-                    self.mutex.unlock()
-                    
-                    self.client_connected.emit(client_id, address[1])
-                    self.log_message.emit(f"客户端已连接: {client_id} ({address[0]}:{address[1]})")
-                    
-                    client_thread = threading.Thread(
-                        target=self.handle_client,
-                        args=(client_id, client_socket)
-                    )
-                    client_thread.daemon = True
-                    client_thread.start()
-                    
-                except socket.timeout:
-                    self.process_queues()
-                    continue
-                except Exception as e:
-                    if self.running:
-                        self.log_message.emit(f"接受连接时出错: {str(e)}")
+                timeout = self.log_interval if self.log_queue else None
+                if self.inflight_total:
+                    # 有未确认的QoS消息时定期醒来检查重发
+                    timeout = min(timeout or 1.0, 1.0)
+                for key, mask in self.selector.select(timeout):
+                    if key.data == "accept":
+                        self.accept_clients()
+                    elif key.data == "wake":
+                        self.drain_wakeup()
+                    else:
+                        if mask & selectors.EVENT_READ:
+                            self.read_client(key.data)
+                        if mask & selectors.EVENT_WRITE:
+                            self.flush_client(key.data)
+                if self.inflight_total and time.time() - self.last_retry_check >= 1.0:
+                    self.retry_inflight()
+                self.flush_pending_writes()
+                self.process_queues()
                         
         except Exception as e:
             self.log_message.emit(f"MQTT服务端启动失败: {str(e)}")
         finally:
-            self.stop()
+            self.shutdown()
+
+    def wake(self):
+        """从其他线程（界面发布消息、停止服务）唤醒事件循环"""
+        try:
+            self._wake_w.send(b"\x00")
+        except (AttributeError, OSError):
+            # 未启动/已关闭，或唤醒字节已经积满（事件循环必然会醒来）
+            pass
+
+    def drain_wakeup(self):
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def accept_clients(self):
+        while True:
+            try:
+                client_socket, address = self.server_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                if self.running:
+                    self.safe_log(f"接受连接时出错: {str(e)}")
+                return
+            client_socket.setblocking(False)
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            
+            self.client_counter += 1
+            client_id = f"client_{self.client_counter}"
+            
+            self.mutex.lock()
+            self.clients[client_id] = {
+                'socket': client_socket,
+                'address': address,
+                'connected': True,
+                'framer': PacketFramer(),
+                'outbox': deque(),   # 待发送的 (数据包, 类型, QoS包标识符)，由事件循环在可写时发出
+                'out_offset': 0,     # 队首数据包已发送的字节数
+                'sending': False,    # 队首数据包正在发送（不能被丢弃）
+                'writing': False,    # 是否已注册可写事件
+                'queued_bytes': 0,
+                'max_queued': 0,
+                'dropped': 0,
+                'sent_packets': 0,
+                'sent_bytes': 0,
+                'next_packet_id': 1,
+                'inflight': OrderedDict(),  # 已下发未确认的QoS消息: 包标识符 -> 状态
+                'qos_pending': deque(),     # 等待发送窗口的QoS消息 (topic, payload, qos, kind)
+                'qos1_received': OrderedDict(),  # 最近处理的QoS1包: 包标识符 -> 指纹，用于识别DUP重发
+                'qos2_received': set(),     # 已处理、等待PUBREL的QoS2包标识符
+                'duplicates': 0,
+                'retries': 0
+            }
+            self.mutex.unlock()
+            self.selector.register(client_socket, selectors.EVENT_READ, client_id)
+            
+            self.client_connected.emit(client_id, address[1])
+            self.safe_log(f"客户端已连接: {client_id} ({address[0]}:{address[1]})")
 
     def process_queues(self):
         current_time = time.time()
@@ -170,92 +255,208 @@ class MqttServer(QThread):
         pos += 2
         if pos + str_len > len(data):
             return None, pos
-        string = data[pos:pos+str_len].decode('utf-8')
+        string = str(data[pos:pos+str_len], 'utf-8')
         pos += str_len
         return string, pos
 
-    def handle_client(self, client_id, client_socket):
-        buffer = b''
+    def read_client(self, client_id):
+        """读取一个客户端的可用数据并处理其中所有完整的MQTT包"""
+        client = self.clients.get(client_id)
+        if client is None:
+            return
+        framer = client['framer']
         try:
-            while self.running and self.clients.get(client_id, {}).get('connected', False):
+            # 增大接收缓冲区以更好地处理Base64图片大包
+            received = framer.recv_into(client['socket'], 262144) # 256KB
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            self.safe_log(f"接收客户端 {client_id} 数据出错: {str(e)}")
+            self.disconnect_client(client_id)
+            return
+        
+        if not received:
+            self.disconnect_client(client_id)
+            return
+        
+        try:
+            # 处理缓冲区中的所有完整MQTT包（包内容是接收缓冲区的切片，不复制）
+            while True:
                 try:
-                    client_socket.settimeout(0.1)
-                    # 增大接收缓冲区以更好地处理Base64图片大包
-                    data = client_socket.recv(262144) # 256KB
-                    
-                    if not data:
-                        break
-                    
-                    buffer += data
-                    
-                    # 处理缓冲区中的所有完整MQTT包
-                    while len(buffer) >= 2:
-                        # 解析固定头
-                        packet_type = (buffer[0] >> 4) & 0x0F
-                        
-                        # 解码剩余长度
-                        try:
-                            remaining_length, header_end = self.decode_remaining_length(buffer, 1)
-                        except ValueError:
-                            self.safe_log("剩余长度解码错误，清空缓冲区")
-                            buffer = b''
-                            break
-                        
-                        # 计算完整包长度
-                        total_length = header_end + remaining_length
-                        
-                        # 检查是否收到完整的包
-                        if len(buffer) < total_length:
-                            break
-                        
-                        # 提取完整的包
-                        packet = buffer[:total_length]
-                        buffer = buffer[total_length:]
-                        
-                        # 处理不同类型的MQTT包
-                        if packet_type == 1:  # CONNECT
-                            self.handle_connect(client_id, client_socket, packet)
-                        elif packet_type == 3:  # PUBLISH
-                            self.handle_publish(client_id, packet)
-                        elif packet_type == 8:  # SUBSCRIBE
-                            self.handle_subscribe(client_id, client_socket, packet)
-                        elif packet_type == 10:  # UNSUBSCRIBE
-                            self.handle_unsubscribe(client_id, client_socket, packet)
-                        elif packet_type == 12:  # PINGREQ
-                            self.handle_pingreq(client_id, client_socket)
-                        elif packet_type == 14:  # DISCONNECT
-                            self.safe_log(f"客户端 {client_id} 发送DISCONNECT")
-                            break
-                        else:
-                            self.safe_log(f"收到未知包类型: {packet_type}")
-                        
-                except socket.timeout:
-                    continue
-                except Exception as e:
-                    if self.clients.get(client_id, {}).get('connected', False):
-                        self.safe_log(f"处理客户端 {client_id} 数据时出错: {str(e)}")
-                        import traceback
-                        self.safe_log(f"详细错误: {traceback.format_exc()}")
+                    item = framer.next_packet()
+                except ValueError as e:
+                    self.safe_log(f"{e}，清空缓冲区")
+                    framer.reset()
                     break
-                    
+                if item is None:
+                    break
+                packet_type, packet = item
+                if not self.dispatch_packet(client_id, packet_type, packet):
+                    self.disconnect_client(client_id)
+                    return
+                
         except Exception as e:
-            self.safe_log(f"客户端 {client_id} 处理线程异常: {str(e)}")
-        finally:
+            self.safe_log(f"处理客户端 {client_id} 数据时出错: {str(e)}")
+            import traceback
+            self.safe_log(f"详细错误: {traceback.format_exc()}")
+            self.disconnect_client(client_id)
+
+    def dispatch_packet(self, client_id, packet_type, packet):
+        """处理不同类型的MQTT包；返回 False 表示应断开该客户端"""
+        if packet_type == 1:  # CONNECT
+            self.handle_connect(client_id, packet)
+        elif packet_type == 3:  # PUBLISH
+            self.handle_publish(client_id, packet)
+        elif packet_type in (4, 5, 7):  # PUBACK / PUBREC / PUBCOMP
+            self.handle_publish_ack(client_id, packet_type, packet)
+        elif packet_type == 6:  # PUBREL
+            self.handle_pubrel(client_id, packet)
+        elif packet_type == 8:  # SUBSCRIBE
+            self.handle_subscribe(client_id, packet)
+        elif packet_type == 10:  # UNSUBSCRIBE
+            self.handle_unsubscribe(client_id, packet)
+        elif packet_type == 12:  # PINGREQ
+            self.handle_pingreq(client_id)
+        elif packet_type == 14:  # DISCONNECT
+            self.safe_log(f"客户端 {client_id} 发送DISCONNECT")
+            return False
+        else:
+            self.safe_log(f"收到未知包类型: {packet_type}")
+        return True
+
+    def send_packet(self, client_id, data, kind="control"):
+        """
+        把数据放入客户端的发送队列（线程安全），由事件循环在套接字可写时发出。
+        kind: control（协议应答，不会被丢弃）、publish（转发的消息）、camera（摄像头画面）
+        """
+        self.mutex.lock()
+        client = self.clients.get(client_id)
+        queued = client is not None and client['connected']
+        if queued:
+            queued = self.enqueue(client_id, client, data, kind)
+            self.pending_writes.add(client_id)
+        self.mutex.unlock()
+        if threading.get_ident() != self.loop_thread:
+            self.wake()
+        return queued
+
+    def enqueue(self, client_id, client, data, kind, packet_id=None):
+        """
+        在持有 mutex 时调用；队列超过上限时按策略丢弃或标记断开，返回数据是否入队。
+        packet_id: QoS下发消息（PUBLISH/PUBREL）的包标识符，发送完成时用于更新发送窗口
+        """
+        outbox = client['outbox']
+        full = (len(outbox) >= self.max_queue_packets
+                or client['queued_bytes'] + len(data) > self.max_queue_bytes)
+        if full and kind != "control":
+            policy = self.slow_client_policy
+            if policy == "disconnect":
+                self.pending_disconnects.add(client_id)
+                return False
+            droppable = ("publish", "camera") if policy == "drop_oldest" else ("camera",)
+            while full and self.drop_oldest_queued(client, droppable):
+                full = (len(outbox) >= self.max_queue_packets
+                        or client['queued_bytes'] + len(data) > self.max_queue_bytes)
+            if full:
+                # 队列里没有可以让位的消息：丢弃新消息，保证队列不超过上限
+                client['dropped'] += 1
+                return False
+        outbox.append((data, kind, packet_id))
+        client['queued_bytes'] += len(data)
+        client['max_queued'] = max(client['max_queued'], len(outbox))
+        return True
+
+    def drop_oldest_queued(self, client, kinds):
+        """丢弃队列中最旧的一个指定类型的数据包（正在发送的队首除外）"""
+        outbox = client['outbox']
+        first = 1 if client['sending'] or client['out_offset'] else 0
+        for i in range(first, len(outbox)):
+            data, kind, _ = outbox[i]
+            if kind in kinds:
+                del outbox[i]
+                client['queued_bytes'] -= len(data)
+                client['dropped'] += 1
+                return True
+        return False
+
+    def flush_pending_writes(self):
+        """尝试立即发出本轮产生的数据，发不完的注册可写事件等待下次"""
+        self.mutex.lock()
+        pending = self.pending_writes
+        self.pending_writes = set()
+        overflowed = self.pending_disconnects
+        self.pending_disconnects = set()
+        self.mutex.unlock()
+        for client_id in overflowed:
+            self.safe_log(f"客户端 {client_id} 发送队列已满，断开连接")
             self.disconnect_client(client_id)
+        for client_id in pending:
+            self.flush_client(client_id)
 
-    def handle_connect(self, client_id, client_socket, packet):
+    def flush_client(self, client_id):
+        client = self.clients.get(client_id)
+        if client is None:
+            return
+        sock = client['socket']
+        outbox = client['outbox']
+        try:
+            while True:
+                # 在锁内取出队首并标记为正在发送，其他线程丢弃旧消息时会跳过它
+                self.mutex.lock()
+                if not outbox:
+                    self.mutex.unlock()
+                    break
+                data = outbox[0][0]
+                offset = client['out_offset']
+                client['sending'] = True
+                self.mutex.unlock()
+                try:
+                    sent = sock.send(memoryview(data)[offset:])
+                except OSError:
+                    self.mutex.lock()
+                    client['sending'] = False
+                    self.mutex.unlock()
+                    raise
+                # 更新已发送字节数和清除发送标记在同一次加锁中完成
+                self.mutex.lock()
+                client['sending'] = False
+                client['out_offset'] += sent
+                client['sent_bytes'] += sent
+                done = client['out_offset'] >= len(data)
+                if done:
+                    packet_id = outbox.popleft()[2]
+                    client['queued_bytes'] -= len(data)
+                    client['out_offset'] = 0
+                    client['sent_packets'] += 1
+                    if packet_id is not None:
+                        self.inflight_copy_sent(client_id, client, packet_id)
+                self.mutex.unlock()
+                if not done:
+                    # 内核发送缓冲区已满
+                    break
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError as e:
+            self.safe_log(f"发送数据到 {client_id} 失败: {str(e)}")
+            self.disconnect_client(client_id)
+            return
+        
+        writing = bool(outbox)
+        if writing != client['writing']:
+            client['writing'] = writing
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if writing else 0)
+            self.selector.modify(sock, events, client_id)
+
+    def handle_connect(self, client_id, packet):
         """处理CONNECT包并发送CONNACK"""
         self.safe_log(f"客户端 {client_id} 发送CONNECT包")
         
         # 发送CONNACK: 0x20 0x02 0x00 0x00 (连接接受)
         connack = bytes([0x20, 0x02, 0x00, 0x00])
-        try:
-            client_socket.sendall(connack)
-            self.safe_log(f"向客户端 {client_id} 发送CONNACK")
-        except Exception as e:
-            self.safe_log(f"发送CONNACK失败: {str(e)}")
+        self.send_packet(client_id, connack)
+        self.safe_log(f"向客户端 {client_id} 发送CONNACK")
 
-    def handle_subscribe(self, client_id, client_socket, packet):
+    def handle_subscribe(self, client_id, packet):
         """处理SUBSCRIBE包并发送SUBACK"""
         try:
             # 解析固定头
@@ -273,13 +474,16 @@ class MqttServer(QThread):
                 topic, pos = self.decode_string(packet, pos)
                 if topic is None:
                     break
-                qos = packet[pos] if pos < len(packet) else 0
+                qos = min(packet[pos] if pos < len(packet) else 0, 2)
                 pos += 1
                 topics.append(topic)
-                return_codes.append(min(qos, 2))  # 返回授予的QoS
                 
-                self.subscribe_topic(client_id, topic)
-                self.safe_log(f"客户端 {client_id} 订阅主题: {topic} (QoS: {qos})")
+                if self.subscribe_topic(client_id, topic, qos):
+                    return_codes.append(qos)  # 返回授予的QoS
+                    self.safe_log(f"客户端 {client_id} 订阅主题: {topic} (QoS: {qos})")
+                else:
+                    return_codes.append(0x80)  # 订阅失败
+                    self.safe_log(f"客户端 {client_id} 订阅主题无效: {topic}")
             
             # 发送SUBACK
             suback = bytearray([0x90])  # SUBACK固定头
@@ -287,7 +491,7 @@ class MqttServer(QThread):
             suback += self.encode_remaining_length(len(suback_payload))
             suback += suback_payload
             
-            client_socket.sendall(bytes(suback))
+            self.send_packet(client_id, bytes(suback))
             self.safe_log(f"向客户端 {client_id} 发送SUBACK")
             
         except Exception as e:
@@ -295,7 +499,7 @@ class MqttServer(QThread):
             import traceback
             self.safe_log(f"详细错误: {traceback.format_exc()}")
 
-    def handle_unsubscribe(self, client_id, client_socket, packet):
+    def handle_unsubscribe(self, client_id, packet):
         """处理UNSUBSCRIBE包并发送UNSUBACK"""
         try:
             remaining_length, header_end = self.decode_remaining_length(packet, 1)
@@ -310,19 +514,15 @@ class MqttServer(QThread):
             
             # 发送UNSUBACK
             unsuback = bytes([0xB0, 0x02]) + struct.pack(">H", packet_id)
-            client_socket.sendall(unsuback)
+            self.send_packet(client_id, unsuback)
             
         except Exception as e:
             self.safe_log(f"处理UNSUBSCRIBE包出错: {str(e)}")
 
-    def handle_pingreq(self, client_id, client_socket):
+    def handle_pingreq(self, client_id):
         """处理PINGREQ包并发送PINGRESP"""
-        try:
-            # 发送PINGRESP: 0xD0 0x00
-            pingresp = bytes([0xD0, 0x00])
-            client_socket.sendall(pingresp)
-        except Exception as e:
-            self.safe_log(f"发送PINGRESP失败: {str(e)}")
+        # 发送PINGRESP: 0xD0 0x00
+        self.send_packet(client_id, bytes([0xD0, 0x00]))
 
     def handle_publish(self, client_id, packet):
         """处理PUBLISH包"""
@@ -343,6 +543,7 @@ class MqttServer(QThread):
                 return
             
             # 如果QoS > 0，解析包标识符
+            packet_id = None
             if qos > 0:
                 packet_id = struct.unpack(">H", packet[pos:pos+2])[0]
                 pos += 2
@@ -350,67 +551,148 @@ class MqttServer(QThread):
             # 剩余的是载荷
             payload = packet[pos:]
             
-            # 尝试解码为UTF-8字符串
+            if qos > 0 and self.is_duplicate_publish(client_id, topic, payload, qos, packet_id, dup):
+                # 客户端没收到确认而重发的包：只补发确认，不再交给推理线程
+                self.acknowledge_publish(client_id, qos, packet_id)
+                return
+            
             try:
-                payload_str = payload.decode('utf-8')
-            except:
-                payload_str = None
-            
-            if topic != "siot/摄像头":
-                content_show = payload_str if payload_str else f"<Binary data, len={len(payload)}>"
-                self.safe_log(f"收到PUBLISH - 主题: {topic}, 内容: {content_show}")
-            
-            # 处理摄像头主题
-            # 处理摄像头主题
-            if topic == "siot/摄像头":
-                # 即使UTF-8解码失败，也尝试处理（可能是Raw Binary）
-                print("处理摄像头主题")
-                self.process_camera_image(client_id, topic, payload)
-            elif payload_str:
-                # 发送消息到UI
-                self.message_received.emit(topic, payload_str, client_id)
-                
-                # 转发给订阅者
-                self.forward_to_subscribers(topic, payload)
+                self.process_publish(client_id, topic, payload, qos)
+            finally:
+                # 处理完成后确认（QoS1: PUBACK，QoS2: PUBREC），客户端才会释放发送窗口
+                if qos > 0:
+                    self.acknowledge_publish(client_id, qos, packet_id)
             
         except Exception as e:
             self.safe_log(f"处理PUBLISH包出错: {str(e)}")
             import traceback
             self.safe_log(f"详细错误: {traceback.format_exc()}")
 
+    def process_publish(self, client_id, topic, payload, qos):
+        """把PUBLISH的内容交给界面/推理线程并转发给订阅者"""
+        # 处理摄像头主题
+        if topic == self.camera_topic:
+            # 即使UTF-8解码失败，也尝试处理（可能是Raw Binary）；
+            # 载荷是接收缓冲区的切片，不先整体解码为字符串
+            self.process_camera_image(client_id, topic, payload)
+            return
+            
+        # 尝试解码为UTF-8字符串
+        try:
+            payload_str = str(payload, 'utf-8')
+        except:
+            payload_str = None
+        
+        content_show = payload_str if payload_str else f"<Binary data, len={len(payload)}>"
+        self.safe_log(f"收到PUBLISH - 主题: {topic}, 内容: {content_show}")
+        
+        if payload_str:
+            # 发送消息到UI
+            self.message_received.emit(topic, payload_str, client_id)
+            
+            # 转发给订阅者
+            self.forward_to_subscribers(topic, payload, qos)
+
+    def is_duplicate_publish(self, client_id, topic, payload, qos, packet_id, dup):
+        """
+        判断QoS1/2的PUBLISH是否是已经处理过的重发包，并记录本次的包标识符。
+        QoS2: 收到PUBREL之前同一包标识符都视为重复；
+        QoS1: 客户端会复用已确认的包标识符，只有带DUP标志且内容指纹相同时才视为重复。
+        """
+        client = self.clients.get(client_id)
+        if client is None:
+            return False
+        if qos == 2:
+            received = client['qos2_received']
+            if packet_id in received:
+                client['duplicates'] += 1
+                return True
+            received.add(packet_id)
+            return False
+        
+        fingerprint = (topic, len(payload), zlib.crc32(payload))
+        received = client['qos1_received']
+        if dup and received.get(packet_id) == fingerprint:
+            client['duplicates'] += 1
+            return True
+        received[packet_id] = fingerprint
+        received.move_to_end(packet_id)
+        if len(received) > 64:
+            received.popitem(last=False)
+        return False
+
+    def acknowledge_publish(self, client_id, qos, packet_id):
+        # QoS1: PUBACK 0x40，QoS2: PUBREC 0x50
+        header = 0x40 if qos == 1 else 0x50
+        self.send_packet(client_id, bytes([header, 0x02]) + struct.pack(">H", packet_id))
+
+    def handle_pubrel(self, client_id, packet):
+        """QoS2第二阶段：释放包标识符并回复PUBCOMP"""
+        packet_id = struct.unpack(">H", packet[2:4])[0]
+        client = self.clients.get(client_id)
+        if client is not None:
+            client['qos2_received'].discard(packet_id)
+        self.send_packet(client_id, bytes([0x70, 0x02]) + struct.pack(">H", packet_id))
+
+    def handle_publish_ack(self, client_id, packet_type, packet):
+        """处理订阅者对QoS下发消息的确认：PUBACK/PUBCOMP 结束，PUBREC 后发送PUBREL"""
+        packet_id = struct.unpack(">H", packet[2:4])[0]
+        self.mutex.lock()
+        client = self.clients.get(client_id)
+        message = client['inflight'].get(packet_id) if client else None
+        if message is not None and not message['done']:
+            if packet_type == 5 and message['qos'] == 2:
+                # 还在队列里的PUBLISH重发副本不再需要
+                self.discard_queued_copies(client, packet_id)
+                pubrel = bytes([0x62, 0x02]) + struct.pack(">H", packet_id)
+                message['packet'] = pubrel
+                message['retries'] = 0
+                self.queue_inflight_copy(client_id, client, packet_id, pubrel)
+            elif packet_type == 4 or packet_type == 7:
+                self.finish_inflight(client_id, client, packet_id)
+            self.pending_writes.add(client_id)
+        self.mutex.unlock()
+
     def process_camera_image(self, client_id, topic, payload):
-        """处理摄像头图像数据 (支持Raw Binary和Base64)"""
+        """处理摄像头图像数据 (支持Raw Binary和Base64)；payload 可以是接收缓冲区的 memoryview 切片"""
         try:
             image_bytes = None
             
             # 1. 尝试检测是否为Raw Binary图像 (JPEG/PNG)
             # JPEG starts with FF D8, PNG starts with 89 50 4E 47
             if len(payload) > 4:
-                header = payload[:4]
+                header = bytes(payload[:4])
                 if header.startswith(b'\xff\xd8') or header.startswith(b'\x89\x50\x4e\x47'):
                     print(f"检测到原始二进制图像数据，长度: {len(payload)}")
-                    image_bytes = payload
+                    # 信号跨线程传递，需要独立于接收缓冲区的副本
+                    image_bytes = bytes(payload)
             
-            # 2. 如果不是Raw Binary，尝试作为Base64处理
+            # 2. 如果不是Raw Binary，尝试作为Base64处理（直接解码切片，不先转成字符串）
             if image_bytes is None:
                 try:
-                    payload_str = payload.decode('utf-8').strip()
+                    start, end = 0, len(payload)
                     
                     # 去掉data:image/xxx;base64,前缀
-                    if 'base64,' in payload_str:
-                        base64_data = payload_str.split('base64,', 1)[1]
-                    else:
-                        base64_data = payload_str
+                    prefix = bytes(payload[:100]).find(b'base64,')
+                    if prefix >= 0:
+                        start = prefix + len(b'base64,')
+                    
+                    # 去掉首尾空白
+                    while start < end and payload[start] in b' \t\r\n':
+                        start += 1
+                    while end > start and payload[end - 1] in b' \t\r\n':
+                        end -= 1
+                    base64_data = payload[start:end]
                     
                     # 修复padding
                     missing_padding = len(base64_data) % 4
                     if missing_padding:
-                        base64_data += '=' * (4 - missing_padding)
+                        base64_data = bytes(base64_data) + b'=' * (4 - missing_padding)
                     
                     image_bytes = base64.b64decode(base64_data)
                     print(f"成功解码BASE64图像数据，字节长度: {len(image_bytes)}")
                 except Exception as e:
-                    # 解码失败，可能不是合法的Base64或UTF-8
+                    # 解码失败，可能不是合法的Base64
                     pass
 
             if image_bytes:
@@ -424,94 +706,216 @@ class MqttServer(QThread):
             import traceback
             self.safe_log(f"详细错误: {traceback.format_exc()}")
 
-    def forward_to_subscribers(self, topic, payload):
-        """转发消息给订阅该主题的客户端"""
+    def forward_to_subscribers(self, topic, payload, qos=0):
+        """转发消息给订阅该主题的客户端；下发QoS取消息QoS与订阅QoS中较小的一个"""
+        # 在主题树快照上匹配（含通配符订阅），不复制订阅表也不需要加锁
+        subscribers = self.subscriptions.match(topic)
+        if not subscribers:
+            return
+        kind = "camera" if topic == self.camera_topic else "publish"
+        publish_packet = None
+        qos_payload = None
+        for sub_client_id, sub_qos in subscribers.items():
+            delivery_qos = min(qos, sub_qos)
+            if delivery_qos == 0:
+                # QoS0 的PUBLISH包只构建一次，所有订阅者的发送队列共享同一份数据
+                if publish_packet is None:
+                    publish_packet = self.build_publish_packet(topic, payload)
+                # 已断开的客户端由 send_packet 忽略
+                self.send_packet(sub_client_id, publish_packet, kind)
+            else:
+                # QoS1/2 每个订阅者的包标识符不同，载荷需要在确认前保留（脱离接收缓冲区）
+                if qos_payload is None:
+                    qos_payload = bytes(payload)
+                self.send_qos_message(sub_client_id, topic, qos_payload, delivery_qos, kind)
+
+    def send_qos_message(self, client_id, topic, payload, qos, kind):
+        """发送窗口未满时立即下发，否则排队；排队也超过上限时按 slow_client_policy 处理"""
         self.mutex.lock()
-        subscriptions_copy = dict(self.subscriptions)
-        clients_copy = dict(self.clients)
+        client = self.clients.get(client_id)
+        queued = client is not None and client['connected']
+        if queued:
+            pending = client['qos_pending']
+            if len(client['inflight']) < self.max_inflight and not pending:
+                self.start_inflight(client_id, client, topic, payload, qos)
+            else:
+                queued = self.queue_qos_message(client_id, client, (topic, payload, qos, kind))
+            self.pending_writes.add(client_id)
         self.mutex.unlock()
-        
-        for sub_client_id, subscribed_topics in subscriptions_copy.items():
-            if topic in subscribed_topics and sub_client_id in clients_copy:
-                if clients_copy[sub_client_id]['connected']:
-                    try:
-                        # 构建PUBLISH包
-                        publish_packet = self.build_publish_packet(topic, payload)
-                        clients_copy[sub_client_id]['socket'].sendall(publish_packet)
-                    except Exception as e:
-                        self.safe_log(f"转发消息到 {sub_client_id} 失败: {str(e)}")
-
-    def build_publish_packet(self, topic, payload):
-        """构建MQTT PUBLISH包"""
+        if threading.get_ident() != self.loop_thread:
+            self.wake()
+        return queued
+
+    def queue_qos_message(self, client_id, client, message):
+        """在持有 mutex 时调用"""
+        pending = client['qos_pending']
+        if len(pending) >= self.max_queue_packets:
+            policy = self.slow_client_policy
+            if policy == "disconnect":
+                self.pending_disconnects.add(client_id)
+                return False
+            droppable = ("publish", "camera") if policy == "drop_oldest" else ("camera",)
+            for i, queued in enumerate(pending):
+                if queued[3] in droppable:
+                    del pending[i]
+                    client['dropped'] += 1
+                    break
+            else:
+                # 没有可以让位的消息：丢弃新消息，保证排队数不超过上限
+                client['dropped'] += 1
+                return False
+        pending.append(message)
+        return True
+
+    def start_inflight(self, client_id, client, topic, payload, qos):
+        """分配包标识符并放入发送队列（在持有 mutex 时调用）"""
+        inflight = client['inflight']
+        packet_id = client['next_packet_id']
+        while packet_id in inflight:
+            packet_id = packet_id % 65535 + 1
+        client['next_packet_id'] = packet_id % 65535 + 1
+        packet = self.build_publish_packet(topic, payload, qos, packet_id)
+        # sent_at 在数据包真正写入套接字时才设置；queued 是仍在发送队列中的副本数
+        inflight[packet_id] = {'packet': packet, 'qos': qos, 'sent_at': None, 'retries': 0, 'queued': 0,
+                               'done': False}
+        self.inflight_total += 1
+        self.queue_inflight_copy(client_id, client, packet_id, packet)
+
+    def queue_inflight_copy(self, client_id, client, packet_id, packet):
+        """放入发送队列；已受发送窗口限制，不再按队列上限丢弃（在持有 mutex 时调用）"""
+        client['inflight'][packet_id]['queued'] += 1
+        self.enqueue(client_id, client, packet, "control", packet_id)
+
+    def inflight_copy_sent(self, client_id, client, packet_id):
+        """一个副本已写入套接字：从这时开始计算重发超时（在持有 mutex 时调用）"""
+        message = client['inflight'].get(packet_id)
+        if message is None:
+            return
+        message['queued'] -= 1
+        message['sent_at'] = time.time()
+        if message['done'] and not message['queued']:
+            self.release_inflight(client_id, client, packet_id)
+
+    def discard_queued_copies(self, client, packet_id):
+        """从发送队列中删除该消息尚未开始发送的副本（在持有 mutex 时调用）"""
+        message = client['inflight'][packet_id]
+        if not message['queued']:
+            return
+        outbox = client['outbox']
+        first = 1 if client['sending'] or client['out_offset'] else 0
+        for i in range(len(outbox) - 1, first - 1, -1):
+            data, _, queued_id = outbox[i]
+            if queued_id == packet_id:
+                del outbox[i]
+                client['queued_bytes'] -= len(data)
+                message['queued'] -= 1
+
+    def finish_inflight(self, client_id, client, packet_id):
+        """
+        结束一条QoS消息（在持有 mutex 时调用）。
+        正在发送的副本发完之前不释放包标识符，避免迟到的确认匹配到复用该标识符的新消息。
+        """
+        message = client['inflight'].get(packet_id)
+        if message is None:
+            return
+        self.discard_queued_copies(client, packet_id)
+        if message['queued']:
+            message['done'] = True
+            return
+        self.release_inflight(client_id, client, packet_id)
+
+    def release_inflight(self, client_id, client, packet_id):
+        """释放包标识符并用排队的消息补充发送窗口（在持有 mutex 时调用）"""
+        del client['inflight'][packet_id]
+        self.inflight_total -= 1
+        pending = client['qos_pending']
+        while pending and len(client['inflight']) < self.max_inflight:
+            topic, payload, qos, _ = pending.popleft()
+            self.start_inflight(client_id, client, topic, payload, qos)
+
+    def retry_inflight(self):
+        """重发超时未确认的QoS消息（PUBLISH 带 DUP 标志，PUBREL 原样重发）"""
+        now = time.time()
+        self.last_retry_check = now
+        self.mutex.lock()
+        for client_id, client in self.clients.items():
+            # 原包或上一次重发还在发送队列中时不重发，超时从真正发出时开始计算
+            expired = [packet_id for packet_id, message in client['inflight'].items()
+                       if not message['done'] and not message['queued'] and message['sent_at'] is not None
+                       and now - message['sent_at'] >= self.retry_interval]
+            for packet_id in expired:
+                message = client['inflight'][packet_id]
+                if message['retries'] >= self.max_retries:
+                    client['dropped'] += 1
+                    self.finish_inflight(client_id, client, packet_id)
+                    continue
+                packet = message['packet']
+                if packet[0] >> 4 == 3:
+                    packet = bytes([packet[0] | 0x08]) + packet[1:]
+                message['retries'] += 1
+                client['retries'] += 1
+                self.queue_inflight_copy(client_id, client, packet_id, packet)
+                self.pending_writes.add(client_id)
+        self.mutex.unlock()
+
+    def build_publish_packet(self, topic, payload, qos=0, packet_id=None):
+        """构建MQTT PUBLISH包（QoS>0 时在主题后写入包标识符）"""
         # 编码主题
         topic_bytes = topic.encode('utf-8')
         topic_length = struct.pack(">H", len(topic_bytes))
         
-        # 可变头 = 主题长度 + 主题
+        # 可变头 = 主题长度 + 主题 (+ 包标识符)
         variable_header = topic_length + topic_bytes
+        if qos > 0:
+            variable_header += struct.pack(">H", packet_id)
         
         # 计算剩余长度
         remaining = variable_header + payload
         
         # 固定头
-        fixed_header = bytes([0x30]) + self.encode_remaining_length(len(remaining))
+        fixed_header = bytes([0x30 | (qos << 1)]) + self.encode_remaining_length(len(remaining))
         
         return fixed_header + remaining
 
     def disconnect_client(self, client_id):
-        if client_id in self.clients:
-            client_info = self.clients[client_id]
-            client_info['connected'] = False
-            
-            try:
-                client_info['socket'].close()
-            except:
-                pass
-            
-            address = client_info['address']
-            self.client_disconnected.emit(client_id, address[1])
-            self.safe_log(f"客户端已断开: {client_id} ({address[0]}:{address[1]})")
-            
-            self.mutex.lock()
-            if client_id in self.clients:
-                del self.clients[client_id]
-            if client_id in self.subscriptions:
-                del self.subscriptions[client_id]
-            self.mutex.unlock()
+        """关闭客户端连接（只在事件循环线程中调用）"""
+        self.mutex.lock()
+        client_info = self.clients.pop(client_id, None)
+        self.pending_writes.discard(client_id)
+        self.pending_disconnects.discard(client_id)
+        if client_info is not None:
+            # 不保留会话：未确认的QoS消息随连接一起丢弃
+            self.inflight_total -= len(client_info['inflight'])
+        self.mutex.unlock()
+        if client_info is None:
+            return
+        client_info['connected'] = False
+        self.subscriptions.remove_client(client_id)
+        
+        try:
+            self.selector.unregister(client_info['socket'])
+        except (KeyError, ValueError):
+            pass
+        try:
+            client_info['socket'].close()
+        except:
+            pass
+        
+        address = client_info['address']
+        self.client_disconnected.emit(client_id, address[1])
+        self.safe_log(f"客户端已断开: {client_id} ({address[0]}:{address[1]})")
 
     def broadcast_message(self, message):
-        disconnected_clients = []
-        
         self.mutex.lock()
-        clients_copy = dict(self.clients)
+        client_ids = list(self.clients.keys())
         self.mutex.unlock()
         
-        for client_id, client_info in clients_copy.items():
-            if client_info['connected']:
-                try:
-                    client_info['socket'].sendall(message.encode('utf-8'))
-                except Exception as e:
-                    self.safe_log(f"发送消息到客户端 {client_id} 失败: {str(e)}")
-                    disconnected_clients.append(client_id)
-        
-        for client_id in disconnected_clients:
-            self.disconnect_client(client_id)
+        data = message.encode('utf-8')
+        for client_id in client_ids:
+            self.send_packet(client_id, data, "publish")
 
     def send_message_to_client(self, client_id, message):
-        self.mutex.lock()
-        client_info = self.clients.get(client_id)
-        if client_info and client_info['connected']:
-            self.mutex.unlock()
-            try:
-                client_info['socket'].sendall(message.encode('utf-8'))
-                return True
-            except Exception as e:
-                self.safe_log(f"发送消息到客户端 {client_id} 失败: {str(e)}")
-                self.disconnect_client(client_id)
-                return False
-        else:
-            self.mutex.unlock()
-            return False
+        return self.send_packet(client_id, message.encode('utf-8'), "publish")
 
     def get_connected_clients(self):
         self.mutex.lock()
@@ -526,29 +930,48 @@ class MqttServer(QThread):
         self.mutex.unlock()
         return clients_list
 
-    def subscribe_topic(self, client_id, topic):
+    def get_client_stats(self):
+        """每个客户端的发送队列统计"""
         self.mutex.lock()
-        if client_id not in self.subscriptions:
-            self.subscriptions[client_id] = []
-        
-        if topic not in self.subscriptions[client_id]:
-            self.subscriptions[client_id].append(topic)
+        stats = [
+            {
+                'id': client_id,
+                'address': f"{info['address'][0]}:{info['address'][1]}",
+                'queued': len(info['outbox']),
+                'queued_bytes': info['queued_bytes'],
+                'max_queued': info['max_queued'],
+                'dropped': info['dropped'],
+                'sent_packets': info['sent_packets'],
+                'sent_bytes': info['sent_bytes'],
+                'inflight': len(info['inflight']),
+                'qos_pending': len(info['qos_pending']),
+                'retries': info['retries'],
+                'duplicates': info['duplicates']
+            }
+            for client_id, info in self.clients.items()
+        ]
         self.mutex.unlock()
+        return stats
+
+    def subscribe_topic(self, client_id, topic, qos=0):
+        """增量更新订阅主题树；过滤器无效时返回 False"""
+        try:
+            self.subscriptions.subscribe(client_id, topic, qos)
+            return True
+        except ValueError:
+            return False
 
     def unsubscribe_topic(self, client_id, topic):
-        self.mutex.lock()
-        if client_id in self.subscriptions and topic in self.subscriptions[client_id]:
-            self.subscriptions[client_id].remove(topic)
-        self.mutex.unlock()
+        self.subscriptions.unsubscribe(client_id, topic)
         self.safe_log(f"客户端 {client_id} 取消订阅主题: {topic}")
 
-    def publish_message(self, topic, message):
+    def publish_message(self, topic, message, qos=0):
         """服务端主动发布消息"""
         self.mutex.lock()
         self.topics[topic] = message
         self.mutex.unlock()
         
-        if topic != "siot/摄像头":
+        if topic != self.camera_topic:
             self.safe_log(f"发布消息到主题 {topic}: {message[:50] if len(message) > 50 else message}")
         
         # 转发给订阅者
@@ -557,9 +980,17 @@ class MqttServer(QThread):
         else:
             payload = message
         
-        self.forward_to_subscribers(topic, payload)
+        self.forward_to_subscribers(topic, payload, qos)
 
     def stop(self):
+        """停止服务端：通知事件循环退出并等待其关闭所有连接"""
+        self.running = False
+        self.wake()
+        if threading.get_ident() != self.loop_thread and self.isRunning():
+            self.wait(3000)
+
+    def shutdown(self):
+        """事件循环退出时关闭所有连接和监听套接字"""
         self.running = False
         
         self.mutex.lock()
@@ -569,11 +1000,13 @@ class MqttServer(QThread):
         for client_id in clients_to_disconnect:
             self.disconnect_client(client_id)
         
-        if self.server_socket:
-            try:
-                self.server_socket.close()
-            except:
-                pass
+        for sock in (self.server_socket, self._wake_r, self._wake_w):
+            if sock:
+                try:
+                    sock.close()
+                except:
+                    pass
+        self.selector.close()
         
         self.process_queues()
         self.server_stopped.emit()
@@ -5,14 +5,16 @@ import paho.mqtt.client as mqtt
 from PySide6.QtCore import QThread, Signal, QTimer
 import json
 from core.inference import YoloInference
+from core.result_cache import cached_decode_infer
+from core.model_pool import get_model_pool
 import time
 
 class MqttWorker(QThread):
-    frame_processed = Signal(str, object, object)
+    frame_processed = Signal(str, object, object)  # topic, frame, detections (annotated on demand by the display)
     connection_status = Signal(bool, str)
     log_message = Signal(str)
 
-    def __init__(self, broker, port, topics, username=None, password=None, model_path="yolov8n.pt", conf_threshold=0.5, classes_dict=None, device="cpu"):
+    def __init__(self, broker, port, topics, username=None, password=None, model_path="yolov8n.pt", conf_threshold=0.5, classes_dict=None, device="cpu", backend="torch", scheduler=None, priority=1.0):
         super().__init__()
         self.broker = broker
         self.port = port
@@ -23,9 +25,14 @@ class MqttWorker(QThread):
         self.conf_threshold = conf_threshold
         self.classes_dict = classes_dict
         self.device = device
+        self.backend = backend
         self.client = mqtt.Client()
         self.running = False
         self.yolo = None
+        # Optional shared InferenceScheduler (frames batched with the other sources)
+        self.scheduler = scheduler
+        self.priority = priority
+        self.source = None
         self.auto_reconnect = True
         self.reconnect_interval = 5
         self.connection_attempts = 0
@@ -40,7 +47,10 @@ class MqttWorker(QThread):
 
     def run(self):
         self.running = True
-        self.yolo = YoloInference(self.model_path, self.conf_threshold, self.classes_dict, self.device)
+        if self.scheduler:
+            self.source = self.scheduler.register("MQTT 客户端", self.priority)
+        else:
+            self.yolo = YoloInference(self.model_path, self.conf_threshold, self.classes_dict, self.device, self.backend)
         
         # Connect and loop forever
         self.connection_attempts = 0
@@ -82,6 +92,14 @@ class MqttWorker(QThread):
                 if not self.running:
                     self.client.disconnect() # Ensure cleanup
 
+        # 释放共享模型引用
+        if self.yolo:
+            self.yolo.release()
+            self.yolo = None
+        if self.source:
+            self.source.close()
+            self.source = None
+
 
     def stop(self):
         self.running = False
@@ -137,14 +155,18 @@ class MqttWorker(QThread):
 
                 import binascii
                 img_data = base64.b64decode(base64_data, validate=True)
-                nparr = np.frombuffer(img_data, np.uint8)
-                img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-                if img is not None:
-                    if self.yolo:
-                        detections, annotated, _ = self.yolo.predict(img)
-                        self.frame_processed.emit(msg.topic, annotated, detections)
-                    return # Successfully processed as image
+
+                if self.yolo or self.source:
+                    # Repeated payloads (heartbeats, static scenes) are served from the result cache
+                    img, detections = self.predict_encoded(img_data)
+                    if img is not None:
+                        if detections is not None:
+                            self.frame_processed.emit(msg.topic, img, detections)
+                        return # Successfully processed as image
+                else:
+                    nparr = np.frombuffer(img_data, np.uint8)
+                    if cv2.imdecode(nparr, cv2.IMREAD_COLOR) is not None:
+                        return # Successfully processed as image
             except (binascii.Error, ValueError, cv2.error):
                 # If image decoding fails, assume it is a text message
                 pass
@@ -155,6 +177,17 @@ class MqttWorker(QThread):
         except Exception as e:
             self.log_message.emit(f"处理主题 {msg.topic} 的消息时出错: {str(e)}")
 
+    def predict_encoded(self, data):
+        """Decode and run inference through the local model or the shared scheduler"""
+        if self.source is None:
+            img, detections, _, _ = self.yolo.predict_encoded(data)
+            return img, detections
+
+        # Look up with the scheduler's current model; store under the model that actually ran
+        img, detections, _ = cached_decode_infer(data, self.scheduler.cache_settings(), self.source.infer_with_settings,
+                                                 get_model_pool().imgsz)
+        return img, detections
+
     def publish_message(self, topic, payload):
         if self.client and self.client.is_connected():
             try:
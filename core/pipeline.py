@@ -0,0 +1,69 @@
+import time
+import threading
+from collections import deque
+
+
+class LatestFrameSlot:
+    """
+    单槽"最新帧"缓冲：采集线程不断覆盖，推理线程只取最新的一帧。
+    推理跟不上时旧帧直接被丢弃，而不是在队列里排队造成越来越大的延迟。
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._seq = 0
+        self._taken_seq = 0
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, frame, timestamp=None):
+        with self._cond:
+            if self._seq > self._taken_seq:
+                # 上一帧还没被取走就被覆盖
+                self.dropped += 1
+            self._seq += 1
+            self._item = (frame, timestamp if timestamp is not None else time.perf_counter())
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """等待比上次取到的更新的帧，返回 (frame, timestamp)；超时或关闭时返回 None"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._closed or self._seq > self._taken_seq, timeout):
+                return None
+            if self._seq <= self._taken_seq:
+                return None
+            self._taken_seq = self._seq
+            return self._item
+
+    def has_pending(self):
+        """是否还有未被取走的帧（推理阶段尚未准备好接收新帧）"""
+        with self._cond:
+            return self._seq > self._taken_seq
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class FpsMeter:
+    """滑动窗口内的帧率统计"""
+
+    def __init__(self, window=2.0):
+        self.window = window
+        self._times = deque()
+
+    def tick(self, now=None):
+        now = now if now is not None else time.perf_counter()
+        self._times.append(now)
+        while self._times and now - self._times[0] > self.window:
+            self._times.popleft()
+
+    def fps(self):
+        now = time.perf_counter()
+        # 只统计窗口内的帧，停止出帧后帧率归零
+        recent = [t for t in list(self._times) if now - t <= self.window]
+        if len(recent) < 2 or recent[-1] <= recent[0]:
+            return 0.0
+        return (len(recent) - 1) / (recent[-1] - recent[0])
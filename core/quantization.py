@@ -0,0 +1,165 @@
+import os
+import time
+import cv2
+import numpy as np
+from ultralytics import YOLO
+from core.detections import Detections, box_iou
+from core.model_export import get_exported_model, export_artifact_path
+
+try:
+    import onnxruntime
+    from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat,
+                                          QuantType, quantize_static)
+except ImportError:
+    onnxruntime = None
+    CalibrationDataReader = object
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+
+def list_images(folder, limit=None):
+    files = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTENSIONS))
+    return files[:limit] if limit else files
+
+
+def letterbox_tensor(img, imgsz=640):
+    """与YOLO相同的预处理：等比缩放 + 灰边填充，BGR->RGB，归一化为 (1, 3, H, W) float32"""
+    h, w = img.shape[:2]
+    r = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * r)), int(round(h * r))
+    resized = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    canvas = np.full((imgsz, imgsz, 3), 114, np.uint8)
+    top, left = (imgsz - new_h) // 2, (imgsz - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = resized
+    tensor = canvas[:, :, ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+    return np.ascontiguousarray(tensor)
+
+
+class ImageFolderCalibrationReader(CalibrationDataReader):
+    """从本地图片文件夹读取校准数据"""
+
+    def __init__(self, folder, input_name, imgsz=640, max_images=200):
+        self.paths = list_images(folder, max_images)
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self.index = 0
+
+    def get_next(self):
+        while self.index < len(self.paths):
+            img = cv2.imread(self.paths[self.index])
+            self.index += 1
+            if img is not None:
+                return {self.input_name: letterbox_tensor(img, self.imgsz)}
+        return None
+
+    def rewind(self):
+        self.index = 0
+
+
+def quantize_int8(model_path, calib_dir, imgsz=640, max_images=200, progress=None):
+    """
+    使用本地图片文件夹做静态INT8量化。
+    返回量化后的ONNX模型路径（缓存在 .export_cache 中，可直接作为 onnx_int8 后端加载）。
+    """
+    if onnxruntime is None:
+        raise RuntimeError("未安装 onnxruntime，无法进行INT8量化 (pip install onnx onnxruntime)")
+    if not list_images(calib_dir, 1):
+        raise ValueError(f"校准文件夹中没有图片: {calib_dir}")
+
+    if progress:
+        progress("正在导出FP32 ONNX模型...")
+    fp32_path = get_exported_model(model_path, "onnx", imgsz)
+
+    session = onnxruntime.InferenceSession(fp32_path, providers=["CPUExecutionProvider"])
+    input_name = session.get_inputs()[0].name
+    del session
+
+    int8_path = export_artifact_path(model_path, "onnx_int8", imgsz)
+    reader = ImageFolderCalibrationReader(calib_dir, input_name, imgsz, max_images)
+    if progress:
+        progress(f"正在使用 {len(reader.paths)} 张图片校准并量化...")
+    quantize_static(
+        fp32_path, int8_path, reader,
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        weight_type=QuantType.QInt8,
+        activation_type=QuantType.QUInt8,
+        calibrate_method=CalibrationMethod.MinMax
+    )
+    return int8_path
+
+
+def detection_agreement(ref, test, iou_threshold=0.5):
+    """
+    两组检测结果的一致性：同类别且IoU>=阈值的框视为匹配（贪心匹配）。
+    返回 (匹配数, 参考框数, 测试框数)
+    """
+    if len(ref) == 0 or len(test) == 0:
+        return 0, len(ref), len(test)
+    iou = box_iou(ref.xyxy, test.xyxy)
+    iou[ref.cls[:, None] != test.cls[None, :]] = 0
+    matched = 0
+    for i in np.argsort(-ref.conf):
+        j = int(np.argmax(iou[i]))
+        if iou[i, j] >= iou_threshold:
+            matched += 1
+            iou[:, j] = 0
+    return matched, len(ref), len(test)
+
+
+def evaluate_int8(model_path, int8_path, val_dir, conf_threshold=0.5, device="cpu", max_images=200, progress=None):
+    """
+    在验证文件夹上对比FP32(.pt)模型与INT8模型。
+    返回报告字典: 平均耗时、加速比、检测一致性(F1)
+    """
+    paths = list_images(val_dir, max_images)
+    if not paths:
+        raise ValueError(f"验证文件夹中没有图片: {val_dir}")
+
+    fp32 = YOLO(model_path)
+    fp32.to(device)
+    int8 = YOLO(int8_path, task="detect")
+
+    fp32_time = int8_time = 0.0
+    matched = n_fp32 = n_int8 = 0
+    count = 0
+    for idx, path in enumerate(paths):
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        if idx == 0:
+            # 预热，避免首次推理的初始化时间影响对比
+            fp32.predict(img, conf=conf_threshold, verbose=False)
+            int8.predict(img, conf=conf_threshold, verbose=False, device=device)
+
+        t = time.perf_counter()
+        r_fp32 = fp32.predict(img, conf=conf_threshold, verbose=False)[0]
+        fp32_time += time.perf_counter() - t
+
+        t = time.perf_counter()
+        r_int8 = int8.predict(img, conf=conf_threshold, verbose=False, device=device)[0]
+        int8_time += time.perf_counter() - t
+
+        m, a, b = detection_agreement(Detections.from_result(r_fp32), Detections.from_result(r_int8))
+        matched += m
+        n_fp32 += a
+        n_int8 += b
+        count += 1
+
+        if progress and (idx + 1) % 10 == 0:
+            progress(f"正在评估: {idx + 1}/{len(paths)}")
+
+    if count == 0:
+        raise ValueError("验证文件夹中没有可读取的图片")
+
+    return {
+        'images': count,
+        'fp32_ms': fp32_time / count * 1000,
+        'int8_ms': int8_time / count * 1000,
+        'speedup': fp32_time / int8_time if int8_time > 0 else 0.0,
+        # 两边都没有检测到目标时视为完全一致
+        'agreement': 2 * matched / (n_fp32 + n_int8) if (n_fp32 + n_int8) > 0 else 1.0,
+        'fp32_boxes': n_fp32,
+        'int8_boxes': n_int8,
+        'int8_path': int8_path
+    }
@@ -0,0 +1,27 @@
+from PySide6.QtCore import QThread, Signal
+from core.quantization import quantize_int8, evaluate_int8
+
+class QuantizationThread(QThread):
+    progress_updated = Signal(str)
+    quantization_finished = Signal(dict)  # report from evaluate_int8
+    error_occurred = Signal(str)
+
+    def __init__(self, model_path, calib_dir, val_dir, imgsz=640, conf_threshold=0.5, device="cpu"):
+        super().__init__()
+        self.model_path = model_path
+        self.calib_dir = calib_dir
+        self.val_dir = val_dir
+        self.imgsz = imgsz
+        self.conf_threshold = conf_threshold
+        self.device = device
+
+    def run(self):
+        try:
+            int8_path = quantize_int8(self.model_path, self.calib_dir, self.imgsz,
+                                      progress=self.progress_updated.emit)
+            self.progress_updated.emit("量化完成，正在与FP32模型对比...")
+            report = evaluate_int8(self.model_path, int8_path, self.val_dir, self.conf_threshold, self.device,
+                                   progress=self.progress_updated.emit)
+            self.quantization_finished.emit(report)
+        except Exception as e:
+            self.error_occurred.emit(f"INT8量化失败: {str(e)}")
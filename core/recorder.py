@@ -0,0 +1,141 @@
+import os
+import glob
+import time
+import queue
+import datetime
+import threading
+import cv2
+from core.annotator import get_annotator
+
+
+class SegmentedRecorder:
+    """
+    后台分段录像：推理/界面线程只把 (帧, 检测结果) 放进有界队列，
+    绘制检测框和 cv2.VideoWriter 编码都在录像线程完成。
+    队列满时直接丢帧而不阻塞调用方；按时长切分MP4文件，并按总大小/文件数清理旧文件。
+    """
+
+    def __init__(self, name, output_dir, fps=15, segment_seconds=300, max_total_mb=2048, max_files=100,
+                 queue_size=30, fourcc="mp4v"):
+        self.name = name
+        self.output_dir = output_dir
+        self.fps = fps
+        self.segment_seconds = segment_seconds
+        self.max_total_bytes = max_total_mb * 1024 * 1024
+        self.max_files = max_files
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.running = False
+        self._thread = None
+        self.writer = None
+        self.current_file = None
+        self.segment_start = 0.0
+        self.segment_frames = 0
+        self.frame_size = None
+        self.received = 0
+        self.written = 0
+        self.dropped = 0
+        self.segments = 0
+
+    def start(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.running = True
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.running = False
+        if self._thread:
+            self._thread.join(timeout=5.0)
+
+    def write(self, frame, detections=None):
+        """提交一帧（可带检测结果，由录像线程绘制）；编码跟不上时丢弃并返回 False"""
+        if not self.running:
+            return False
+        self.received += 1
+        try:
+            self.queue.put_nowait((frame, detections, time.time()))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def run(self):
+        while self.running or not self.queue.empty():
+            try:
+                frame, detections, timestamp = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                if detections is not None and len(detections):
+                    frame = get_annotator().draw(frame, detections)
+                self.encode(frame, timestamp)
+            except Exception as e:
+                print(f"[Recorder] {self.name} 写入失败: {e}")
+        self.close_segment()
+
+    def encode(self, frame, timestamp):
+        size = (frame.shape[1], frame.shape[0])
+        if (self.writer is None or size != self.frame_size
+                or timestamp - self.segment_start >= self.segment_seconds):
+            self.close_segment()
+            self.open_segment(size, timestamp)
+
+        # 视频源帧率不固定：按时间戳补帧/跳帧，使回放速度与实际时间一致
+        due = int((timestamp - self.segment_start) * self.fps) + 1
+        if due <= self.segment_frames:
+            return
+        # 长时间无画面时最多补2秒，避免写入大量重复帧
+        repeats = min(due - self.segment_frames, self.fps * 2)
+        for _ in range(repeats):
+            self.writer.write(frame)
+        self.segment_frames = due
+        self.written += 1
+
+    def open_segment(self, size, timestamp):
+        stamp = datetime.datetime.fromtimestamp(timestamp).strftime("%Y%m%d_%H%M%S")
+        self.current_file = os.path.join(self.output_dir, f"{self.name}_{stamp}.mp4")
+        if os.path.exists(self.current_file):
+            self.current_file = os.path.join(self.output_dir, f"{self.name}_{stamp}_{self.segments}.mp4")
+        self.writer = cv2.VideoWriter(self.current_file, self.fourcc, self.fps, size)
+        if not self.writer.isOpened():
+            self.writer = None
+            raise RuntimeError(f"无法创建录像文件: {self.current_file}")
+        self.frame_size = size
+        self.segment_start = timestamp
+        self.segment_frames = 0
+        self.segments += 1
+        print(f"[Recorder] 开始新分段: {self.current_file}")
+
+    def close_segment(self):
+        if self.writer is None:
+            return
+        self.writer.release()
+        self.writer = None
+        self.enforce_retention()
+
+    def enforce_retention(self):
+        """删除本路最旧的分段，直到总大小和文件数都在限制内"""
+        files = sorted(glob.glob(os.path.join(self.output_dir, f"{glob.escape(self.name)}_*.mp4")),
+                       key=os.path.getmtime)
+        sizes = {f: os.path.getsize(f) for f in files}
+        total = sum(sizes.values())
+        while files and (total > self.max_total_bytes or len(files) > self.max_files):
+            oldest = files.pop(0)
+            try:
+                os.remove(oldest)
+                total -= sizes[oldest]
+                print(f"[Recorder] 已删除旧录像: {oldest}")
+            except OSError as e:
+                print(f"[Recorder] 删除旧录像失败: {e}")
+                break
+
+    def stats(self):
+        return {
+            'received': self.received,
+            'written': self.written,
+            'dropped': self.dropped,
+            'queued': self.queue.qsize(),
+            'segments': self.segments,
+            'current_file': self.current_file
+        }
@@ -0,0 +1,117 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from core.image_decode import decode_image
+
+
+class ResultCache:
+    """
+    按编码后图片字节内容缓存推理结果的LRU缓存。
+    键为 (图片字节的blake2b哈希, 模型/置信度设置)，值为 (解码后的帧, Detections)。
+    命中时可以同时跳过JPEG解码和推理；按条目数和字节数双重限制内存占用。
+    """
+
+    def __init__(self, max_entries=256, max_bytes=128 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, max_entries=None, max_bytes=None):
+        with self._lock:
+            if max_entries is not None:
+                self.max_entries = max_entries
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            self._evict()
+
+    @staticmethod
+    def content_digest(data):
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    @classmethod
+    def make_key(cls, data, settings):
+        return cls.content_digest(data), settings
+
+    @staticmethod
+    def entry_size(frame, detections):
+        size = frame.nbytes if frame is not None else 0
+        return size + detections.xyxy.nbytes + detections.conf.nbytes + detections.cls.nbytes
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, key, frame, detections):
+        size = self.entry_size(frame, detections)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[2]
+            self._entries[key] = (frame, detections, size)
+            self.current_bytes += size
+            self._evict()
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes):
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self.current_bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0
+            }
+
+
+_result_cache = ResultCache()
+
+
+def get_result_cache():
+    return _result_cache
+
+
+def cached_decode_infer(data, settings, infer, imgsz):
+    """
+    编码图片字节（JPEG/PNG）经过结果缓存得到 (frame, detections, cached)。
+    命中时同时跳过解码和推理；未命中时按模型输入尺寸缩小解码后调用 infer。
+    settings: 查找用的缓存键设置（见 YoloInference.cache_settings），None 时跳过查找
+    infer(frame, orig_shape) -> (detections, settings): 返回检测结果和实际运行推理的模型的缓存键设置，
+        设置为 None 时不写入缓存（例如复用上一帧结果）；detections 为 None 表示没有结果
+    解码失败时返回 (None, None, False)。
+    """
+    cache = _result_cache
+    digest = cache.content_digest(data)
+    if settings is not None:
+        cached = cache.get((digest, settings))
+        if cached is not None:
+            return cached[0], cached[1], True
+
+    frame, orig_shape = decode_image(data, imgsz)
+    if frame is None:
+        return None, None, False
+    detections, used_settings = infer(frame, orig_shape)
+    if detections is not None and used_settings is not None:
+        cache.put((digest, used_settings), frame, detections)
+    return frame, detections, False
@@ -0,0 +1,41 @@
+import os
+import threading
+import cv2
+
+# OpenCV 的 FFmpeg 后端在打开时读取该环境变量作为 AVDictionary 选项
+FFMPEG_OPTIONS_ENV = "OPENCV_FFMPEG_CAPTURE_OPTIONS"
+
+# 环境变量是进程全局的，多路同时打开时需要串行
+_options_lock = threading.Lock()
+
+
+def ffmpeg_capture_options(transport="tcp", low_delay=True):
+    """
+    生成RTSP的FFmpeg选项字符串（key;value|key;value）。
+    transport: tcp 不丢包但网络差时延迟会累积；udp 延迟最低但可能花屏
+    low_delay: 关闭FFmpeg的输入缓冲和重排序队列，避免缓存旧帧
+    """
+    options = [("rtsp_transport", transport)]
+    if low_delay:
+        options += [("fflags", "nobuffer"), ("flags", "low_delay"), ("max_delay", "0"), ("reorder_queue_size", "0")]
+    return "|".join(f"{key};{value}" for key, value in options)
+
+
+def open_rtsp_capture(url, transport="tcp", buffer_size=1, timeout_ms=5000, low_delay=True):
+    """用给定的传输方式/缓冲设置打开RTSP（或其他FFmpeg可读的）源，返回 cv2.VideoCapture"""
+    params = []
+    if timeout_ms:
+        params = [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, int(timeout_ms), cv2.CAP_PROP_READ_TIMEOUT_MSEC, int(timeout_ms)]
+    with _options_lock:
+        previous = os.environ.get(FFMPEG_OPTIONS_ENV)
+        os.environ[FFMPEG_OPTIONS_ENV] = ffmpeg_capture_options(transport, low_delay)
+        try:
+            cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG, params)
+        finally:
+            if previous is None:
+                os.environ.pop(FFMPEG_OPTIONS_ENV, None)
+            else:
+                os.environ[FFMPEG_OPTIONS_ENV] = previous
+    if cap.isOpened() and buffer_size:
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, int(buffer_size))
+    return cap
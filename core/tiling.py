@@ -0,0 +1,52 @@
+import numpy as np
+from core.detections import Detections, box_iou
+
+
+def tile_grid(height, width, tile_size=640, overlap=0.2):
+    """
+    把图片切成带重叠的方块，返回每块的 (x1, y1, x2, y2)。
+    最后一行/列贴齐图片边缘，保证整张图都被覆盖且每块尺寸一致。
+    """
+    tile_size = int(tile_size)
+    step = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, step))
+        positions.append(length - tile_size)
+        return positions
+
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in starts(height) for x in starts(width)]
+
+
+def nms(xyxy, conf, cls, iou_threshold=0.5):
+    """按类别的NMS，返回保留框的下标（按置信度从高到低）"""
+    order = np.argsort(-conf)
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        iou = box_iou(xyxy[i:i + 1], xyxy[rest])[0]
+        # 只抑制同类别的重叠框
+        suppressed = (iou > iou_threshold) & (cls[rest] == cls[i])
+        order = rest[~suppressed]
+    return np.array(keep, np.int64)
+
+
+def merge_tile_detections(parts, names=None, classes_dict=None, iou_threshold=0.5):
+    """
+    合并各切块的检测结果。
+    parts: [(Detections, (x_offset, y_offset)), ...]，框坐标映射回整图后做按类别NMS。
+    """
+    parts = [(d, offset) for d, offset in parts if len(d)]
+    if not parts:
+        return Detections.empty(names, classes_dict)
+
+    xyxy = np.concatenate([d.xyxy + np.array([ox, oy, ox, oy], np.float32) for d, (ox, oy) in parts])
+    conf = np.concatenate([d.conf for d, _ in parts])
+    cls = np.concatenate([d.cls for d, _ in parts])
+    keep = nms(xyxy, conf, cls, iou_threshold)
+    return Detections(xyxy[keep], conf[keep], cls[keep], names, classes_dict)
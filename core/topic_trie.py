@@ -0,0 +1,138 @@
+import threading
+
+
+class TopicNode:
+    """主题树节点；发布后不再修改（写操作复制路径上的节点）"""
+
+    __slots__ = ('children', 'subscribers')
+
+    def __init__(self, children=None, subscribers=None):
+        self.children = children if children is not None else {}         # 主题层级 -> TopicNode
+        self.subscribers = subscribers if subscribers is not None else {}  # client_id -> QoS
+
+
+EMPTY_NODE = TopicNode()
+
+
+def valid_filter(topic_filter):
+    """检查订阅过滤器：'#' 只能是最后一级，'+'/'#' 必须独占一级"""
+    if not topic_filter:
+        return False
+    levels = topic_filter.split('/')
+    for i, level in enumerate(levels):
+        if '#' in level and (level != '#' or i != len(levels) - 1):
+            return False
+        if '+' in level and level != '+':
+            return False
+    return True
+
+
+class TopicTrie:
+    """
+    MQTT订阅主题树，支持 '+'（单级）和 '#'（多级）通配符。
+    写操作（订阅/取消订阅）在锁内复制从根到目标节点的路径后替换根节点（写时复制）；
+    读操作 match 只读取当前根节点的快照，不加锁，开销与主题层级数相关而与客户端数无关。
+    """
+
+    def __init__(self):
+        self.root = EMPTY_NODE
+        self._lock = threading.Lock()
+        self._filters = {}  # client_id -> {topic_filter: qos}，用于断开时清理
+
+    def subscribe(self, client_id, topic_filter, qos=0):
+        if not valid_filter(topic_filter):
+            raise ValueError(f"无效的主题过滤器: {topic_filter}")
+        with self._lock:
+            self.root = self._insert(self.root, topic_filter.split('/'), 0, client_id, qos)
+            self._filters.setdefault(client_id, {})[topic_filter] = qos
+
+    def unsubscribe(self, client_id, topic_filter):
+        with self._lock:
+            filters = self._filters.get(client_id)
+            if not filters or topic_filter not in filters:
+                return False
+            del filters[topic_filter]
+            if not filters:
+                del self._filters[client_id]
+            self.root = self._remove(self.root, topic_filter.split('/'), 0, client_id) or EMPTY_NODE
+            return True
+
+    def remove_client(self, client_id):
+        """删除客户端的全部订阅"""
+        with self._lock:
+            filters = self._filters.pop(client_id, {})
+            root = self.root
+            for topic_filter in filters:
+                root = self._remove(root, topic_filter.split('/'), 0, client_id) or EMPTY_NODE
+            self.root = root
+
+    def subscriptions(self, client_id):
+        with self._lock:
+            return dict(self._filters.get(client_id, {}))
+
+    def _insert(self, node, levels, depth, client_id, qos):
+        if depth == len(levels):
+            subscribers = dict(node.subscribers)
+            subscribers[client_id] = qos
+            return TopicNode(node.children, subscribers)
+        level = levels[depth]
+        children = dict(node.children)
+        children[level] = self._insert(node.children.get(level, EMPTY_NODE), levels, depth + 1, client_id, qos)
+        return TopicNode(children, node.subscribers)
+
+    def _remove(self, node, levels, depth, client_id):
+        """返回删除后的新节点；节点变空时返回 None 以便从父节点剪除"""
+        if depth == len(levels):
+            if client_id not in node.subscribers:
+                return node
+            subscribers = dict(node.subscribers)
+            del subscribers[client_id]
+            new_node = TopicNode(node.children, subscribers)
+        else:
+            level = levels[depth]
+            child = node.children.get(level)
+            if child is None:
+                return node
+            new_child = self._remove(child, levels, depth + 1, client_id)
+            if new_child is child:
+                return node
+            children = dict(node.children)
+            if new_child is None:
+                del children[level]
+            else:
+                children[level] = new_child
+            new_node = TopicNode(children, node.subscribers)
+        if not new_node.children and not new_node.subscribers:
+            return None
+        return new_node
+
+    def match(self, topic):
+        """返回订阅了该主题的 {client_id: QoS}（同一客户端多个过滤器匹配时取最大QoS）"""
+        levels = topic.split('/')
+        # 以 $ 开头的系统主题不匹配首级通配符
+        system_topic = topic.startswith('$')
+        result = {}
+
+        def add(subscribers):
+            for client_id, qos in subscribers.items():
+                if qos > result.get(client_id, -1):
+                    result[client_id] = qos
+
+        stack = [(self.root, 0)]
+        while stack:
+            node, depth = stack.pop()
+            wildcard_allowed = depth > 0 or not system_topic
+            multi = node.children.get('#')
+            if multi is not None and wildcard_allowed:
+                # 'a/#' 同时匹配 'a' 本身和其下所有层级
+                add(multi.subscribers)
+            if depth == len(levels):
+                add(node.subscribers)
+                continue
+            child = node.children.get(levels[depth])
+            if child is not None:
+                stack.append((child, depth + 1))
+            single = node.children.get('+')
+            if single is not None and wildcard_allowed:
+                stack.append((single, depth + 1))
+        return result
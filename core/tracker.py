@@ -0,0 +1,166 @@
+import numpy as np
+from core.detections import Detections, box_iou
+
+
+class KalmanBoxTrack:
+    """
+    单个目标的匀速卡尔曼滤波跟踪（类似SORT/DeepSORT）。
+    状态: [cx, cy, w, h, vx, vy, vw, vh]
+    """
+
+    F = np.eye(8)
+    F[:4, 4:] = np.eye(4)
+    H = np.eye(4, 8)
+
+    def __init__(self, track_id, box, conf, cls_id):
+        self.track_id = track_id
+        self.cls = cls_id
+        self.conf = conf          # 检测置信度，每次只预测不更新时衰减
+        self.x = np.zeros(8)
+        self.x[:4] = self.to_cxcywh(box)
+        h = max(self.x[3], 1.0)
+        self.P = np.diag(np.square([h / 10, h / 10, h / 10, h / 10, h / 16, h / 16, h / 16, h / 16]))
+        self.hits = 1
+        self.missed = 0           # 连续未匹配的检测次数
+
+    @staticmethod
+    def to_cxcywh(box):
+        x1, y1, x2, y2 = box
+        return np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1])
+
+    def box(self):
+        cx, cy, w, h = self.x[:4]
+        w, h = max(w, 1.0), max(h, 1.0)
+        return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], np.float32)
+
+    def predict(self, confidence_decay=1.0):
+        h = max(self.x[3], 1.0)
+        # 噪声与目标尺寸成比例
+        q = np.square([h / 20, h / 20, h / 20, h / 20, h / 160, h / 160, h / 160, h / 160])
+        self.x = self.F @ self.x
+        self.P = self.F @ self.P @ self.F.T + np.diag(q)
+        self.conf *= confidence_decay
+
+    def update(self, box, conf):
+        h = max(self.x[3], 1.0)
+        R = np.diag(np.square([h / 20, h / 20, h / 20, h / 20]))
+        S = self.H @ self.P @ self.H.T + R
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ (self.to_cxcywh(box) - self.H @ self.x)
+        self.P = (np.eye(8) - K @ self.H) @ self.P
+        self.conf = conf
+        self.hits += 1
+
+
+class IouTracker:
+    """
+    检测间隔帧用的轻量跟踪器：
+    - 检测帧调用 update()，先预测到当前帧，再按类别+IoU贪心匹配已有轨迹，未匹配的检测创建新轨迹（分配稳定ID）
+    - 中间帧调用 predict()，用卡尔曼预测传播上一次检测到的框
+    - needs_detection() 在达到检测间隔或轨迹置信度衰减过低时返回 True
+    """
+
+    def __init__(self, detect_interval=3, min_confidence=0.3, iou_threshold=0.3, max_missed=2,
+                 confidence_decay=0.9):
+        self.detect_interval = max(1, int(detect_interval))
+        self.min_confidence = min_confidence
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed          # 连续多少次检测未匹配后删除轨迹
+        self.confidence_decay = confidence_decay
+        self.tracks = []
+        self.next_id = 1
+        self.frames_since_detection = 0
+        self.names = {}
+        self.classes_dict = None
+        self.orig_shape = None
+        self.detected_frames = 0
+        self.tracked_frames = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """根据 config.json 的 tracking 配置创建，未启用时返回 None"""
+        if not config or not config.get("enabled", False):
+            return None
+        return cls(
+            detect_interval=config.get("detect_interval", 3),
+            min_confidence=config.get("min_confidence", 0.3)
+        )
+
+    def needs_detection(self):
+        if self.frames_since_detection >= self.detect_interval - 1:
+            return True
+        active = [t.conf for t in self.tracks if t.missed == 0]
+        return bool(active) and min(active) < self.min_confidence
+
+    def update(self, detections):
+        """用新检测结果更新轨迹，返回带 track_id 的 Detections"""
+        self.names = detections.names
+        self.classes_dict = detections.classes_dict
+        self.orig_shape = detections.orig_shape
+        self.frames_since_detection = 0
+        self.detected_frames += 1
+
+        # 先把每条轨迹预测到当前帧再做关联，否则速度估计滞后，快速目标会丢失ID
+        for track in self.tracks:
+            track.predict()
+
+        track_boxes = np.array([t.box() for t in self.tracks], np.float32).reshape(-1, 4)
+        iou = box_iou(detections.xyxy, track_boxes)
+        if iou.size:
+            track_cls = np.array([t.cls for t in self.tracks])
+            iou[detections.cls[:, None] != track_cls[None, :]] = 0
+
+        track_ids = np.zeros(len(detections), np.int32)
+        matched_tracks = set()
+        # 按IoU从大到小贪心匹配
+        if iou.size:
+            for flat in np.argsort(-iou, axis=None):
+                d, t = np.unravel_index(flat, iou.shape)
+                if iou[d, t] < self.iou_threshold:
+                    break
+                if track_ids[d] or t in matched_tracks:
+                    continue
+                self.tracks[t].update(detections.xyxy[d], float(detections.conf[d]))
+                track_ids[d] = self.tracks[t].track_id
+                matched_tracks.add(t)
+
+        for i, track in enumerate(self.tracks):
+            track.missed = 0 if i in matched_tracks else track.missed + 1
+
+        for d in np.flatnonzero(track_ids == 0):
+            track = KalmanBoxTrack(self.next_id, detections.xyxy[d], float(detections.conf[d]), int(detections.cls[d]))
+            self.tracks.append(track)
+            track_ids[d] = self.next_id
+            self.next_id += 1
+
+        self.tracks = [t for t in self.tracks if t.missed <= self.max_missed]
+        return Detections(detections.xyxy, detections.conf, detections.cls, self.names, self.classes_dict, track_ids,
+                          self.orig_shape)
+
+    def predict(self):
+        """不运行检测器，用卡尔曼预测传播上次检测到的目标"""
+        self.frames_since_detection += 1
+        self.tracked_frames += 1
+        for track in self.tracks:
+            track.predict(self.confidence_decay)
+
+        active = [t for t in self.tracks if t.missed == 0]
+        if not active:
+            return Detections.empty(self.names, self.classes_dict)
+        return Detections(
+            np.array([t.box() for t in active], np.float32),
+            np.array([t.conf for t in active], np.float32),
+            np.array([t.cls for t in active], np.int32),
+            self.names, self.classes_dict,
+            np.array([t.track_id for t in active], np.int32),
+            self.orig_shape
+        )
+
+    def stats(self):
+        total = self.detected_frames + self.tracked_frames
+        return {
+            'tracks': sum(1 for t in self.tracks if t.missed == 0),
+            'detected_frames': self.detected_frames,
+            'tracked_frames': self.tracked_frames,
+            'tracked_ratio': self.tracked_frames / total if total else 0.0
+        }
@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import queue
+import threading
+import cv2
+from PySide6.QtCore import QThread, Signal
+from core.inference import YoloInference
+from core.annotator import get_annotator
+
+
+class VideoFileThread(QThread):
+    """
+    Run the model over a recorded video file.
+
+    Three stages joined by bounded queues:
+    - decode thread: reads frames ahead of the model
+    - this thread: batches frames into predict_batch (fast mode) or paces them
+      to the source frame rate (realtime mode, frames that fall behind reuse the
+      latest detections instead of delaying playback)
+    - writer thread: annotates and encodes the output video and writes one JSONL
+      line of detections per frame
+    """
+    progress_updated = Signal(int, int, float)  # processed frames, total frames, throughput (frames/s)
+    frame_processed = Signal(object, object)  # frame, detections (preview, annotated by the display)
+    processing_finished = Signal(dict)  # summary
+    error_occurred = Signal(str)
+
+    def __init__(self, video_path, model_path, conf_threshold, classes_dict, device="cpu", backend="torch",
+                 batch_size=8, output_dir="video_results", realtime=False, save_video=True, save_jsonl=True,
+                 preview_interval=0.1):
+        super().__init__()
+        self.video_path = video_path
+        self.model_path = model_path
+        self.conf_threshold = conf_threshold
+        self.classes_dict = classes_dict
+        self.device = device
+        self.backend = backend
+        self.realtime = realtime
+        self.batch_size = 1 if realtime else max(1, int(batch_size))
+        self.output_dir = output_dir
+        self.save_video = save_video
+        self.save_jsonl = save_jsonl
+        # Fast mode produces frames far quicker than the UI can paint them
+        self.preview_interval = 0.0 if realtime else preview_interval
+        self.running = False
+        self.decode_queue = queue.Queue(maxsize=self.batch_size * 4)
+        self.write_queue = queue.Queue(maxsize=self.batch_size * 4)
+        self.processed = 0
+        self.skipped = 0
+        self.inference_ms = 0.0
+
+    def output_paths(self):
+        stem = os.path.splitext(os.path.basename(self.video_path))[0]
+        base = os.path.join(self.output_dir, f"{stem}_result")
+        return (base + ".mp4" if self.save_video else None,
+                base + ".jsonl" if self.save_jsonl else None)
+
+    def decode_loop(self, cap):
+        """Decode stage: read ahead until the queue is full, then wait for the model"""
+        index = 0
+        try:
+            while self.running:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                pos_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+                while self.running:
+                    try:
+                        self.decode_queue.put((index, pos_ms, frame), timeout=0.2)
+                        break
+                    except queue.Full:
+                        continue
+                index += 1
+        finally:
+            cap.release()
+            self.put_blocking(self.decode_queue, None)
+
+    def write_loop(self, video_path, jsonl_path, fps, size):
+        """Write stage: annotate + encode the output video and dump detections as JSONL"""
+        writer = None
+        if video_path:
+            writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+            if not writer.isOpened():
+                self.error_occurred.emit(f"无法创建输出视频: {video_path}")
+                writer = None
+        jsonl = open(jsonl_path, "w", encoding="utf-8") if jsonl_path else None
+        try:
+            while True:
+                item = self.write_queue.get()
+                if item is None:
+                    break
+                index, pos_ms, frame, detections, reused = item
+                if jsonl:
+                    record = {
+                        "frame": index,
+                        "time_ms": round(pos_ms, 1),
+                        "detections": detections.to_list() if detections is not None else []
+                    }
+                    if reused:
+                        record["reused"] = True
+                    jsonl.write(json.dumps(record, ensure_ascii=False) + "\n")
+                if writer:
+                    if detections is not None and len(detections):
+                        frame = get_annotator().draw(frame, detections)
+                    writer.write(frame)
+        finally:
+            if writer:
+                writer.release()
+            if jsonl:
+                jsonl.close()
+
+    def put_blocking(self, q, item):
+        while True:
+            try:
+                q.put(item, timeout=0.2)
+                return
+            except queue.Full:
+                if not self.running:
+                    # Consumer may already be gone; make room for the sentinel
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def next_batch(self):
+        """Collect up to batch_size decoded frames; returns (items, finished)"""
+        items = []
+        while len(items) < self.batch_size:
+            try:
+                item = self.decode_queue.get(timeout=0.5)
+            except queue.Empty:
+                if not self.running:
+                    return items, True
+                continue
+            if item is None:
+                return items, True
+            items.append(item)
+        return items, False
+
+    def run(self):
+        cap = cv2.VideoCapture(self.video_path)
+        if not cap.isOpened():
+            self.error_occurred.emit(f"无法打开视频文件: {self.video_path}")
+            return
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+        yolo = None
+        decoder = writer = None
+        video_path, jsonl_path = self.output_paths()
+        try:
+            yolo = YoloInference(self.model_path, self.conf_threshold, self.classes_dict, self.device, self.backend)
+            if video_path or jsonl_path:
+                os.makedirs(self.output_dir, exist_ok=True)
+
+            self.running = True
+            decoder = threading.Thread(target=self.decode_loop, args=(cap,), daemon=True)
+            decoder.start()
+            writer = threading.Thread(target=self.write_loop, args=(video_path, jsonl_path, fps, size), daemon=True)
+            writer.start()
+
+            start = time.perf_counter()
+            last_progress = last_preview = 0.0
+            last_detections = None
+            finished = False
+            reused = False
+            while self.running and not finished:
+                items, finished = self.next_batch()
+                if not items:
+                    continue
+
+                if self.realtime:
+                    index, pos_ms, frame = items[0]
+                    due = start + index / fps
+                    now = time.perf_counter()
+                    if now > due + 1.0 / fps and last_detections is not None:
+                        # Behind the source clock: keep playback real-time, reuse the last result
+                        self.skipped += 1
+                        reused = True
+                        outputs = [(last_detections, None, 0.0)]
+                    else:
+                        reused = False
+                        if now < due:
+                            time.sleep(due - now)
+                        outputs = yolo.predict_batch([frame], 1, annotate=False)
+                else:
+                    outputs = yolo.predict_batch([f for _, _, f in items], self.batch_size, annotate=False)
+
+                for (index, pos_ms, frame), (detections, _, inference_time) in zip(items, outputs):
+                    last_detections = detections
+                    self.inference_ms += inference_time
+                    self.put_blocking(self.write_queue, (index, pos_ms, frame, detections, reused))
+                    self.processed += 1
+
+                now = time.perf_counter()
+                if now - last_preview >= self.preview_interval:
+                    last_preview = now
+                    frame = items[-1][2]
+                    self.frame_processed.emit(frame, last_detections)
+                if now - last_progress >= 0.25 or finished:
+                    last_progress = now
+                    self.progress_updated.emit(self.processed, total, self.processed / max(now - start, 1e-6))
+
+            elapsed = time.perf_counter() - start
+            # Let the writer drain every queued frame before stopping the other stages
+            self.put_blocking(self.write_queue, None)
+            writer.join()
+            self.running = False
+            summary = {
+                'frames': self.processed,
+                'total': total,
+                'skipped': self.skipped,
+                'seconds': elapsed,
+                'fps': self.processed / elapsed if elapsed > 0 else 0.0,
+                'avg_inference_ms': self.inference_ms / max(self.processed - self.skipped, 1),
+                'video_path': video_path,
+                'jsonl_path': jsonl_path
+            }
+            print(f"[VideoFileThread] 处理完成 {self.processed} 帧, {summary['fps']:.1f} 帧/秒, 跳过 {self.skipped} 帧")
+            self.processing_finished.emit(summary)
+        except Exception as e:
+            self.error_occurred.emit(f"视频推理失败: {str(e)}")
+        finally:
+            self.running = False
+            if decoder:
+                decoder.join(timeout=2.0)
+            else:
+                cap.release()
+            if writer and writer.is_alive():
+                self.put_blocking(self.write_queue, None)
+                writer.join(timeout=5.0)
+            if yolo:
+                yolo.release()
+
+    def stop(self):
+        self.running = False
+        self.wait()
@@ -1,53 +1,250 @@
 import cv2
+import time
+import threading
+from collections import OrderedDict
 from PySide6.QtCore import QThread, Signal
 from core.inference import YoloInference
+from core.motion_gate import MotionGate
+from core.tracker import IouTracker
+from core.pipeline import LatestFrameSlot, FpsMeter
+from core.mjpeg_reader import MjpegReader
+from core.rtsp_capture import open_rtsp_capture
+from core.image_decode import decode_image
+from core.model_pool import get_model_pool
 
 class VideoThread(QThread):
-    frame_processed = Signal(object, object) # annotated_frame, detections
+    frame_processed = Signal(object, object) # frame, detections (annotated on demand by the display)
     connection_status = Signal(bool, str) # success, message
 
-    def __init__(self, camera_id=0, model_path="yolov8n.pt", conf_threshold=0.5, classes_dict=None, device="cpu"):
+    def __init__(self, camera_id=0, model_path="yolov8n.pt", conf_threshold=0.5, classes_dict=None, device="cpu", backend="torch", motion_config=None, tracking_config=None, native_mjpeg=True, scheduler=None, source_name="摄像头", priority=1.0, rtsp_config=None):
         super().__init__()
         self.camera_id = camera_id
         self.model_path = model_path
         self.conf_threshold = conf_threshold
         self.classes_dict = classes_dict
         self.device = device
+        self.backend = backend
+        self.motion_gate = MotionGate.from_config(motion_config)
+        self.tracker = IouTracker.from_config(tracking_config)
+        # http:// sources are read with the built-in MJPEG parser instead of cv2.VideoCapture
+        self.native_mjpeg = native_mjpeg
+        # Optional shared InferenceScheduler: frames are batched with other sources on one model
+        self.scheduler = scheduler
+        self.source_name = source_name
+        self.priority = priority
+        # rtsp:// sources: transport / buffer / frame-dropping options (see core/rtsp_capture.py)
+        self.rtsp_config = rtsp_config or {}
+        self.drop_stale = str(camera_id).startswith("rtsp://") and self.rtsp_config.get("drop_frames", True)
         self.running = False
+        # Capture and inference run in separate threads joined by a latest-frame slot
+        self.slot = LatestFrameSlot()
+        self.capture_fps = FpsMeter()
+        self.inference_fps = FpsMeter()
+        self.frame_age_ms = 0.0
+        # Capture-to-display latency: capture time of each emitted frame until the UI shows it
+        self.emitted_at = OrderedDict()
+        self._emitted_lock = threading.Lock()
+        self.display_latency_ms = 0.0
+        self.skipped_decode = 0
+
+    def set_motion_config(self, motion_config):
+        """Replace the motion gate (None/disabled turns gating off)"""
+        self.motion_gate = MotionGate.from_config(motion_config)
+
+    def get_stats(self):
+        stats = {
+            'pipeline': {
+                'capture_fps': self.capture_fps.fps(),
+                'inference_fps': self.inference_fps.fps(),
+                'frame_age_ms': self.frame_age_ms,
+                'dropped': self.slot.dropped,
+                'display_latency_ms': self.display_latency_ms,
+                'skipped_decode': self.skipped_decode
+            }
+        }
+        if self.motion_gate:
+            stats['motion'] = self.motion_gate.stats()
+        if self.tracker:
+            stats['tracking'] = self.tracker.stats()
+        return stats
+
+    def detection_mode(self, frame, detections):
+        """
+        Decide how this frame gets its detections:
+        'detect' runs the detector, 'track' propagates the tracked boxes,
+        'reuse' keeps the last detections because the scene hasn't changed.
+        """
+        if detections is None:
+            return 'detect'
+        tracker = self.tracker
+        if tracker and not tracker.needs_detection():
+            return 'track'
+        gate = self.motion_gate
+        if gate and not gate.should_infer(frame):
+            # Don't advance the tracker on a static scene: predicting every frame
+            # would drift the boxes and decay their confidence
+            return 'reuse'
+        return 'detect'
+
+    def capture_loop(self, cap):
+        """Capture stage: keep reading so the driver buffer never holds stale frames"""
+        while self.running:
+            if self.drop_stale:
+                # Pull every packet off the stream, but only convert a frame when
+                # inference has taken the previous one
+                ret = cap.grab()
+                if ret and self.slot.has_pending():
+                    self.capture_fps.tick()
+                    self.skipped_decode += 1
+                    continue
+                frame = cap.retrieve()[1] if ret else None
+                ret = frame is not None
+            else:
+                ret, frame = cap.read()
+            if ret:
+                self.capture_fps.tick()
+                self.slot.put(frame)
+            else:
+                time.sleep(0.1)
+        self.slot.close()
+
+    def open_capture(self):
+        if str(self.camera_id).startswith("rtsp://"):
+            config = self.rtsp_config
+            return open_rtsp_capture(
+                self.camera_id,
+                transport=config.get("transport", "tcp"),
+                buffer_size=config.get("buffer_size", 1),
+                timeout_ms=config.get("timeout_ms", 5000),
+                low_delay=config.get("low_delay", True)
+            )
+        cap = cv2.VideoCapture(self.camera_id)
+        if cap.isOpened():
+            # Optimize camera
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return cap
+
+    def mark_displayed(self, frame):
+        """Called by the UI once an emitted frame is on screen"""
+        with self._emitted_lock:
+            captured_at = self.emitted_at.pop(id(frame), None)
+        if captured_at is None:
+            return
+        latency = (time.perf_counter() - captured_at) * 1000
+        self.display_latency_ms = latency if self.display_latency_ms == 0.0 else self.display_latency_ms * 0.9 + latency * 0.1
 
     def run(self):
         self.running = True
-        # Initialize YOLO in the thread
-        yolo = YoloInference(self.model_path, self.conf_threshold, self.classes_dict, self.device)
+        # Initialize YOLO in the thread, or register with the shared scheduler
+        if self.scheduler:
+            yolo = None
+            source = self.scheduler.register(self.source_name, self.priority)
+        else:
+            yolo = YoloInference(self.model_path, self.conf_threshold, self.classes_dict, self.device, self.backend)
+            source = None
         
         self.connection_status.emit(False, "正在连接...")
-        cap = cv2.VideoCapture(self.camera_id)
-        
-        if not cap.isOpened():
+        reader = self.open_mjpeg()
+        cap = None
+        capture_thread = None
+        if reader is None:
+            cap = self.open_capture()
+
+            if not cap.isOpened():
+                self.connection_status.emit(False, "无法连接到视频源")
+                self.running = False
+                self.release_inference(yolo, source)
+                return
+
+            capture_thread = threading.Thread(target=self.capture_loop, args=(cap,), daemon=True)
+            capture_thread.start()
+        elif reader is False:
             self.connection_status.emit(False, "无法连接到视频源")
             self.running = False
+            self.release_inference(yolo, source)
             return
 
         self.connection_status.emit(True, "已连接")
-        
-        # Optimize camera
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
 
+        # Inference stage: always works on the newest captured frame
+        detections = None
         while self.running:
-            ret, frame = cap.read()
-            if ret:
-                # Run inference
-                detections, annotated, _ = yolo.predict(frame)
-                self.frame_processed.emit(annotated, detections)
+            item = self.slot.get(timeout=0.5)
+            if item is None:
+                continue
+            frame, captured_at = item
+            if isinstance(frame, bytes):
+                # MJPEG: only the newest JPEG is decoded, when inference is ready for it,
+                # at the smallest scale that still covers the model input size
+                frame, orig_shape = decode_image(frame, get_model_pool().imgsz)
+                if frame is None:
+                    continue
             else:
-                self.msleep(100)
-            
-            # No sleep needed here, inference takes time, so it self-regulates. 
-            # But to prevent 100% CPU on fast inference, maybe a tiny sleep if needed.
-            # Actually, cap.read() blocks until frame is available usually.
-            
-        cap.release()
+                orig_shape = None
+            tracker = self.tracker
+            mode = self.detection_mode(frame, detections)
+            if mode == 'detect':
+                # Run inference (detections only, drawing happens at the display step)
+                if source:
+                    result = source.infer(frame, orig_shape)
+                    if result is None:
+                        # Scheduler stopped or failed to load the model
+                        continue
+                    detections = result
+                else:
+                    detections, _, _ = yolo.predict(frame, annotate=False, orig_shape=orig_shape)
+                if tracker:
+                    detections = tracker.update(detections)
+            elif mode == 'track':
+                # In-between frame: propagate the tracked boxes instead of running YOLO
+                detections = tracker.predict()
+            # Otherwise the scene hasn't changed: reuse the last detections
+            self.inference_fps.tick()
+            self.frame_age_ms = (time.perf_counter() - captured_at) * 1000
+            with self._emitted_lock:
+                self.emitted_at[id(frame)] = captured_at
+                while len(self.emitted_at) > 32:
+                    # Frames the UI never showed (e.g. hidden tab)
+                    self.emitted_at.popitem(last=False)
+            self.frame_processed.emit(frame, detections)
+
+        if reader:
+            reader.stop()
+        else:
+            capture_thread.join(timeout=2.0)
+            cap.release()
+        self.release_inference(yolo, source)
+
+    def release_inference(self, yolo, source):
+        if yolo:
+            yolo.release()
+        if source:
+            source.close()
+
+    def open_mjpeg(self):
+        """
+        Try the native MJPEG reader for http:// sources.
+        Returns the reader, None to fall back to cv2.VideoCapture (not an http
+        source, or not a multipart stream), or False if the source is unreachable.
+        """
+        if not self.native_mjpeg or not str(self.camera_id).startswith("http://"):
+            return None
+        try:
+            reader = MjpegReader(self.camera_id)
+            reader.open()
+        except ValueError as e:
+            print(f"[VideoThread] 非MJPEG流，使用 OpenCV 读取: {e}")
+            return None
+        except OSError as e:
+            print(f"[VideoThread] MJPEG连接失败: {e}")
+            return False
+        # Dropped connections are retried by the reader; surface its status to the UI
+        reader.on_status = lambda connected, message: self.connection_status.emit(connected, message)
+        self.slot = reader.slot
+        self.capture_fps = reader.fps
+        return reader
 
     def stop(self):
         self.running = False
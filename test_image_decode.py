@@ -0,0 +1,72 @@
+import sys
+import cv2
+import numpy as np
+from core.image_decode import decode_image, jpeg_size, reduction_factor
+
+
+def encode(width, height, ext=".jpg"):
+    frame = np.zeros((height, width, 3), np.uint8)
+    cv2.rectangle(frame, (width // 4, height // 4), (width // 2, height // 2), (0, 255, 0), -1)
+    ok, buf = cv2.imencode(ext, frame)
+    assert ok
+    return buf.tobytes()
+
+
+def test_jpeg_size():
+    print("\n测试1: 只解析JPEG头得到宽高")
+    assert jpeg_size(encode(1920, 1080)) == (1920, 1080)
+    assert jpeg_size(encode(641, 479)) == (641, 479)
+    assert jpeg_size(encode(64, 64, ".png")) is None, "PNG不应被当作JPEG"
+    assert jpeg_size(b"\xff\xd8\xff") is None, "头不完整时应返回 None"
+    print("✓ 宽高正确")
+
+
+def test_reduction_factor():
+    print("\n测试2: 缩小倍数保证长边不小于模型输入尺寸")
+    assert reduction_factor(3840, 2160, 480)[0] == 8
+    assert reduction_factor(3840, 2160, 640)[0] == 4
+    assert reduction_factor(1920, 1080, 640)[0] == 2
+    assert reduction_factor(1280, 720, 640)[0] == 2
+    assert reduction_factor(1279, 720, 640)[0] == 1
+    print("✓ 缩小倍数正确")
+
+
+def test_decode_reduced():
+    print("\n测试3: 缩小解码的帧尺寸和 orig_shape")
+    frame, orig_shape = decode_image(encode(1920, 1080), 640)
+    assert frame.shape == (540, 960, 3), frame.shape
+    assert orig_shape == (1080, 1920), orig_shape
+
+    frame, orig_shape = decode_image(encode(3840, 2160), 480)
+    assert frame.shape == (270, 480, 3), frame.shape
+    assert orig_shape == (2160, 3840)
+
+    # 竖屏图片
+    frame, orig_shape = decode_image(encode(1080, 1920), 640)
+    assert frame.shape == (960, 540, 3) and orig_shape == (1920, 1080)
+    print("✓ 缩小解码正确")
+
+
+def test_decode_full():
+    print("\n测试4: 不需要缩小或不是JPEG时按原尺寸解码")
+    frame, orig_shape = decode_image(encode(640, 480), 640)
+    assert frame.shape == (480, 640, 3) and orig_shape is None
+    frame, orig_shape = decode_image(encode(1920, 1080))
+    assert frame.shape == (1080, 1920, 3) and orig_shape is None
+    frame, orig_shape = decode_image(encode(1920, 1080, ".png"), 640)
+    assert frame.shape == (1080, 1920, 3) and orig_shape is None
+    frame, orig_shape = decode_image(np.frombuffer(encode(1920, 1080), np.uint8), 640)
+    assert frame.shape == (540, 960, 3) and orig_shape == (1080, 1920)
+    print("✓ 原尺寸解码正确")
+
+
+if __name__ == "__main__":
+    try:
+        test_jpeg_size()
+        test_reduction_factor()
+        test_decode_reduced()
+        test_decode_full()
+    except AssertionError as e:
+        print(f"✗ 测试失败: {e}")
+        sys.exit(1)
+    print("\n所有测试完成!")
@@ -0,0 +1,114 @@
+import sys
+import threading
+import numpy as np
+import core.inference_scheduler as inference_scheduler
+from core.inference_scheduler import InferenceScheduler, InferenceRequest
+
+
+class FakeYolo:
+    """代替 YoloInference，记录每个批次的大小"""
+
+    def __init__(self, model_path, conf_threshold, classes_dict, device, backend):
+        self.conf_threshold = conf_threshold
+        self.follow_active = False
+        self.batch_sizes = []
+
+    def predict_batch(self, frames, batch_size, annotate=False, orig_shapes=None):
+        self.batch_sizes.append(len(frames))
+        return [(f"det{int(frame[0])}", None, 0.0) for frame in frames]
+
+    def cache_settings(self):
+        return ("fake.pt", "cpu", "torch", self.conf_threshold)
+
+    def release(self):
+        pass
+
+
+def manual_scheduler(max_batch):
+    # 不启动推理线程，直接调用 next_batch 检查调度顺序
+    scheduler = InferenceScheduler("fake.pt", 0.5, {}, max_batch=max_batch, max_latency_ms=0)
+    scheduler._running = True
+    return scheduler
+
+
+def test_weighted_fair_share():
+    print("\n测试1: 模型跟不上时按优先级加权公平分配")
+    scheduler = manual_scheduler(max_batch=1)
+    sources = [scheduler.register("camera", 2.0), scheduler.register("http", 1.0), scheduler.register("mqtt", 1.0)]
+    served = {s.name: 0 for s in sources}
+    for _ in range(400):
+        # 每路输入始终有新帧在等待
+        for source in sources:
+            if source.pending is None:
+                scheduler.submit(source, InferenceRequest(None))
+        batch = scheduler.next_batch()
+        assert len(batch) == 1
+        served[batch[0][0].name] += 1
+    # 优先级 2:1:1 -> 200:100:100
+    assert served == {"camera": 200, "http": 100, "mqtt": 100}, served
+    print(f"✓ 分配 {served}")
+
+
+def test_batch_and_replace():
+    print("\n测试2: 不同来源的帧组成一个批次，未取走的旧帧被新帧替换")
+    scheduler = manual_scheduler(max_batch=4)
+    a, b = scheduler.register("a"), scheduler.register("b")
+    old = InferenceRequest(None)
+    scheduler.submit(a, old)
+    scheduler.submit(a, InferenceRequest(None))
+    assert old.done.is_set() and old.detections is None, "被替换的旧帧没有被唤醒"
+    assert a.dropped == 1
+
+    scheduler.submit(b, InferenceRequest(None))
+    batch = scheduler.next_batch()
+    assert [s.name for s, _ in batch] == ["a", "b"]
+
+    # 后注册的来源从当前最小虚拟时间开始，不会长期霸占模型
+    for _ in range(10):
+        scheduler.submit(a, InferenceRequest(None))
+        scheduler.next_batch()
+    late = scheduler.register("late")
+    assert late.vtime == min(a.vtime, b.vtime) == b.vtime
+    print("✓ 批次组合正确")
+
+
+def test_end_to_end():
+    print("\n测试3: 多路并发提交，结果返回给对应的来源")
+    original = inference_scheduler.YoloInference
+    inference_scheduler.YoloInference = FakeYolo
+    try:
+        scheduler = InferenceScheduler("fake.pt", 0.5, {}, max_batch=4, max_latency_ms=50)
+        scheduler.start()
+        sources = [scheduler.register(f"s{i}") for i in range(4)]
+        results = {}
+        barrier = threading.Barrier(len(sources))
+
+        def worker(index, source):
+            barrier.wait()
+            results[index] = source.infer_with_settings(np.array([index]), timeout=5.0)
+
+        threads = [threading.Thread(target=worker, args=(i, s)) for i, s in enumerate(sources)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        batch_sizes = scheduler.yolo.batch_sizes
+        scheduler.stop()
+
+        assert results == {i: (f"det{i}", ("fake.pt", "cpu", "torch", 0.5)) for i in range(4)}, results
+        assert sum(batch_sizes) == 4 and max(batch_sizes) > 1, batch_sizes
+        assert sources[0].infer(np.array([0]), timeout=1.0) is None, "停止后提交应立即返回 None"
+    finally:
+        inference_scheduler.YoloInference = original
+    print(f"✓ 批次大小 {batch_sizes}")
+
+
+if __name__ == "__main__":
+    try:
+        test_weighted_fair_share()
+        test_batch_and_replace()
+        test_end_to_end()
+    except AssertionError as e:
+        print(f"✗ 测试失败: {e}")
+        sys.exit(1)
+    print("\n所有测试完成!")
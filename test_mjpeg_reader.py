@@ -0,0 +1,157 @@
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from core.mjpeg_reader import MjpegReader, MultipartParser, ChunkedDecoder
+
+BOUNDARY = "123456789000000000000987654321"
+
+
+def fake_jpeg(index):
+    # 只需要JPEG的 SOI/EOI 标记，解析器不解码图片
+    return b"\xff\xd8" + bytes([index % 256]) * 100 + b"\xff\xd9"
+
+
+class StreamHandler(BaseHTTPRequestHandler):
+    """模拟ESP32-CAM的 /stream：multipart/x-mixed-replace，每个连接发送若干帧后断开"""
+    frames_per_connection = 5
+    chunked = False
+    connections = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, data):
+        if self.chunked:
+            self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        else:
+            self.wfile.write(data)
+
+    def do_GET(self):
+        type(self).connections += 1
+        self.protocol_version = "HTTP/1.1"
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/x-mixed-replace;boundary={BOUNDARY}")
+        if self.chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for i in range(self.frames_per_connection):
+                jpeg = fake_jpeg(i)
+                self.send_body(f"\r\n--{BOUNDARY}\r\n".encode())
+                self.send_body(f"Content-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode())
+                self.send_body(jpeg)
+                self.wfile.flush()
+                time.sleep(0.02)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        # 返回后服务端关闭连接，模拟摄像头掉线
+
+
+def start_server(chunked=False):
+    handler = type("Handler", (StreamHandler,), {"chunked": chunked, "connections": 0})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, handler
+
+
+def test_multipart_parser_split_input():
+    print("\n测试1: 数据被任意拆分时仍能解析出完整帧")
+    jpegs = [fake_jpeg(i) for i in range(3)]
+    stream = b""
+    for i, jpeg in enumerate(jpegs):
+        # 第二帧不带 Content-Length，需要按 boundary 查找
+        length = "" if i == 1 else f"Content-Length: {len(jpeg)}\r\n"
+        stream += f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n{length}\r\n".encode() + jpeg + b"\r\n"
+    stream += f"--{BOUNDARY}\r\n".encode()
+
+    parser = MultipartParser(BOUNDARY)
+    frames = []
+    for i in range(0, len(stream), 7):
+        frames.extend(parser.feed(stream[i:i + 7]))
+    assert frames == jpegs, f"解析结果不一致: {len(frames)} 帧"
+    print(f"✓ 解析出 {len(frames)} 帧")
+
+
+def test_chunked_decoder():
+    print("\n测试2: 分块传输解码")
+    payload = b"hello mjpeg stream" * 10
+    encoded = b""
+    for i in range(0, len(payload), 50):
+        piece = payload[i:i + 50]
+        encoded += f"{len(piece):x}\r\n".encode() + piece + b"\r\n"
+
+    decoder = ChunkedDecoder()
+    out = b""
+    for i in range(0, len(encoded), 3):
+        out += decoder.feed(encoded[i:i + 3])
+    assert out == payload
+    print("✓ 解码结果正确")
+
+
+def run_reader(chunked):
+    server, handler = start_server(chunked)
+    url = f"http://127.0.0.1:{server.server_address[1]}/stream"
+    reader = MjpegReader(url, min_backoff=0.05, max_backoff=0.2)
+    try:
+        reader.open()
+        received = []
+        deadline = time.time() + 5
+        # 每个连接5帧，收到超过5帧说明断线后已自动重连
+        while len(received) < 8 and time.time() < deadline:
+            item = reader.read_latest(timeout=0.5)
+            if item is not None:
+                received.append(item[0])
+        stats = reader.stats()
+    finally:
+        reader.stop()
+        server.shutdown()
+        server.server_close()
+
+    assert len(received) >= 8, f"只收到 {len(received)} 帧"
+    assert all(jpeg.startswith(b"\xff\xd8") and jpeg.endswith(b"\xff\xd9") for jpeg in received)
+    assert stats['reconnects'] >= 1 and handler.connections >= 2, stats
+    print(f"✓ 收到 {len(received)} 帧, 重连 {stats['reconnects']} 次, 丢弃旧帧 {stats['dropped']}")
+
+
+def test_reader_reconnects():
+    print("\n测试3: 本地模拟服务端，断线后自动重连")
+    run_reader(chunked=False)
+
+
+def test_reader_chunked_stream():
+    print("\n测试4: 分块传输的MJPEG流 (ESP32 httpd)")
+    run_reader(chunked=True)
+
+
+def test_reader_keeps_latest_frame():
+    print("\n测试5: 推理跟不上时只保留最新一帧")
+    server, handler = start_server()
+    url = f"http://127.0.0.1:{server.server_address[1]}/stream"
+    reader = MjpegReader(url, min_backoff=0.05)
+    try:
+        reader.open()
+        time.sleep(0.3)  # 模拟推理耗时，期间到达多帧
+        item = reader.read_latest(timeout=1)
+        stats = reader.stats()
+    finally:
+        reader.stop()
+        server.shutdown()
+        server.server_close()
+
+    assert item is not None
+    assert stats['dropped'] > 0, stats
+    print(f"✓ 跳过了 {stats['dropped']} 帧旧画面")
+
+
+if __name__ == "__main__":
+    try:
+        test_multipart_parser_split_input()
+        test_chunked_decoder()
+        test_reader_reconnects()
+        test_reader_chunked_stream()
+        test_reader_keeps_latest_frame()
+    except AssertionError as e:
+        print(f"✗ 测试失败: {e}")
+        sys.exit(1)
+    print("\n所有测试完成!")
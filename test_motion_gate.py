@@ -0,0 +1,75 @@
+import sys
+import time
+import numpy as np
+from core.motion_gate import MotionGate
+
+
+def make_frame(seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, (360, 640, 3), dtype=np.uint8)
+
+
+def test_static_frame_skipped():
+    print("\n测试1: 静止画面跳过推理")
+    gate = MotionGate(threshold=10, min_changed_blocks=2, refresh_interval=60.0)
+    frame = make_frame()
+    assert gate.should_infer(frame), "第一帧没有参考图，必须推理"
+    for _ in range(5):
+        # 轻微噪声不应触发推理
+        noisy = np.clip(frame.astype(np.int16) + 3, 0, 255).astype(np.uint8)
+        assert not gate.should_infer(noisy), "静止画面被判定为变化"
+    stats = gate.stats()
+    assert stats['checked'] == 6 and stats['inferred'] == 1 and stats['skipped'] == 5, stats
+    print(f"✓ 跳过 {stats['skipped']}/{stats['checked']} 帧")
+
+
+def test_motion_triggers_inference():
+    print("\n测试2: 局部变化触发推理，单个块变化不触发")
+    gate = MotionGate(threshold=10, min_changed_blocks=2, refresh_interval=60.0)
+    frame = np.full((360, 640, 3), 100, np.uint8)
+    assert gate.should_infer(frame)
+
+    # 每块 10x10 像素，只改变一个块
+    one_block = frame.copy()
+    one_block[0:10, 0:10] = 255
+    assert not gate.should_infer(one_block), "单个块变化不应达到 min_changed_blocks"
+
+    # 一个目标进入画面，覆盖多个块
+    moved = frame.copy()
+    moved[100:160, 200:260] = 255
+    assert gate.should_infer(moved), "目标进入画面没有触发推理"
+    # 参考图已更新为新画面
+    assert not gate.should_infer(moved)
+    print("✓ 变化检测正确")
+
+
+def test_refresh_interval():
+    print("\n测试3: 画面不变时按 refresh_interval 强制推理")
+    gate = MotionGate(refresh_interval=0.2)
+    frame = make_frame(1)
+    assert gate.should_infer(frame)
+    assert not gate.should_infer(frame)
+    time.sleep(0.25)
+    assert gate.should_infer(frame), "超过刷新间隔没有强制推理"
+    print("✓ 定时刷新正确")
+
+
+def test_from_config():
+    print("\n测试4: 从配置创建")
+    assert MotionGate.from_config(None) is None
+    assert MotionGate.from_config({"enabled": False}) is None
+    gate = MotionGate.from_config({"enabled": True, "threshold": 20, "min_changed_blocks": 5})
+    assert gate.threshold == 20 and gate.min_changed_blocks == 5 and gate.refresh_interval == 5.0
+    print("✓ 配置读取正确")
+
+
+if __name__ == "__main__":
+    try:
+        test_static_frame_skipped()
+        test_motion_triggers_inference()
+        test_refresh_interval()
+        test_from_config()
+    except AssertionError as e:
+        print(f"✗ 测试失败: {e}")
+        sys.exit(1)
+    print("\n所有测试完成!")
@@ -0,0 +1,401 @@
+import sys
+import time
+import base64
+import socket
+import struct
+import threading
+from PySide6.QtCore import QCoreApplication
+from core.mqtt_server import MqttServer
+from core.mqtt_framer import PacketFramer
+
+app = QCoreApplication.instance() or QCoreApplication([])
+
+
+def encode_length(length):
+    encoded = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        encoded.append(byte | 128 if length else byte)
+        if not length:
+            return bytes(encoded)
+
+
+def mqtt_string(text):
+    data = text.encode("utf-8")
+    return struct.pack(">H", len(data)) + data
+
+
+def connect_packet(client_name):
+    body = mqtt_string("MQTT") + bytes([4, 2]) + struct.pack(">H", 60) + mqtt_string(client_name)
+    return bytes([0x10]) + encode_length(len(body)) + body
+
+
+def subscribe_packet(packet_id, topic, qos=0):
+    body = struct.pack(">H", packet_id) + mqtt_string(topic) + bytes([qos])
+    return bytes([0x82]) + encode_length(len(body)) + body
+
+
+def publish_packet(topic, payload, qos=0, packet_id=1, dup=False):
+    body = mqtt_string(topic) + (struct.pack(">H", packet_id) if qos else b"") + payload
+    return bytes([0x30 | (qos << 1) | (0x08 if dup else 0)]) + encode_length(len(body)) + body
+
+
+def read_packet(sock):
+    """读取一个完整的MQTT包，返回 (固定头首字节, 剩余部分)"""
+    def recv_exact(n):
+        data = b""
+        while len(data) < n:
+            chunk = sock.recv(n - len(data))
+            if not chunk:
+                raise EOFError("连接已关闭")
+            data += chunk
+        return data
+
+    header = recv_exact(1)[0]
+    multiplier, length = 1, 0
+    while True:
+        byte = recv_exact(1)[0]
+        length += (byte & 127) * multiplier
+        multiplier *= 128
+        if not byte & 128:
+            break
+    return header, recv_exact(length)
+
+
+def wait_for(condition, timeout=3.0):
+    """处理Qt事件（跨线程信号）直到条件满足"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        app.processEvents()
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def start_server(**kwargs):
+    server = MqttServer("127.0.0.1", 0, **kwargs)
+    server.log_message.connect(lambda message: None)
+    server.start()
+    assert wait_for(lambda: server.running and server.server_socket), "服务端启动失败"
+    return server, server.server_socket.getsockname()[1]
+
+
+def open_client(port, name, recv_buffer=None):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if recv_buffer:
+        # 在连接前设置，限制TCP窗口，模拟处理很慢的订阅者
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, recv_buffer)
+    sock.settimeout(3)
+    sock.connect(("127.0.0.1", port))
+    sock.sendall(connect_packet(name))
+    header, _ = read_packet(sock)
+    assert header == 0x20, f"未收到CONNACK: {header:#x}"
+    return sock
+
+
+def test_many_clients_one_thread():
+    print("\n测试1: 单线程事件循环服务多个客户端，转发订阅消息")
+    server, port = start_server()
+    clients = []
+    try:
+        clients = [open_client(port, f"esp32_{i}") for i in range(50)]
+        subscriber = clients[0]
+        subscriber.sendall(subscribe_packet(1, "siot/推理结果"))
+        assert read_packet(subscriber)[0] == 0x90
+        # 通配符订阅
+        wildcard = clients[2]
+        wildcard.sendall(subscribe_packet(2, "siot/#"))
+        assert read_packet(wildcard)[0] == 0x90
+
+        clients[1].sendall(publish_packet("siot/推理结果", "叶片正常".encode("utf-8")))
+        for sock in (subscriber, wildcard):
+            header, body = read_packet(sock)
+            assert header == 0x30 and body.endswith("叶片正常".encode("utf-8")), body
+
+        # 界面线程发布的消息同样由事件循环发出
+        server.publish_message("siot/推理结果", "from ui")
+        assert read_packet(subscriber)[1].endswith(b"from ui")
+        assert read_packet(wildcard)[1].endswith(b"from ui")
+        assert len(server.get_connected_clients()) == 50
+    finally:
+        for sock in clients:
+            sock.close()
+        server.stop()
+    assert not server.isRunning()
+    print(f"✓ {len(clients)} 个客户端, 服务端已停止")
+
+
+def test_camera_image():
+    print("\n测试2: 分多次到达的Base64摄像头大包")
+    server, port = start_server()
+    images = []
+    server.image_data_received.connect(lambda client_id, data: images.append(bytes(data)))
+    try:
+        camera = open_client(port, "camera")
+        image = b"\xff\xd8" + bytes(range(256)) * 1000 + b"\xff\xd9"
+        packet = publish_packet("siot/摄像头", b"data:image/jpeg;base64," + base64.b64encode(image))
+        for i in range(0, len(packet), 50000):
+            camera.sendall(packet[i:i + 50000])
+            time.sleep(0.01)
+        assert wait_for(lambda: images), "没有收到图像"
+        camera.close()
+    finally:
+        server.stop()
+    assert images[0] == image
+    print(f"✓ 收到 {len(images[0])} 字节图像")
+
+
+class ChunkSocket:
+    """每次 recv_into 只返回一小段数据的假套接字"""
+
+    def __init__(self, data, chunk_size):
+        self.data = data
+        self.pos = 0
+        self.chunk_size = chunk_size
+
+    def recv_into(self, view, size):
+        n = min(size, self.chunk_size, len(self.data) - self.pos)
+        view[:n] = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+
+def test_framer_zero_copy():
+    print("\n测试3: 增量分帧，大包按小分段到达时不重复复制")
+    packets = [publish_packet("siot/摄像头", bytes([i]) * 300000) for i in range(3)]
+    packets.insert(1, bytes([0xC0, 0x00]))  # PINGREQ
+    stream = b"".join(packets)
+    framer = PacketFramer()
+    sock = ChunkSocket(stream, 1460)
+    received = []
+    while framer.recv_into(sock):
+        while True:
+            item = framer.next_packet()
+            if item is None:
+                break
+            packet_type, packet = item
+            assert isinstance(packet, memoryview)
+            received.append((packet_type, bytes(packet)))
+    assert [p for _, p in received] == packets
+    assert [t for t, _ in received] == [3, 12, 3, 3]
+    # 只有包边界处的少量数据会被搬移
+    assert framer.bytes_copied < len(stream) * 0.05, framer.bytes_copied
+    print(f"✓ {len(received)} 个包, 共 {len(stream)} 字节, 搬移 {framer.bytes_copied} 字节")
+
+
+def publish_to_slow_and_fast(server, port, count, payload_size):
+    """一个正常读取的订阅者和一个不读取的订阅者，返回 (快速订阅者收到的包, 慢速订阅者套接字)"""
+    fast = open_client(port, "fast")
+    slow = open_client(port, "slow", recv_buffer=4096)
+    for sock in (fast, slow):
+        sock.sendall(subscribe_packet(1, "siot/推理结果"))
+        assert read_packet(sock)[0] == 0x90
+
+    received = []
+
+    def read_fast():
+        for _ in range(count):
+            received.append(read_packet(fast)[1])
+
+    reader = threading.Thread(target=read_fast)
+    reader.start()
+    for i in range(count):
+        server.publish_message("siot/推理结果", bytes([i]) * payload_size)
+        time.sleep(0.005)
+    reader.join(10)
+    fast.close()
+    return received, slow
+
+
+def test_slow_subscriber_drop_oldest():
+    print("\n测试4: 慢速订阅者的发送队列有上限，丢弃最旧消息，不影响其他订阅者")
+    server, port = start_server(max_queue_packets=5, slow_client_policy="drop_oldest")
+    try:
+        received, slow = publish_to_slow_and_fast(server, port, 40, 256 * 1024)
+        assert len(received) == 40, len(received)
+        slow_address = "127.0.0.1:%d" % slow.getsockname()[1]
+        slow_stats = [c for c in server.get_client_stats() if c['address'] == slow_address][0]
+        assert slow_stats['dropped'] > 0 and slow_stats['queued'] <= 5, slow_stats
+        assert slow_stats['max_queued'] <= 5, slow_stats
+
+        # 慢速订阅者开始读取后，最后收到的是最新的消息
+        slow.settimeout(1)
+        last = None
+        try:
+            while True:
+                last = read_packet(slow)[1]
+        except (socket.timeout, EOFError):
+            pass
+        slow.close()
+        assert last is not None and last[-1] == 39, last[-1:]
+    finally:
+        server.stop()
+    print(f"✓ 快速订阅者收到 {len(received)} 条, 慢速订阅者丢弃 {slow_stats['dropped']} 条")
+
+
+def test_slow_subscriber_drop_camera():
+    print("\n测试5: drop_camera 策略下没有摄像头画面可丢时丢弃新消息，队列仍有上限")
+    server, port = start_server(max_queue_packets=5, slow_client_policy="drop_camera")
+    try:
+        received, slow = publish_to_slow_and_fast(server, port, 40, 256 * 1024)
+        assert len(received) == 40, len(received)
+        slow_address = "127.0.0.1:%d" % slow.getsockname()[1]
+        slow_stats = [c for c in server.get_client_stats() if c['address'] == slow_address][0]
+        assert slow_stats['dropped'] > 0, slow_stats
+        assert slow_stats['max_queued'] <= 5 and slow_stats['queued_bytes'] <= server.max_queue_bytes, slow_stats
+        slow.close()
+    finally:
+        server.stop()
+    print(f"✓ 慢速订阅者队列峰值 {slow_stats['max_queued']} 包, 丢弃 {slow_stats['dropped']} 条")
+
+
+def test_slow_subscriber_disconnect():
+    print("\n测试6: disconnect 策略断开发送队列溢出的客户端")
+    server, port = start_server(max_queue_packets=5, slow_client_policy="disconnect")
+    try:
+        received, slow = publish_to_slow_and_fast(server, port, 40, 256 * 1024)
+        assert len(received) == 40, len(received)
+        slow_address = "127.0.0.1:%d" % slow.getsockname()[1]
+        assert wait_for(lambda: all(c['address'] != slow_address for c in server.get_connected_clients())), \
+            "慢速客户端未被断开"
+        slow.close()
+    finally:
+        server.stop()
+    print(f"✓ 快速订阅者收到 {len(received)} 条, 慢速订阅者已断开")
+
+
+def ack_packet(header, packet_id):
+    return bytes([header, 0x02]) + struct.pack(">H", packet_id)
+
+
+def test_inbound_qos_ack_and_dedup():
+    print("\n测试7: QoS1/QoS2 发布得到确认，DUP重发的摄像头帧不重复交给推理")
+    server, port = start_server()
+    images = []
+    server.image_data_received.connect(lambda client_id, data: images.append(bytes(data)))
+    try:
+        camera = open_client(port, "camera")
+        image = b"\xff\xd8" + bytes(range(256)) * 100 + b"\xff\xd9"
+        frame = publish_packet("siot/摄像头", image, qos=1, packet_id=7)
+        camera.sendall(frame)
+        assert read_packet(camera) == (0x40, struct.pack(">H", 7))
+        # 客户端没收到PUBACK时带DUP重发同一帧：只补发确认
+        camera.sendall(publish_packet("siot/摄像头", image, qos=1, packet_id=7, dup=True))
+        assert read_packet(camera) == (0x40, struct.pack(">H", 7))
+        # 复用同一包标识符的新帧照常处理
+        camera.sendall(frame)
+        assert read_packet(camera) == (0x40, struct.pack(">H", 7))
+
+        # QoS2: PUBLISH -> PUBREC，PUBREL之前的重发都视为重复，PUBREL -> PUBCOMP
+        qos2 = publish_packet("siot/摄像头", image, qos=2, packet_id=9)
+        camera.sendall(qos2)
+        assert read_packet(camera) == (0x50, struct.pack(">H", 9))
+        camera.sendall(publish_packet("siot/摄像头", image, qos=2, packet_id=9, dup=True))
+        assert read_packet(camera) == (0x50, struct.pack(">H", 9))
+        camera.sendall(ack_packet(0x62, 9))
+        assert read_packet(camera) == (0x70, struct.pack(">H", 9))
+
+        assert wait_for(lambda: len(images) >= 3)
+        assert not wait_for(lambda: len(images) > 3, timeout=0.3), len(images)
+        duplicates = server.get_client_stats()[0]['duplicates']
+        assert duplicates == 2, duplicates
+        camera.close()
+    finally:
+        server.stop()
+    print(f"✓ 处理 {len(images)} 帧, 识别重复包 {duplicates} 个")
+
+
+def publish_packet_id(body):
+    """从QoS>0 PUBLISH的剩余部分取出包标识符"""
+    topic_length = struct.unpack(">H", body[:2])[0]
+    return struct.unpack(">H", body[2 + topic_length:4 + topic_length])[0]
+
+
+def read_until(sock, header):
+    """跳过超时重发等其他包，直到读到指定类型的包"""
+    while True:
+        packet = read_packet(sock)
+        if packet[0] == header:
+            return packet
+
+
+def test_outbound_qos_window_and_retry():
+    print("\n测试8: QoS下发受发送窗口限制，未确认的消息带DUP重发")
+    server, port = start_server(max_inflight=2, retry_interval=0.2)
+    try:
+        subscriber = open_client(port, "subscriber")
+        subscriber.sendall(subscribe_packet(1, "siot/推理结果", qos=1))
+        assert read_packet(subscriber) == (0x90, struct.pack(">H", 1) + bytes([1]))
+        for i in range(4):
+            server.publish_message("siot/推理结果", f"msg{i}", qos=1)
+
+        # 窗口为2：只收到前两条，之后是超时重发
+        first = [read_packet(subscriber) for _ in range(2)]
+        assert [h for h, _ in first] == [0x32, 0x32] and first[1][1].endswith(b"msg1"), first
+        header, body = read_packet(subscriber)
+        assert header == 0x3A and body.endswith(b"msg0"), (hex(header), body)  # DUP | QoS1
+        # 确认后窗口空出，排队的消息继续下发
+        for _, body in first:
+            subscriber.sendall(ack_packet(0x40, publish_packet_id(body)))
+        rest = [read_until(subscriber, 0x32)[1] for _ in range(2)]
+        assert rest[0].endswith(b"msg2") and rest[1].endswith(b"msg3"), rest
+        stats = server.get_client_stats()[0]
+        assert stats['retries'] >= 1 and stats['inflight'] == 2, stats
+        for body in rest:
+            subscriber.sendall(ack_packet(0x40, publish_packet_id(body)))
+
+        # QoS2 下发: PUBLISH -> PUBREC -> PUBREL -> PUBCOMP
+        subscriber.sendall(subscribe_packet(2, "siot/水泵", qos=2))
+        read_until(subscriber, 0x90)
+        server.publish_message("siot/水泵", "on", qos=2)
+        packet_id = publish_packet_id(read_until(subscriber, 0x34)[1])
+        subscriber.sendall(ack_packet(0x50, packet_id))
+        assert read_until(subscriber, 0x62)[1] == struct.pack(">H", packet_id)
+        subscriber.sendall(ack_packet(0x70, packet_id))
+        assert wait_for(lambda: server.get_client_stats()[0]['inflight'] == 0)
+        subscriber.close()
+    finally:
+        server.stop()
+    print(f"✓ 窗口内 2 条, 重发 {stats['retries']} 次, 确认后继续下发")
+
+
+def test_outbound_qos_slow_subscriber():
+    print("\n测试9: 不读取的QoS订阅者：原包还在发送队列中时不重复排入重发副本")
+    server, port = start_server(max_inflight=2, retry_interval=0.2)
+    try:
+        slow = open_client(port, "slow", recv_buffer=4096)
+        slow.sendall(subscribe_packet(1, "siot/推理结果", qos=1))
+        assert read_packet(slow)[0] == 0x90
+        for i in range(10):
+            server.publish_message("siot/推理结果", bytes([i]) * (1024 * 1024), qos=1)
+        peak = 0
+        deadline = time.time() + 3.0
+        while time.time() < deadline:
+            stats = server.get_client_stats()[0]
+            peak = max(peak, stats['queued'])
+            time.sleep(0.05)
+        # 每条未确认的消息在发送队列中最多只有一个副本
+        assert peak <= 2 and stats['inflight'] == 2 and stats['qos_pending'] == 8, (peak, stats)
+        slow.close()
+    finally:
+        server.stop()
+    print(f"✓ 发送队列峰值 {peak} 包, 重发 {stats['retries']} 次")
+
+
+if __name__ == "__main__":
+    try:
+        test_many_clients_one_thread()
+        test_camera_image()
+        test_framer_zero_copy()
+        test_slow_subscriber_drop_oldest()
+        test_slow_subscriber_drop_camera()
+        test_slow_subscriber_disconnect()
+        test_inbound_qos_ack_and_dedup()
+        test_outbound_qos_window_and_retry()
+        test_outbound_qos_slow_subscriber()
+    except AssertionError as e:
+        print(f"✗ 测试失败: {e}")
+        sys.exit(1)
+    print("\n所有测试完成!")
@@ -0,0 +1,100 @@
+import sys
+import cv2
+import numpy as np
+from core.detections import Detections
+from core.result_cache import ResultCache, get_result_cache, cached_decode_infer
+
+SETTINGS = ("best.pt", "cpu", "torch", 0.5)
+
+
+def frame_of(nbytes):
+    return np.zeros(nbytes, np.uint8)
+
+
+def test_lru_eviction():
+    print("\n测试1: 超过条目数时淘汰最久未使用的条目")
+    cache = ResultCache(max_entries=3, max_bytes=1 << 20)
+    keys = [cache.make_key(bytes([i]) * 10, SETTINGS) for i in range(4)]
+    for key in keys[:3]:
+        cache.put(key, frame_of(100), Detections.empty())
+    # 访问第一个条目，使第二个成为最久未使用的
+    assert cache.get(keys[0]) is not None
+    cache.put(keys[3], frame_of(100), Detections.empty())
+    assert cache.get(keys[1]) is None, "最久未使用的条目没有被淘汰"
+    assert all(cache.get(k) is not None for k in (keys[0], keys[2], keys[3]))
+    stats = cache.stats()
+    assert stats['entries'] == 3 and stats['hits'] == 4 and stats['misses'] == 1, stats
+    print("✓ LRU淘汰正确")
+
+
+def test_byte_limit():
+    print("\n测试2: 按字节数限制内存占用")
+    cache = ResultCache(max_entries=100, max_bytes=1000)
+    for i in range(5):
+        cache.put(cache.make_key(bytes([i]), SETTINGS), frame_of(300), Detections.empty())
+    stats = cache.stats()
+    assert stats['entries'] == 3 and stats['bytes'] == 900, stats
+    assert cache.get(cache.make_key(bytes([0]), SETTINGS)) is None
+    assert cache.get(cache.make_key(bytes([4]), SETTINGS)) is not None
+
+    # 单个条目超过上限时不缓存
+    cache.put(cache.make_key(b"big", SETTINGS), frame_of(2000), Detections.empty())
+    assert cache.get(cache.make_key(b"big", SETTINGS)) is None
+    # 同一个键重复写入不重复计算字节数
+    cache.put(cache.make_key(bytes([4]), SETTINGS), frame_of(300), Detections.empty())
+    assert cache.stats()['bytes'] == 900
+
+    cache.configure(max_bytes=500)
+    assert cache.stats()['entries'] == 1
+    print("✓ 字节数限制正确")
+
+
+def test_settings_in_key():
+    print("\n测试3: 模型设置不同的结果互不命中")
+    cache = ResultCache()
+    data = b"same image"
+    cache.put(cache.make_key(data, SETTINGS), frame_of(10), Detections.empty())
+    assert cache.get(cache.make_key(data, SETTINGS)) is not None
+    assert cache.get(cache.make_key(data, SETTINGS[:3] + (0.6,))) is None
+    print("✓ 缓存键包含设置")
+
+
+def test_cached_decode_infer():
+    print("\n测试4: 命中时跳过解码和推理")
+    cache = get_result_cache()
+    cache.clear()
+    ok, buf = cv2.imencode(".jpg", np.full((480, 640, 3), 128, np.uint8))
+    data = buf.tobytes()
+    calls = []
+
+    def infer(frame, orig_shape):
+        calls.append(frame.shape)
+        return Detections.empty(), SETTINGS
+
+    frame, detections, cached = cached_decode_infer(data, SETTINGS, infer, 640)
+    assert frame.shape == (480, 640, 3) and not cached and len(calls) == 1
+    frame, detections, cached = cached_decode_infer(data, SETTINGS, infer, 640)
+    assert cached and len(calls) == 1, "重复图片没有命中缓存"
+
+    # 设置为 None 时既不查找也不写入
+    cached_decode_infer(data, None, infer, 640)
+    assert len(calls) == 2
+    other = cv2.imencode(".jpg", np.zeros((480, 640, 3), np.uint8))[1].tobytes()
+    cached_decode_infer(other, SETTINGS, lambda f, s: (Detections.empty(), None), 640)
+    assert cache.get(cache.make_key(other, SETTINGS)) is None
+
+    assert cached_decode_infer(b"not an image", SETTINGS, infer, 640) == (None, None, False)
+    cache.clear()
+    print("✓ 解码推理缓存正确")
+
+
+if __name__ == "__main__":
+    try:
+        test_lru_eviction()
+        test_byte_limit()
+        test_settings_in_key()
+        test_cached_decode_infer()
+    except AssertionError as e:
+        print(f"✗ 测试失败: {e}")
+        sys.exit(1)
+    print("\n所有测试完成!")
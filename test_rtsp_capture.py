@@ -0,0 +1,92 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import cv2
+import numpy as np
+from core.rtsp_capture import ffmpeg_capture_options, open_rtsp_capture, FFMPEG_OPTIONS_ENV
+
+
+def make_video(path, frames=60, fps=30):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (160, 120))
+    for i in range(frames):
+        writer.write(np.full((120, 160, 3), i * 4 % 256, np.uint8))
+    writer.release()
+
+
+def test_ffmpeg_options():
+    print("\n测试1: FFmpeg 选项字符串")
+    options = ffmpeg_capture_options("udp", low_delay=True)
+    assert options.startswith("rtsp_transport;udp")
+    assert "fflags;nobuffer" in options and "flags;low_delay" in options
+    assert ffmpeg_capture_options("tcp", low_delay=False) == "rtsp_transport;tcp"
+    print(f"✓ {options}")
+
+
+def test_open_file_backed_source():
+    print("\n测试2: 用本地视频文件代替RTSP源，选项只在打开时生效")
+    os.environ.pop(FFMPEG_OPTIONS_ENV, None)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "stream.mp4")
+        make_video(path)
+        # low_delay 会关闭解码器的帧缓冲，文件末尾的最后一帧可能不输出，这里按完整读取校验
+        cap = open_rtsp_capture(path, transport="tcp", buffer_size=1, timeout_ms=2000, low_delay=False)
+        try:
+            assert cap.isOpened(), "无法打开本地视频"
+            frames = 0
+            while cap.grab():
+                frames += 1
+        finally:
+            cap.release()
+    assert frames == 60, f"只读到 {frames} 帧"
+    assert FFMPEG_OPTIONS_ENV not in os.environ, "环境变量没有恢复"
+    print(f"✓ 读取 {frames} 帧")
+
+
+def test_drop_stale_frames():
+    print("\n测试3: VideoThread 的采集循环在推理未取走上一帧时跳过转换，只处理最新帧")
+    # VideoThread 依赖模型池（ultralytics），在用到时才导入
+    from core.video_thread import VideoThread
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "stream.mp4")
+        make_video(path)
+        thread = VideoThread(camera_id=path)
+        # 本地文件代替RTSP源，直接开启RTSP的丢帧模式
+        thread.drop_stale = True
+        thread.running = True
+        cap = open_rtsp_capture(path, low_delay=False)
+        capture = threading.Thread(target=thread.capture_loop, args=(cap,))
+        capture.start()
+        consumed = 0
+        try:
+            # 模拟慢速推理：每次取帧后"推理" 20ms
+            deadline = time.time() + 3.0
+            while time.time() < deadline:
+                if thread.slot.get(timeout=0.2) is None:
+                    if consumed and not thread.slot.has_pending():
+                        break
+                    continue
+                consumed += 1
+                time.sleep(0.02)
+        finally:
+            thread.running = False
+            capture.join(timeout=3.0)
+            cap.release()
+    skipped = thread.skipped_decode
+    assert skipped > 0, "没有跳过任何旧帧"
+    # 只在上一帧被取走后才转换新帧，转换出的帧不会被覆盖丢弃
+    assert thread.slot.dropped == 0, thread.slot.dropped
+    assert consumed + skipped == 60, (consumed, skipped)
+    print(f"✓ 处理 {consumed} 帧, 跳过 {skipped} 帧旧画面")
+
+
+if __name__ == "__main__":
+    try:
+        test_ffmpeg_options()
+        test_open_file_backed_source()
+        test_drop_stale_frames()
+    except AssertionError as e:
+        print(f"✗ 测试失败: {e}")
+        sys.exit(1)
+    print("\n所有测试完成!")
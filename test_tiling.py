@@ -0,0 +1,69 @@
+import sys
+import numpy as np
+from core.detections import Detections
+from core.tiling import tile_grid, merge_tile_detections, nms
+
+NAMES = {0: "person", 1: "car"}
+
+
+def detections(boxes, conf, classes):
+    return Detections(np.array(boxes, np.float32).reshape(-1, 4), np.array(conf, np.float32),
+                      np.array(classes, np.int32), NAMES)
+
+
+def test_grid_covers_image():
+    print("\n测试1: 切块覆盖整张图，尺寸一致且带重叠")
+    tiles = tile_grid(1080, 1920, tile_size=640, overlap=0.2)
+    assert len(tiles) == 4 * 2, tiles
+    covered = np.zeros((1080, 1920), bool)
+    for x1, y1, x2, y2 in tiles:
+        assert (x2 - x1, y2 - y1) == (640, 640)
+        covered[y1:y2, x1:x2] = True
+    assert covered.all(), "有区域没有被切块覆盖"
+    # 最后一列贴齐右边缘，相邻列至少重叠 20%
+    xs = sorted({t[0] for t in tiles})
+    assert xs[-1] == 1920 - 640
+    assert all(b - a <= 512 for a, b in zip(xs, xs[1:])), xs
+
+    assert tile_grid(480, 640, tile_size=640) == [(0, 0, 640, 480)], "小图不应切块"
+    print(f"✓ {len(tiles)} 块")
+
+
+def test_merge_across_seam():
+    print("\n测试2: 重叠区内被两个切块同时检测到的目标合并为一个框")
+    # 目标位于整图 (560, 100)-(620, 180)，同时落在 x=0 和 x=512 两个切块里
+    left = detections([[560, 100, 620, 180]], [0.8], [0])
+    right = detections([[49, 101, 108, 181]], [0.9], [0])
+    merged = merge_tile_detections([(left, (0, 0)), (right, (512, 0))], NAMES)
+    assert len(merged) == 1, merged.xyxy
+    # 保留置信度高的框，坐标已映射回整图
+    assert abs(merged.conf[0] - 0.9) < 1e-6
+    assert np.allclose(merged.xyxy[0], [561, 101, 620, 181]), merged.xyxy
+    print("✓ 跨切块的重复框已合并")
+
+
+def test_class_aware_nms():
+    print("\n测试3: NMS 只抑制同类别的重叠框")
+    xyxy = np.array([[0, 0, 100, 100], [5, 5, 105, 105], [2, 2, 102, 102], [300, 300, 400, 400]], np.float32)
+    conf = np.array([0.9, 0.8, 0.7, 0.6], np.float32)
+    cls = np.array([0, 0, 1, 0], np.int32)
+    keep = nms(xyxy, conf, cls, iou_threshold=0.5)
+    # 同类重叠的第2个框被抑制，不同类别的第3个框和不重叠的第4个框保留
+    assert keep.tolist() == [0, 2, 3], keep
+
+    merged = merge_tile_detections([(detections(xyxy, conf, cls), (0, 0)),
+                                    (Detections.empty(NAMES), (640, 0))], NAMES)
+    assert sorted(merged.cls.tolist()) == [0, 0, 1]
+    assert len(merge_tile_detections([(Detections.empty(NAMES), (0, 0))], NAMES)) == 0
+    print("✓ 按类别抑制正确")
+
+
+if __name__ == "__main__":
+    try:
+        test_grid_covers_image()
+        test_merge_across_seam()
+        test_class_aware_nms()
+    except AssertionError as e:
+        print(f"✗ 测试失败: {e}")
+        sys.exit(1)
+    print("\n所有测试完成!")
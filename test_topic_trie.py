@@ -0,0 +1,96 @@
+import sys
+import threading
+from core.topic_trie import TopicTrie, valid_filter
+
+
+def test_wildcards():
+    print("\n测试1: +/# 通配符匹配")
+    trie = TopicTrie()
+    trie.subscribe("pump", "siot/推理结果", 1)
+    trie.subscribe("servo", "siot/+", 0)
+    trie.subscribe("logger", "siot/#", 0)
+    trie.subscribe("all", "#", 0)
+    trie.subscribe("sensor", "farm/+/温度", 0)
+
+    assert trie.match("siot/推理结果") == {"pump": 1, "servo": 0, "logger": 0, "all": 0}
+    assert trie.match("siot") == {"logger": 0, "all": 0}  # 'siot/#' 也匹配父级
+    assert trie.match("siot/a/b") == {"logger": 0, "all": 0}
+    assert trie.match("farm/1号棚/温度") == {"sensor": 0, "all": 0}
+    assert trie.match("farm/1号棚/湿度") == {"all": 0}
+    # $ 开头的系统主题不匹配首级通配符
+    assert trie.match("$SYS/broker") == {}
+    print("✓ 匹配结果正确")
+
+
+def test_max_qos_and_unsubscribe():
+    print("\n测试2: 同一客户端取最大QoS，取消订阅与断开后剪除节点")
+    trie = TopicTrie()
+    trie.subscribe("esp32", "siot/#", 0)
+    trie.subscribe("esp32", "siot/摄像头", 2)
+    assert trie.match("siot/摄像头") == {"esp32": 2}
+
+    assert trie.unsubscribe("esp32", "siot/摄像头")
+    assert not trie.unsubscribe("esp32", "siot/摄像头")
+    assert trie.match("siot/摄像头") == {"esp32": 0}
+
+    trie.subscribe("other", "a/b/c", 0)
+    trie.remove_client("esp32")
+    trie.remove_client("other")
+    assert trie.match("siot/摄像头") == {}
+    assert not trie.root.children, "空节点没有被剪除"
+    print("✓ 订阅更新正确")
+
+
+def test_invalid_filters():
+    print("\n测试3: 无效过滤器")
+    for topic_filter in ("", "siot/#/x", "siot/a#", "siot/+x"):
+        assert not valid_filter(topic_filter), topic_filter
+        try:
+            TopicTrie().subscribe("c", topic_filter)
+            assert False, f"应拒绝 {topic_filter}"
+        except ValueError:
+            pass
+    print("✓ 已拒绝")
+
+
+def test_snapshot_reads():
+    print("\n测试4: 写时复制，读取旧快照不受并发订阅影响")
+    trie = TopicTrie()
+    trie.subscribe("base", "siot/推理结果")
+    snapshot = trie.root
+    errors = []
+
+    def writer(index):
+        for i in range(200):
+            trie.subscribe(f"w{index}_{i}", f"siot/{i % 5}")
+            if i % 3 == 0:
+                trie.unsubscribe(f"w{index}_{i}", f"siot/{i % 5}")
+
+    def reader():
+        for _ in range(500):
+            if "base" not in trie.match("siot/推理结果"):
+                errors.append("丢失订阅")
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(4)] + [threading.Thread(target=reader)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors, errors[:3]
+    # 旧的根节点没有被修改
+    assert set(snapshot.children["siot"].children) == {"推理结果"}
+    expected = sum(1 for i in range(200) if i % 3 != 0) * 4
+    assert sum(len(trie.match(f"siot/{k}")) for k in range(5)) == expected
+    print("✓ 并发读写一致")
+
+
+if __name__ == "__main__":
+    try:
+        test_wildcards()
+        test_max_qos_and_unsubscribe()
+        test_invalid_filters()
+        test_snapshot_reads()
+    except AssertionError as e:
+        print(f"✗ 测试失败: {e}")
+        sys.exit(1)
+    print("\n所有测试完成!")
@@ -0,0 +1,86 @@
+import sys
+import numpy as np
+from core.detections import Detections
+from core.tracker import IouTracker
+
+NAMES = {0: "person", 1: "car"}
+
+
+def detections(boxes, classes=None, conf=0.9):
+    xyxy = np.array(boxes, np.float32).reshape(-1, 4)
+    cls = np.array(classes if classes is not None else [0] * len(xyxy), np.int32)
+    return Detections(xyxy, np.full(len(xyxy), conf, np.float32), cls, NAMES, None, None, (480, 640))
+
+
+def test_stable_ids():
+    print("\n测试1: 缓慢移动的两个目标保持稳定ID")
+    tracker = IouTracker(detect_interval=1)
+    ids = []
+    for i in range(20):
+        x = 10 + i * 5
+        result = tracker.update(detections([[x, 50, x + 60, 150], [400 - x, 200, 460 - x, 300]]))
+        ids.append(tuple(result.track_id.tolist()))
+    assert ids[0] == (1, 2), ids[0]
+    assert all(i == ids[0] for i in ids), ids
+    print(f"✓ ID始终为 {ids[0]}")
+
+
+def test_fast_object_keeps_id():
+    print("\n测试2: 快速移动的目标在检测帧之间保持ID")
+    tracker = IouTracker(detect_interval=1)
+    ids = []
+    x = 0.0
+    for i in range(20):
+        ids.append(int(tracker.update(detections([[x, 0, x + 40, 40]])).track_id[0]))
+        # 加速到每帧28像素，相邻两帧的框 IoU 只有 0.18，必须依靠速度预测才能匹配
+        x += 15 if i < 5 else 28
+    assert set(ids) == {1}, ids
+    print("✓ 快速目标ID不变")
+
+
+def test_predict_between_detections():
+    print("\n测试3: 中间帧用卡尔曼预测传播框")
+    tracker = IouTracker(detect_interval=3, confidence_decay=0.9)
+    for i in range(6):
+        x = i * 10
+        tracker.update(detections([[x, 0, x + 50, 50]]))
+    assert not tracker.needs_detection()
+    predicted = tracker.predict()
+    assert predicted.track_id.tolist() == [1]
+    # 目标以每帧10像素右移，预测框应该跟着右移
+    assert 55 < predicted.xyxy[0, 0] < 65, predicted.xyxy
+    assert abs(predicted.conf[0] - 0.81) < 1e-3, predicted.conf
+    tracker.predict()
+    assert tracker.needs_detection(), "达到检测间隔后应重新检测"
+    stats = tracker.stats()
+    assert stats['detected_frames'] == 6 and stats['tracked_frames'] == 2, stats
+    print("✓ 预测正确")
+
+
+def test_class_and_lost_tracks():
+    print("\n测试4: 不同类别不匹配，丢失的轨迹按 max_missed 删除")
+    tracker = IouTracker(detect_interval=1, max_missed=2)
+    first = tracker.update(detections([[0, 0, 50, 50]], [0]))
+    # 同一位置换成另一个类别，应分配新ID
+    second = tracker.update(detections([[0, 0, 50, 50]], [1]))
+    assert first.track_id.tolist() == [1] and second.track_id.tolist() == [2]
+
+    for _ in range(3):
+        tracker.update(detections([[0, 0, 50, 50]], [1]))
+    assert [t.track_id for t in tracker.tracks] == [2], "丢失的轨迹没有被删除"
+    # 已删除的ID不会被复用
+    again = tracker.update(detections([[0, 0, 50, 50], [300, 300, 350, 350]], [1, 0]))
+    assert again.track_id.tolist() == [2, 3], again.track_id
+    print("✓ 类别匹配和轨迹清理正确")
+
+
+if __name__ == "__main__":
+    try:
+        test_stable_ids()
+        test_fast_object_keeps_id()
+        test_predict_between_detections()
+        test_class_and_lost_tracks()
+    except AssertionError as e:
+        print(f"✗ 测试失败: {e}")
+        sys.exit(1)
+    print("\n所有测试完成!")
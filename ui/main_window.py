@@ -2,21 +2,31 @@ import sys
 import os
 import cv2
 import datetime
+from collections import OrderedDict
 from PySide6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                                QPushButton, QTabWidget, QFileDialog, QGroupBox, 
                                QFormLayout, QLineEdit, QSpinBox, QMessageBox, QSplitter,
                                QTableWidget, QTableWidgetItem, QHeaderView, QLabel, QDoubleSpinBox,
-                               QComboBox, QRadioButton, QButtonGroup)
-from PySide6.QtCore import Slot, Qt
+                               QComboBox, QRadioButton, QButtonGroup, QCheckBox)
+from PySide6.QtCore import Slot, Qt, QTimer
 import json
 
 from core.config_manager import ConfigManager
 from core.inference import YoloInference
+from core.model_pool import get_model_pool
+from core.annotator import get_annotator
+from core.result_cache import get_result_cache
 from core.mqtt_worker import MqttWorker
 from core.mqtt_server import MqttServer
 from core.video_thread import VideoThread
 from core.batch_inference_thread import BatchInferenceThread
+from core.video_file_thread import VideoFileThread
 from core.mqtt_inference_thread import MqttInferenceThread
+from core.quantization_thread import QuantizationThread
+from core.model_swap_thread import ModelSwapThread
+from core.inference_scheduler import InferenceScheduler
+from core.recorder import SegmentedRecorder
+from core.event_clip import EventClipBuffer
 from ui.widgets import ImageDisplayWidget, LogTableWidget
 
 class MainWindow(QMainWindow):
@@ -32,18 +42,35 @@ class MainWindow(QMainWindow):
         self.resize(1200, 800)
 
         # Initialize Yolo
+        get_model_pool().imgsz = self.config_manager.get("yolo.imgsz", 640)
+        get_result_cache().configure(
+            max_entries=self.config_manager.get("cache.max_entries", 256),
+            max_bytes=int(self.config_manager.get("cache.max_mb", 128) * 1024 * 1024)
+        )
         self.yolo = YoloInference(
             model_path=self.config_manager.get("yolo.model_path", "yolov8n.pt"),
             conf_threshold=self.config_manager.get("yolo.conf_threshold", 0.5),
             classes_dict=self.config_manager.classes,
-            device=self.config_manager.get("yolo.device", "cpu")
+            device=self.config_manager.get("yolo.device", "cpu"),
+            backend=self.config_manager.get("yolo.backend", "torch")
         )
 
         # Workers
         self.mqtt_worker = None
         self.video_thread = None
         self.http_thread = None
+        self.rtsp_thread = None
         self.batch_inference_thread = None
+        self.video_file_thread = None
+        self.quantization_thread = None
+        self.model_swap_thread = None
+        self.inference_scheduler = None
+        self.recorders = {}  # source -> SegmentedRecorder
+        self.clip_buffers = {}  # source -> EventClipBuffer
+
+        # Track IDs already written to the log table, per source (most recently seen last, bounded)
+        self.logged_track_ids = {}
+        self.max_logged_track_ids = 256
 
         # Batch inference data
         self.batch_results = []
@@ -71,6 +98,11 @@ class MainWindow(QMainWindow):
         self.setup_ui()
         self.apply_styles()
 
+        # Runtime stats refresh
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self.refresh_runtime_stats)
+        self.stats_timer.start(1000)
+
     def setup_ui(self):
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
@@ -95,12 +127,22 @@ class MainWindow(QMainWindow):
         self.setup_http_tab()
         self.tabs.addTab(self.http_tab, "HTTP 监控")
 
-        # Tab 4: MQTT
+        # Tab 4: RTSP Camera
+        self.rtsp_tab = QWidget()
+        self.setup_rtsp_tab()
+        self.tabs.addTab(self.rtsp_tab, "RTSP 监控")
+
+        # Tab 5: Video File
+        self.video_file_tab = QWidget()
+        self.setup_video_file_tab()
+        self.tabs.addTab(self.video_file_tab, "视频文件")
+
+        # Tab 6: MQTT
         self.mqtt_tab = QWidget()
         self.setup_mqtt_tab()
         self.tabs.addTab(self.mqtt_tab, "MQTT 远程")
 
-        # Tab 5: Settings
+        # Tab 7: Settings
         self.settings_tab = QWidget()
         self.setup_settings_tab()
         self.tabs.addTab(self.settings_tab, "设置")
@@ -218,6 +260,88 @@ class MainWindow(QMainWindow):
         layout.addLayout(controls_layout)
         layout.addWidget(self.http_display)
 
+    def setup_rtsp_tab(self):
+        layout = QVBoxLayout(self.rtsp_tab)
+
+        controls_layout = QHBoxLayout()
+        self.edit_rtsp_url = QLineEdit(self.config_manager.get("rtsp.url", "rtsp://192.168.1.64:554/stream1"))
+        self.edit_rtsp_url.setPlaceholderText("输入 RTSP 地址")
+
+        self.combo_rtsp_transport = QComboBox()
+        self.combo_rtsp_transport.addItem("TCP", "tcp")
+        self.combo_rtsp_transport.addItem("UDP", "udp")
+        self.combo_rtsp_transport.setCurrentIndex(
+            max(0, self.combo_rtsp_transport.findData(self.config_manager.get("rtsp.transport", "tcp"))))
+
+        self.spin_rtsp_buffer = QSpinBox()
+        self.spin_rtsp_buffer.setRange(1, 30)
+        self.spin_rtsp_buffer.setPrefix("缓冲 ")
+        self.spin_rtsp_buffer.setSuffix(" 帧")
+        self.spin_rtsp_buffer.setValue(self.config_manager.get("rtsp.buffer_size", 1))
+
+        self.chk_rtsp_drop = QCheckBox("丢弃旧帧")
+        self.chk_rtsp_drop.setToolTip("推理未取走上一帧时只接收数据不转换画面，始终处理最新帧")
+        self.chk_rtsp_drop.setChecked(self.config_manager.get("rtsp.drop_frames", True))
+
+        self.btn_start_rtsp = QPushButton("开启 RTSP 监控")
+        self.btn_start_rtsp.clicked.connect(self.toggle_rtsp_camera)
+
+        controls_layout.addWidget(QLabel("地址:"))
+        controls_layout.addWidget(self.edit_rtsp_url, 1)
+        controls_layout.addWidget(self.combo_rtsp_transport)
+        controls_layout.addWidget(self.spin_rtsp_buffer)
+        controls_layout.addWidget(self.chk_rtsp_drop)
+        controls_layout.addWidget(self.btn_start_rtsp)
+
+        self.lbl_rtsp_latency = QLabel("")
+        self.rtsp_display = ImageDisplayWidget("RTSP 监控画面")
+
+        layout.addLayout(controls_layout)
+        layout.addWidget(self.lbl_rtsp_latency)
+        layout.addWidget(self.rtsp_display)
+
+    def setup_video_file_tab(self):
+        layout = QVBoxLayout(self.video_file_tab)
+
+        controls_layout = QHBoxLayout()
+        self.edit_video_path = QLineEdit()
+        self.edit_video_path.setPlaceholderText("选择要推理的视频文件 (.mp4/.avi/...)")
+        btn_browse_video = QPushButton("浏览")
+        btn_browse_video.clicked.connect(self.browse_video_file)
+
+        self.combo_video_mode = QComboBox()
+        self.combo_video_mode.addItem("尽快处理", False)
+        self.combo_video_mode.addItem("实时播放", True)
+        self.combo_video_mode.setCurrentIndex(1 if self.config_manager.get("video_file.realtime", False) else 0)
+
+        self.chk_video_save = QCheckBox("保存标注视频")
+        self.chk_video_save.setChecked(self.config_manager.get("video_file.save_video", True))
+        self.chk_video_jsonl = QCheckBox("保存检测结果 (JSONL)")
+        self.chk_video_jsonl.setChecked(self.config_manager.get("video_file.save_jsonl", True))
+
+        self.btn_start_video_file = QPushButton("开始处理")
+        self.btn_start_video_file.clicked.connect(self.toggle_video_file)
+
+        controls_layout.addWidget(QLabel("视频:"))
+        controls_layout.addWidget(self.edit_video_path, 1)
+        controls_layout.addWidget(btn_browse_video)
+        controls_layout.addWidget(self.combo_video_mode)
+        controls_layout.addWidget(self.chk_video_save)
+        controls_layout.addWidget(self.chk_video_jsonl)
+        controls_layout.addWidget(self.btn_start_video_file)
+
+        from PySide6.QtWidgets import QProgressBar
+        self.video_file_progress = QProgressBar()
+        self.video_file_progress.setValue(0)
+        self.lbl_video_file_status = QLabel("准备就绪")
+
+        self.video_file_display = ImageDisplayWidget("视频推理画面")
+
+        layout.addLayout(controls_layout)
+        layout.addWidget(self.video_file_progress)
+        layout.addWidget(self.lbl_video_file_status)
+        layout.addWidget(self.video_file_display)
+
     def setup_mqtt_tab(self):
         layout = QVBoxLayout(self.mqtt_tab)
         
@@ -361,6 +485,21 @@ class MainWindow(QMainWindow):
         
         server_form_layout.addRow("监听地址:", self.edit_server_host)
         server_form_layout.addRow("监听端口:", self.edit_server_port)
+
+        # 慢速订阅者的发送队列溢出策略
+        self.combo_slow_client_policy = QComboBox()
+        self.combo_slow_client_policy.addItem("丢弃最旧消息", "drop_oldest")
+        self.combo_slow_client_policy.addItem("只丢弃摄像头画面", "drop_camera")
+        self.combo_slow_client_policy.addItem("断开慢速客户端", "disconnect")
+        index = self.combo_slow_client_policy.findData(self.config_manager.get("mqtt.slow_client_policy", "drop_oldest"))
+        self.combo_slow_client_policy.setCurrentIndex(max(index, 0))
+
+        self.spin_outbound_packets = QSpinBox()
+        self.spin_outbound_packets.setRange(10, 10000)
+        self.spin_outbound_packets.setValue(self.config_manager.get("mqtt.outbound_max_packets", 100))
+
+        server_form_layout.addRow("队列满时:", self.combo_slow_client_policy)
+        server_form_layout.addRow("发送队列上限 (包):", self.spin_outbound_packets)
         
         mqtt_layout.addWidget(self.server_settings_widget)
         
@@ -384,6 +523,16 @@ class MainWindow(QMainWindow):
         self.edit_model_name.setPlaceholderText("例如: best.pt")
         self.edit_model_name.setText(self.config_manager.get("yolo.model_path", "best.pt"))
         inf_layout.addRow("模型名称:", self.edit_model_name)
+
+        # Inference Backend (exported models are cached next to the weights)
+        self.combo_backend = QComboBox()
+        self.combo_backend.addItem("PyTorch (默认)", "torch")
+        self.combo_backend.addItem("ONNX Runtime (CPU加速)", "onnx")
+        self.combo_backend.addItem("OpenVINO (Intel CPU加速)", "openvino")
+        self.combo_backend.addItem("ONNX INT8 (需先量化)", "onnx_int8")
+        index = self.combo_backend.findData(self.config_manager.get("yolo.backend", "torch"))
+        self.combo_backend.setCurrentIndex(index if index >= 0 else 0)
+        inf_layout.addRow("推理后端:", self.combo_backend)
         
         # Device Selection (GPU/CPU)
         device_group = QGroupBox("硬件加速")
@@ -429,8 +578,221 @@ class MainWindow(QMainWindow):
         device_layout.addLayout(gpu_layout)
         
         inf_layout.addRow("设备选择:", device_group)
+
+        # Motion Gate (skip inference on unchanged frames)
+        motion_group = QGroupBox("运动检测 (画面无变化时跳过推理)")
+        motion_layout = QFormLayout(motion_group)
+
+        self.chk_motion_enabled = QCheckBox("启用")
+        self.chk_motion_enabled.setChecked(self.config_manager.get("motion.enabled", False))
+
+        self.spin_motion_threshold = QSpinBox()
+        self.spin_motion_threshold.setRange(1, 255)
+        self.spin_motion_threshold.setValue(self.config_manager.get("motion.threshold", 10))
+
+        self.spin_motion_blocks = QSpinBox()
+        self.spin_motion_blocks.setRange(1, 64 * 36)
+        self.spin_motion_blocks.setValue(self.config_manager.get("motion.min_changed_blocks", 2))
+
+        self.spin_motion_refresh = QDoubleSpinBox()
+        self.spin_motion_refresh.setRange(0.5, 3600.0)
+        self.spin_motion_refresh.setSuffix(" 秒")
+        self.spin_motion_refresh.setValue(self.config_manager.get("motion.refresh_interval", 5.0))
+
+        motion_layout.addRow(self.chk_motion_enabled)
+        motion_layout.addRow("灵敏度 (灰度变化阈值):", self.spin_motion_threshold)
+        motion_layout.addRow("最少变化块数:", self.spin_motion_blocks)
+        motion_layout.addRow("强制刷新间隔:", self.spin_motion_refresh)
+        inf_layout.addRow(motion_group)
+
+        # Tracking (camera / HTTP only): run the detector every N frames
+        tracking_group = QGroupBox("目标跟踪 (摄像头/HTTP 每N帧检测一次)")
+        tracking_layout = QFormLayout(tracking_group)
+
+        self.chk_tracking_enabled = QCheckBox("启用")
+        self.chk_tracking_enabled.setChecked(self.config_manager.get("tracking.enabled", False))
+
+        self.spin_detect_interval = QSpinBox()
+        self.spin_detect_interval.setRange(1, 30)
+        self.spin_detect_interval.setValue(self.config_manager.get("tracking.detect_interval", 3))
+
+        self.spin_track_min_conf = QDoubleSpinBox()
+        self.spin_track_min_conf.setRange(0.0, 1.0)
+        self.spin_track_min_conf.setSingleStep(0.05)
+        self.spin_track_min_conf.setValue(self.config_manager.get("tracking.min_confidence", 0.3))
+
+        tracking_layout.addRow(self.chk_tracking_enabled)
+        tracking_layout.addRow("检测间隔 (帧):", self.spin_detect_interval)
+        tracking_layout.addRow("跟踪置信度低于此值时立即检测:", self.spin_track_min_conf)
+        inf_layout.addRow(tracking_group)
+
+        # Tiled inference for high-resolution local images
+        tiling_group = QGroupBox("切块推理 (本地高分辨率图片)")
+        tiling_layout = QFormLayout(tiling_group)
+
+        self.chk_tiling_enabled = QCheckBox("启用")
+        self.chk_tiling_enabled.setChecked(self.config_manager.get("tiling.enabled", False))
+
+        self.spin_tile_size = QSpinBox()
+        self.spin_tile_size.setRange(160, 4096)
+        self.spin_tile_size.setSingleStep(32)
+        self.spin_tile_size.setSuffix(" px")
+        self.spin_tile_size.setValue(self.config_manager.get("tiling.tile_size", 640))
+
+        self.spin_tile_overlap = QDoubleSpinBox()
+        self.spin_tile_overlap.setRange(0.0, 0.9)
+        self.spin_tile_overlap.setSingleStep(0.05)
+        self.spin_tile_overlap.setValue(self.config_manager.get("tiling.overlap", 0.2))
+
+        self.chk_tile_full = QCheckBox("同时整图推理一次 (检测被切开的大目标)")
+        self.chk_tile_full.setChecked(self.config_manager.get("tiling.include_full", True))
+
+        tiling_layout.addRow(self.chk_tiling_enabled)
+        tiling_layout.addRow("切块大小:", self.spin_tile_size)
+        tiling_layout.addRow("重叠比例:", self.spin_tile_overlap)
+        tiling_layout.addRow(self.chk_tile_full)
+        inf_layout.addRow(tiling_group)
+
+        # Multi-stream scheduler: all sources share one model with dynamic batching
+        scheduler_group = QGroupBox("多路调度 (所有视频源共享一个模型，动态批处理)")
+        scheduler_layout = QFormLayout(scheduler_group)
+
+        self.chk_scheduler_enabled = QCheckBox("启用 (对之后开启的视频源生效)")
+        self.chk_scheduler_enabled.setChecked(self.config_manager.get("scheduler.enabled", False))
+
+        self.spin_sched_batch = QSpinBox()
+        self.spin_sched_batch.setRange(1, 32)
+        self.spin_sched_batch.setValue(self.config_manager.get("scheduler.max_batch", 4))
+
+        self.spin_sched_latency = QSpinBox()
+        self.spin_sched_latency.setRange(0, 1000)
+        self.spin_sched_latency.setSuffix(" ms")
+        self.spin_sched_latency.setValue(self.config_manager.get("scheduler.max_latency_ms", 30))
+
+        scheduler_layout.addRow(self.chk_scheduler_enabled)
+        scheduler_layout.addRow("最大批次:", self.spin_sched_batch)
+        scheduler_layout.addRow("凑批最长等待:", self.spin_sched_latency)
+        inf_layout.addRow(scheduler_group)
         layout.addWidget(inf_group)
 
+        # INT8 Quantization
+        quant_group = QGroupBox("INT8 量化")
+        quant_layout = QFormLayout(quant_group)
+
+        self.edit_calib_dir = QLineEdit(self.config_manager.get("yolo.int8_calib_dir", ""))
+        self.edit_calib_dir.setPlaceholderText("用于校准的现场图片文件夹")
+        btn_calib_dir = QPushButton("浏览")
+        btn_calib_dir.clicked.connect(lambda: self.browse_folder(self.edit_calib_dir))
+        calib_layout = QHBoxLayout()
+        calib_layout.addWidget(self.edit_calib_dir, 1)
+        calib_layout.addWidget(btn_calib_dir)
+
+        self.edit_val_dir = QLineEdit(self.config_manager.get("yolo.int8_val_dir", ""))
+        self.edit_val_dir.setPlaceholderText("用于对比FP32模型的验证图片文件夹")
+        btn_val_dir = QPushButton("浏览")
+        btn_val_dir.clicked.connect(lambda: self.browse_folder(self.edit_val_dir))
+        val_layout = QHBoxLayout()
+        val_layout.addWidget(self.edit_val_dir, 1)
+        val_layout.addWidget(btn_val_dir)
+
+        self.btn_quantize = QPushButton("量化并评估")
+        self.btn_quantize.clicked.connect(self.start_quantization)
+        self.lbl_quant_status = QLabel("未量化")
+
+        quant_layout.addRow("校准文件夹:", calib_layout)
+        quant_layout.addRow("验证文件夹:", val_layout)
+        quant_layout.addRow(self.btn_quantize, self.lbl_quant_status)
+        layout.addWidget(quant_group)
+
+        # Recording (encoded on background threads)
+        record_group = QGroupBox("录像 (摄像头/HTTP/RTSP/MQTT 画面分段保存)")
+        record_layout = QFormLayout(record_group)
+
+        self.chk_record_enabled = QCheckBox("启用")
+        self.chk_record_enabled.setChecked(self.config_manager.get("recording.enabled", False))
+
+        self.edit_record_dir = QLineEdit(self.config_manager.get("recording.dir", "recordings"))
+        btn_record_dir = QPushButton("浏览")
+        btn_record_dir.clicked.connect(lambda: self.browse_folder(self.edit_record_dir))
+        record_dir_layout = QHBoxLayout()
+        record_dir_layout.addWidget(self.edit_record_dir, 1)
+        record_dir_layout.addWidget(btn_record_dir)
+
+        self.spin_record_fps = QSpinBox()
+        self.spin_record_fps.setRange(1, 60)
+        self.spin_record_fps.setValue(self.config_manager.get("recording.fps", 15))
+
+        self.spin_record_segment = QSpinBox()
+        self.spin_record_segment.setRange(1, 120)
+        self.spin_record_segment.setSuffix(" 分钟")
+        self.spin_record_segment.setValue(self.config_manager.get("recording.segment_minutes", 5))
+
+        self.spin_record_max_mb = QSpinBox()
+        self.spin_record_max_mb.setRange(100, 1024 * 1024)
+        self.spin_record_max_mb.setSuffix(" MB")
+        self.spin_record_max_mb.setValue(self.config_manager.get("recording.max_total_mb", 2048))
+
+        self.spin_record_max_files = QSpinBox()
+        self.spin_record_max_files.setRange(1, 10000)
+        self.spin_record_max_files.setValue(self.config_manager.get("recording.max_files", 100))
+
+        record_layout.addRow(self.chk_record_enabled)
+        record_layout.addRow("保存目录:", record_dir_layout)
+        record_layout.addRow("录像帧率:", self.spin_record_fps)
+        record_layout.addRow("分段时长:", self.spin_record_segment)
+        record_layout.addRow("每路最多占用:", self.spin_record_max_mb)
+        record_layout.addRow("每路最多文件数:", self.spin_record_max_files)
+        layout.addWidget(record_group)
+
+        # Event clips (pre/post-event ring buffer of JPEG frames)
+        clip_group = QGroupBox("事件片段 (检测到指定类别时保存前后画面)")
+        clip_layout = QFormLayout(clip_group)
+
+        self.chk_clip_enabled = QCheckBox("启用")
+        self.chk_clip_enabled.setChecked(self.config_manager.get("event_clips.enabled", False))
+
+        self.edit_clip_classes = QLineEdit(", ".join(str(c) for c in self.config_manager.get("event_clips.classes", [])))
+        self.edit_clip_classes.setPlaceholderText("类别ID或名称，逗号分隔；留空表示任意类别")
+
+        self.spin_clip_conf = QDoubleSpinBox()
+        self.spin_clip_conf.setRange(0.05, 1.0)
+        self.spin_clip_conf.setSingleStep(0.05)
+        self.spin_clip_conf.setValue(self.config_manager.get("event_clips.min_confidence", 0.6))
+
+        self.spin_clip_pre = QDoubleSpinBox()
+        self.spin_clip_pre.setRange(0.0, 120.0)
+        self.spin_clip_pre.setSuffix(" 秒")
+        self.spin_clip_pre.setValue(self.config_manager.get("event_clips.pre_seconds", 5.0))
+
+        self.spin_clip_post = QDoubleSpinBox()
+        self.spin_clip_post.setRange(0.0, 600.0)
+        self.spin_clip_post.setSuffix(" 秒")
+        self.spin_clip_post.setValue(self.config_manager.get("event_clips.post_seconds", 5.0))
+
+        self.edit_clip_dir = QLineEdit(self.config_manager.get("event_clips.dir", "clips"))
+        btn_clip_dir = QPushButton("浏览")
+        btn_clip_dir.clicked.connect(lambda: self.browse_folder(self.edit_clip_dir))
+        clip_dir_layout = QHBoxLayout()
+        clip_dir_layout.addWidget(self.edit_clip_dir, 1)
+        clip_dir_layout.addWidget(btn_clip_dir)
+
+        clip_layout.addRow(self.chk_clip_enabled)
+        clip_layout.addRow("触发类别:", self.edit_clip_classes)
+        clip_layout.addRow("最低置信度:", self.spin_clip_conf)
+        clip_layout.addRow("事件前:", self.spin_clip_pre)
+        clip_layout.addRow("事件后:", self.spin_clip_post)
+        clip_layout.addRow("保存目录:", clip_dir_layout)
+        layout.addWidget(clip_group)
+
+        # Runtime Stats
+        stats_group = QGroupBox("运行状态")
+        stats_layout = QVBoxLayout(stats_group)
+        self.lbl_runtime_stats = QLabel("暂无已加载模型")
+        self.lbl_runtime_stats.setWordWrap(True)
+        self.lbl_runtime_stats.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        stats_layout.addWidget(self.lbl_runtime_stats)
+        layout.addWidget(stats_group)
+
         # UI Settings
         ui_group = QGroupBox("界面设置")
         ui_layout = QFormLayout(ui_group)
@@ -545,7 +907,19 @@ class MainWindow(QMainWindow):
 
     def log_result(self, source, detections):
         timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # Tracked objects are logged once per track ID instead of every frame
+        logged_ids = self.logged_track_ids.setdefault(source, OrderedDict()) if detections.track_id is not None else None
         for d in detections:
+            if logged_ids is not None:
+                track_id = d['track_id']
+                if track_id in logged_ids:
+                    # Still visible: keep it away from the eviction end
+                    logged_ids.move_to_end(track_id)
+                    continue
+                logged_ids[track_id] = True
+                if len(logged_ids) > self.max_logged_track_ids:
+                    # Forget the track that has gone unseen the longest (IDs are never reused)
+                    logged_ids.popitem(last=False)
             self.log_table.add_record(timestamp, source, d['class_name_en'], d['class_name_cn'], d['confidence'])
         
         # Publish to MQTT if connected
@@ -554,8 +928,7 @@ class MainWindow(QMainWindow):
             
             # Simplified payload: just the Chinese class names
             # If multiple detections, join them with comma
-            class_names = [d['class_name_cn'] for d in detections]
-            payload_str = ",".join(class_names)
+            payload_str = ",".join(detections.class_names_cn())
             
             self.mqtt_worker.publish_message(publish_topic, payload_str)
         
@@ -564,13 +937,111 @@ class MainWindow(QMainWindow):
             publish_topic = self.config_manager.get("mqtt.publish_topic", "siot/推理结果")
             
             # Simplified payload: just the Chinese class names
-            class_names = [d['class_name_cn'] for d in detections]
-            payload_str = ",".join(class_names)
+            payload_str = ",".join(detections.class_names_cn())
             
             # The server will broadcast this to all subscribers of the topic
             self.mqtt_server.publish_message(publish_topic, payload_str)
             print(f"[MainWindow] Published to MQTT Server topic '{publish_topic}': {payload_str}")
 
+    def get_inference_scheduler(self):
+        """Shared multi-stream scheduler, or None when each source runs its own model"""
+        if not self.config_manager.get("scheduler.enabled", False):
+            return None
+        if self.inference_scheduler is None or not self.inference_scheduler.is_running():
+            self.inference_scheduler = InferenceScheduler(
+                model_path=self.config_manager.get("yolo.model_path", "yolov8n.pt"),
+                conf_threshold=self.config_manager.get("yolo.conf_threshold", 0.5),
+                classes_dict=self.config_manager.classes,
+                device=self.config_manager.get("yolo.device", "cpu"),
+                backend=self.config_manager.get("yolo.backend", "torch"),
+                max_batch=self.config_manager.get("scheduler.max_batch", 4),
+                max_latency_ms=self.config_manager.get("scheduler.max_latency_ms", 30)
+            )
+            self.inference_scheduler.start()
+        return self.inference_scheduler
+
+    def source_priority(self, name):
+        return self.config_manager.get("scheduler.priorities", {}).get(name, 1.0)
+
+    def record_frame(self, source, frame, detections):
+        """Queue a frame for the source's background recorder and event clip buffer (drops instead of blocking)"""
+        if not self.source_active(source):
+            # Late frame from a source that has already been stopped: don't reopen its recorder
+            return
+        if self.config_manager.get("event_clips.enabled", False):
+            self.clip_frame(source, frame, detections)
+        if not self.config_manager.get("recording.enabled", False):
+            return
+        recorder = self.recorders.get(source)
+        if recorder is None:
+            recorder = SegmentedRecorder(
+                source,
+                self.config_manager.get("recording.dir", "recordings"),
+                fps=self.config_manager.get("recording.fps", 15),
+                segment_seconds=self.config_manager.get("recording.segment_minutes", 5) * 60,
+                max_total_mb=self.config_manager.get("recording.max_total_mb", 2048),
+                max_files=self.config_manager.get("recording.max_files", 100)
+            )
+            recorder.start()
+            self.recorders[source] = recorder
+        recorder.write(frame, detections)
+
+    def source_active(self, source):
+        if source == "mqtt":
+            return any(t is not None and t.isRunning() for t in (self.mqtt_server, self.mqtt_worker))
+        thread = {"camera": self.video_thread, "http": self.http_thread, "rtsp": self.rtsp_thread}.get(source)
+        return thread is not None and thread.isRunning()
+
+    def stop_source_recording(self, source):
+        """Finalize the source's current segment and event clip when the source stops"""
+        recorder = self.recorders.pop(source, None)
+        if recorder:
+            recorder.stop()
+        buffer = self.clip_buffers.pop(source, None)
+        if buffer:
+            buffer.stop()
+
+    def stop_recorders(self):
+        for recorder in self.recorders.values():
+            recorder.stop()
+        self.recorders = {}
+
+    def clip_frame(self, source, frame, detections):
+        buffer = self.clip_buffers.get(source)
+        if buffer is None:
+            buffer = EventClipBuffer(
+                source,
+                self.config_manager.get("event_clips.dir", "clips"),
+                trigger_classes=self.config_manager.get("event_clips.classes", []),
+                min_confidence=self.config_manager.get("event_clips.min_confidence", 0.6),
+                pre_seconds=self.config_manager.get("event_clips.pre_seconds", 5.0),
+                post_seconds=self.config_manager.get("event_clips.post_seconds", 5.0),
+                fps=self.config_manager.get("event_clips.fps", 10),
+                max_buffer_mb=self.config_manager.get("event_clips.max_buffer_mb", 64),
+                max_clip_seconds=self.config_manager.get("event_clips.max_clip_seconds", 60.0),
+                max_clip_mb=self.config_manager.get("event_clips.max_clip_mb", 128)
+            )
+            buffer.start()
+            self.clip_buffers[source] = buffer
+        buffer.write(frame, detections)
+
+    def stop_clip_buffers(self):
+        for buffer in self.clip_buffers.values():
+            buffer.stop()
+        self.clip_buffers = {}
+
+    def is_display_active(self, display):
+        # A display that is on a hidden tab or in a minimized window never shows the frame
+        return display.isVisible() and not self.isMinimized()
+
+    def show_detections(self, display, frame, detections):
+        """Annotate the frame only if it will actually be shown. Returns the annotated frame or None."""
+        if not self.is_display_active(display):
+            return None
+        annotated = get_annotator().draw(frame, detections)
+        display.update_image(annotated)
+        return annotated
+
     # Local Image
     def load_image(self):
         path, _ = QFileDialog.getOpenFileName(self, "打开图片", "", "Images (*.png *.jpg *.jpeg *.bmp)")
@@ -593,21 +1064,46 @@ class MainWindow(QMainWindow):
             return
         
         self.local_display_orig.update_image(img)
-        detections, annotated, _ = self.yolo.predict(img)
-        self.local_display_res.update_image(annotated)
+        tiling = self.config_manager.get("tiling", {})
+        if tiling.get("enabled", False):
+            detections, _, total_ms, tile_times = self.yolo.predict_tiled(
+                img,
+                tile_size=tiling.get("tile_size", 640),
+                overlap=tiling.get("overlap", 0.2),
+                batch_size=self.config_manager.get("yolo.batch_size", 8),
+                include_full=tiling.get("include_full", True),
+                annotate=False
+            )
+            self.batch_progress_label.setText(
+                f"切块推理: {len(tile_times)} 块 | 总耗时 {total_ms:.1f} ms | "
+                f"每块平均 {sum(tile_times) / len(tile_times):.1f} ms, 最长 {max(tile_times):.1f} ms"
+            )
+            self.batch_progress_label.setVisible(True)
+        else:
+            detections, _, _ = self.yolo.predict(img, annotate=False)
+        self.show_detections(self.local_display_res, img, detections)
         self.log_result("本地图片", detections)
 
     # Camera
     def toggle_camera(self):
         if self.video_thread and self.video_thread.isRunning():
             self.video_thread.stop()
+            self.stop_source_recording("camera")
             self.btn_start_cam.setText("开启摄像头")
         else:
+            # A new thread restarts track IDs from 1
+            self.logged_track_ids.pop("摄像头", None)
             self.video_thread = VideoThread(
                 model_path=self.config_manager.get("yolo.model_path", "yolov8n.pt"),
                 conf_threshold=self.config_manager.get("yolo.conf_threshold", 0.5),
                 classes_dict=self.config_manager.classes,
-                device=self.config_manager.get("yolo.device", "cpu")
+                device=self.config_manager.get("yolo.device", "cpu"),
+                backend=self.config_manager.get("yolo.backend", "torch"),
+                motion_config=self.config_manager.get("motion", {}),
+                tracking_config=self.config_manager.get("tracking", {}),
+                scheduler=self.get_inference_scheduler(),
+                source_name="摄像头",
+                priority=self.source_priority("摄像头")
             )
             self.video_thread.frame_processed.connect(self.process_camera_result)
             self.video_thread.connection_status.connect(self.on_camera_status)
@@ -626,15 +1122,22 @@ class MainWindow(QMainWindow):
             self.btn_start_cam.setText("开启摄像头")
             self.btn_start_cam.setEnabled(True)
             self.video_thread = None
+            self.stop_source_recording("camera")
 
-    def process_camera_result(self, annotated_frame, detections):
-        self.cam_display.update_image(annotated_frame)
+    def process_camera_result(self, frame, detections):
+        annotated_frame = self.show_detections(self.cam_display, frame, detections)
+        if self.video_thread:
+            self.video_thread.mark_displayed(frame)
+        self.record_frame("camera", frame, detections)
         if detections:
             self.log_result("摄像头", detections)
         
         if self.mqtt_worker and self.mqtt_worker.isRunning():
             try:
                 import base64
+                # Encode step: annotate here if the display skipped it
+                if annotated_frame is None:
+                    annotated_frame = get_annotator().draw(frame, detections)
                 _, buffer = cv2.imencode('.jpg', annotated_frame)
                 img_base64 = base64.b64encode(buffer).decode('utf-8')
                 self.mqtt_worker.publish_message("siot/摄像头", img_base64)
@@ -645,6 +1148,7 @@ class MainWindow(QMainWindow):
     def toggle_http_camera(self):
         if self.http_thread and self.http_thread.isRunning():
             self.http_thread.stop()
+            self.stop_source_recording("http")
             self.btn_start_http.setText("开启 HTTP 监控")
             self.edit_http_url.setEnabled(True)
         else:
@@ -656,12 +1160,20 @@ class MainWindow(QMainWindow):
             # Save config
             self.config_manager.set("yolo.http_stream_url", url)
             
+            self.logged_track_ids.pop("HTTP 监控", None)
             self.http_thread = VideoThread(
                 camera_id=url,
                 model_path=self.config_manager.get("yolo.model_path", "yolov8n.pt"),
                 conf_threshold=self.config_manager.get("yolo.conf_threshold", 0.5),
                 classes_dict=self.config_manager.classes,
-                device=self.config_manager.get("yolo.device", "cpu")
+                device=self.config_manager.get("yolo.device", "cpu"),
+                backend=self.config_manager.get("yolo.backend", "torch"),
+                motion_config=self.config_manager.get("motion", {}),
+                tracking_config=self.config_manager.get("tracking", {}),
+                native_mjpeg=self.config_manager.get("yolo.http_native_mjpeg", True),
+                scheduler=self.get_inference_scheduler(),
+                source_name="HTTP 监控",
+                priority=self.source_priority("HTTP 监控")
             )
             self.http_thread.frame_processed.connect(self.process_http_result)
             self.http_thread.connection_status.connect(self.on_http_status)
@@ -677,17 +1189,169 @@ class MainWindow(QMainWindow):
         else:
             if message == "正在连接...":
                 return
+            if message.startswith("正在重连"):
+                # The MJPEG reader reconnects by itself; keep the stop button usable
+                self.btn_start_http.setText(f"关闭 HTTP 监控 ({message})")
+                self.btn_start_http.setEnabled(True)
+                return
             QMessageBox.warning(self, "错误", f"HTTP 连接错误: {message}")
             self.btn_start_http.setText("开启 HTTP 监控")
             self.btn_start_http.setEnabled(True)
             self.edit_http_url.setEnabled(True)
             self.http_thread = None
+            self.stop_source_recording("http")
 
-    def process_http_result(self, annotated_frame, detections):
-        self.http_display.update_image(annotated_frame)
+    def process_http_result(self, frame, detections):
+        self.show_detections(self.http_display, frame, detections)
+        if self.http_thread:
+            self.http_thread.mark_displayed(frame)
+        self.record_frame("http", frame, detections)
         if detections:
             self.log_result("HTTP 监控", detections)
 
+    # RTSP Camera
+    def rtsp_controls_enabled(self, enabled):
+        for widget in (self.edit_rtsp_url, self.combo_rtsp_transport, self.spin_rtsp_buffer, self.chk_rtsp_drop):
+            widget.setEnabled(enabled)
+
+    def toggle_rtsp_camera(self):
+        if self.rtsp_thread and self.rtsp_thread.isRunning():
+            self.rtsp_thread.stop()
+            self.stop_source_recording("rtsp")
+            self.btn_start_rtsp.setText("开启 RTSP 监控")
+            self.lbl_rtsp_latency.setText("")
+            self.rtsp_controls_enabled(True)
+            return
+
+        url = self.edit_rtsp_url.text().strip()
+        if not url.startswith("rtsp://"):
+            QMessageBox.warning(self, "错误", "请输入有效的 RTSP 地址 (rtsp://...)")
+            return
+
+        self.config_manager.set("rtsp.url", url)
+        self.config_manager.set("rtsp.transport", self.combo_rtsp_transport.currentData())
+        self.config_manager.set("rtsp.buffer_size", self.spin_rtsp_buffer.value())
+        self.config_manager.set("rtsp.drop_frames", self.chk_rtsp_drop.isChecked())
+
+        self.logged_track_ids.pop("RTSP 监控", None)
+        self.rtsp_thread = VideoThread(
+            camera_id=url,
+            model_path=self.config_manager.get("yolo.model_path", "yolov8n.pt"),
+            conf_threshold=self.config_manager.get("yolo.conf_threshold", 0.5),
+            classes_dict=self.config_manager.classes,
+            device=self.config_manager.get("yolo.device", "cpu"),
+            backend=self.config_manager.get("yolo.backend", "torch"),
+            motion_config=self.config_manager.get("motion", {}),
+            tracking_config=self.config_manager.get("tracking", {}),
+            scheduler=self.get_inference_scheduler(),
+            source_name="RTSP 监控",
+            priority=self.source_priority("RTSP 监控"),
+            rtsp_config=self.config_manager.get("rtsp", {})
+        )
+        self.rtsp_thread.frame_processed.connect(self.process_rtsp_result)
+        self.rtsp_thread.connection_status.connect(self.on_rtsp_status)
+        self.rtsp_thread.start()
+        self.btn_start_rtsp.setText("正在连接...")
+        self.btn_start_rtsp.setEnabled(False)
+        self.rtsp_controls_enabled(False)
+
+    def on_rtsp_status(self, success, message):
+        if success:
+            self.btn_start_rtsp.setText("关闭 RTSP 监控")
+            self.btn_start_rtsp.setEnabled(True)
+        else:
+            if message == "正在连接...":
+                return
+            QMessageBox.warning(self, "错误", f"RTSP 连接错误: {message}")
+            self.btn_start_rtsp.setText("开启 RTSP 监控")
+            self.btn_start_rtsp.setEnabled(True)
+            self.rtsp_controls_enabled(True)
+            self.rtsp_thread = None
+            self.stop_source_recording("rtsp")
+
+    def process_rtsp_result(self, frame, detections):
+        self.show_detections(self.rtsp_display, frame, detections)
+        thread = self.rtsp_thread
+        if thread:
+            thread.mark_displayed(frame)
+            pipeline = thread.get_stats()['pipeline']
+            self.lbl_rtsp_latency.setText(
+                f"采集→显示延迟 {pipeline['display_latency_ms']:.0f} ms | 采集→推理完成 {pipeline['frame_age_ms']:.0f} ms | "
+                f"采集 {pipeline['capture_fps']:.1f} FPS | 推理 {pipeline['inference_fps']:.1f} FPS")
+        self.record_frame("rtsp", frame, detections)
+        if detections:
+            self.log_result("RTSP 监控", detections)
+
+    # Video File
+    def browse_video_file(self):
+        path, _ = QFileDialog.getOpenFileName(self, "选择视频文件", "", "Videos (*.mp4 *.avi *.mkv *.mov *.mp)")
+        if path:
+            self.edit_video_path.setText(path)
+
+    def toggle_video_file(self):
+        if self.video_file_thread and self.video_file_thread.isRunning():
+            self.video_file_thread.stop()
+            self.lbl_video_file_status.setText("处理已停止")
+            self.btn_start_video_file.setText("开始处理")
+            return
+
+        path = self.edit_video_path.text().strip()
+        if not path or not os.path.isfile(path):
+            QMessageBox.warning(self, "错误", "请选择有效的视频文件")
+            return
+
+        realtime = self.combo_video_mode.currentData()
+        self.config_manager.set("video_file.realtime", realtime)
+        self.config_manager.set("video_file.save_video", self.chk_video_save.isChecked())
+        self.config_manager.set("video_file.save_jsonl", self.chk_video_jsonl.isChecked())
+
+        self.video_file_thread = VideoFileThread(
+            video_path=path,
+            model_path=self.config_manager.get("yolo.model_path", "yolov8n.pt"),
+            conf_threshold=self.config_manager.get("yolo.conf_threshold", 0.5),
+            classes_dict=self.config_manager.classes,
+            device=self.config_manager.get("yolo.device", "cpu"),
+            backend=self.config_manager.get("yolo.backend", "torch"),
+            batch_size=self.config_manager.get("yolo.batch_size", 8),
+            output_dir=self.config_manager.get("video_file.output_dir", "video_results"),
+            realtime=realtime,
+            save_video=self.chk_video_save.isChecked(),
+            save_jsonl=self.chk_video_jsonl.isChecked()
+        )
+        self.video_file_thread.progress_updated.connect(self.on_video_file_progress)
+        self.video_file_thread.frame_processed.connect(self.process_video_file_result)
+        self.video_file_thread.processing_finished.connect(self.on_video_file_finished)
+        self.video_file_thread.error_occurred.connect(self.on_video_file_error)
+        self.video_file_progress.setValue(0)
+        self.lbl_video_file_status.setText("正在加载模型...")
+        self.btn_start_video_file.setText("停止处理")
+        self.video_file_thread.start()
+
+    def on_video_file_progress(self, current, total, throughput):
+        if total > 0:
+            self.video_file_progress.setMaximum(total)
+            self.video_file_progress.setValue(min(current, total))
+        self.lbl_video_file_status.setText(f"已处理 {current} / {total} 帧 - {throughput:.1f} 帧/秒")
+
+    def process_video_file_result(self, frame, detections):
+        self.show_detections(self.video_file_display, frame, detections)
+
+    def on_video_file_finished(self, summary):
+        outputs = [p for p in (summary['video_path'], summary['jsonl_path']) if p]
+        text = (f"处理完成！共 {summary['frames']} 帧, 用时 {summary['seconds']:.1f} 秒, "
+                f"{summary['fps']:.1f} 帧/秒, 平均推理 {summary['avg_inference_ms']:.1f} ms")
+        if summary['skipped']:
+            text += f", 实时模式跳过推理 {summary['skipped']} 帧"
+        if outputs:
+            text += "\n输出: " + ", ".join(outputs)
+        self.lbl_video_file_status.setText(text)
+        self.btn_start_video_file.setText("开始处理")
+
+    def on_video_file_error(self, error_message):
+        QMessageBox.warning(self, "视频推理错误", error_message)
+        if not self.video_file_thread.isRunning():
+            self.btn_start_video_file.setText("开始处理")
+
     # MQTT
     def toggle_mqtt(self):
         mqtt_mode = self.config_manager.get("mqtt.mode", "client")
@@ -697,6 +1361,7 @@ class MainWindow(QMainWindow):
                 self.mqtt_server.stop()
                 if self.mqtt_inference_thread:
                     self.mqtt_inference_thread.stop()
+                self.stop_source_recording("mqtt")
                 self.btn_connect_mqtt.setText("启动 MQTT 服务端")
                 self.lbl_mqtt_status.setText("状态: 已停止")
                 self.lbl_mqtt_status.setStyleSheet("background-color: #555; color: white;")
@@ -709,13 +1374,25 @@ class MainWindow(QMainWindow):
                     model_path=self.config_manager.get("yolo.model_path", "yolov8n.pt"),
                     conf_threshold=self.config_manager.get("yolo.conf_threshold", 0.5),
                     classes_dict=self.config_manager.classes,
-                    device=self.config_manager.get("yolo.device", "cpu")
+                    device=self.config_manager.get("yolo.device", "cpu"),
+                    backend=self.config_manager.get("yolo.backend", "torch"),
+                    motion_config=self.config_manager.get("motion", {}),
+                    scheduler=self.get_inference_scheduler(),
+                    priority=self.source_priority("MQTT 服务端")
                 )
                 self.mqtt_inference_thread.inference_finished.connect(self.on_mqtt_inference_finished)
                 self.mqtt_inference_thread.error_occurred.connect(lambda err: self.log_mqtt_message(f"推理错误: {err}"))
                 self.mqtt_inference_thread.start()
 
-                self.mqtt_server = MqttServer(host=host, port=port)
+                self.mqtt_server = MqttServer(
+                    host=host,
+                    port=port,
+                    max_queue_packets=self.config_manager.get("mqtt.outbound_max_packets", 100),
+                    max_queue_mb=self.config_manager.get("mqtt.outbound_max_mb", 8),
+                    slow_client_policy=self.config_manager.get("mqtt.slow_client_policy", "drop_oldest"),
+                    max_inflight=self.config_manager.get("mqtt.max_inflight", 20),
+                    retry_interval=self.config_manager.get("mqtt.retry_interval", 5.0)
+                )
                 self.mqtt_server.server_started.connect(self.on_mqtt_server_started)
                 self.mqtt_server.server_stopped.connect(self.on_mqtt_server_stopped)
                 self.mqtt_server.client_connected.connect(self.on_mqtt_client_connected)
@@ -728,6 +1405,7 @@ class MainWindow(QMainWindow):
         else:
             if self.mqtt_worker and self.mqtt_worker.isRunning():
                 self.mqtt_worker.stop()
+                self.stop_source_recording("mqtt")
                 self.btn_connect_mqtt.setText("连接 MQTT")
                 self.lbl_mqtt_status.setText("状态: 未连接")
                 self.lbl_mqtt_status.setStyleSheet("background-color: #555; color: white;")
@@ -743,7 +1421,10 @@ class MainWindow(QMainWindow):
                     model_path=self.config_manager.get("yolo.model_path", "yolov8n.pt"),
                     conf_threshold=self.config_manager.get("yolo.conf_threshold", 0.5),
                     classes_dict=self.config_manager.classes,
-                    device=self.config_manager.get("yolo.device", "cpu")
+                    device=self.config_manager.get("yolo.device", "cpu"),
+                    backend=self.config_manager.get("yolo.backend", "torch"),
+                    scheduler=self.get_inference_scheduler(),
+                    priority=self.source_priority("MQTT 客户端")
                 )
                 self.mqtt_worker.connection_status.connect(self.update_mqtt_status)
                 self.mqtt_worker.frame_processed.connect(self.process_mqtt_result)
@@ -757,6 +1438,8 @@ class MainWindow(QMainWindow):
         self.lbl_mqtt_status.setStyleSheet("background-color: #28a745; color: white;")
     
     def on_mqtt_server_stopped(self):
+        # Also covers the server loop exiting on its own (e.g. the port could not be bound)
+        self.stop_source_recording("mqtt")
         self.btn_connect_mqtt.setText("启动 MQTT 服务端")
         self.lbl_mqtt_status.setText("状态: 已停止")
         self.lbl_mqtt_status.setStyleSheet("background-color: #555; color: white;")
@@ -773,11 +1456,12 @@ class MainWindow(QMainWindow):
         if self.mqtt_inference_thread:
             self.mqtt_inference_thread.update_frame(image_bytes)
 
-    def on_mqtt_inference_finished(self, annotated_frame, detections):
+    def on_mqtt_inference_finished(self, frame, detections):
         print(f"[MainWindow] Signal received. Detections: {len(detections)}")
-        self.mqtt_display.update_image(annotated_frame)
-        # self.log_mqtt_message("图像已更新到显示区域") # Reduce log spam
-        print("图像已更新到显示区域")
+        self.record_frame("mqtt", frame, detections)
+        if self.show_detections(self.mqtt_display, frame, detections) is not None:
+            # self.log_mqtt_message("图像已更新到显示区域") # Reduce log spam
+            print("图像已更新到显示区域")
         if detections:
             self.log_result("MQTT服务端 (摄像头)", detections)
     
@@ -788,16 +1472,14 @@ class MainWindow(QMainWindow):
         self.log_mqtt_message(f"来自 {client_id} 的消息 - 主题: {topic}, 内容: {payload}")
         
         import base64
-        import numpy as np
         
         try:
             image_data = base64.b64decode(payload)
-            nparr = np.frombuffer(image_data, np.uint8)
-            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            frame, detections, _, _ = self.yolo.predict_encoded(image_data)
             
             if frame is not None:
-                detections, annotated_frame, _ = self.yolo.predict(frame)
-                self.mqtt_display.update_image(annotated_frame)
+                self.show_detections(self.mqtt_display, frame, detections)
+                self.record_frame("mqtt", frame, detections)
                 if detections:
                     self.log_result(f"MQTT服务端 ({topic})", detections)
         except Exception as e:
@@ -867,8 +1549,9 @@ class MainWindow(QMainWindow):
         
         self.mqtt_log_text.scrollToBottom()
 
-    def process_mqtt_result(self, topic, annotated_frame, detections):
-        self.mqtt_display.update_image(annotated_frame)
+    def process_mqtt_result(self, topic, frame, detections):
+        self.show_detections(self.mqtt_display, frame, detections)
+        self.record_frame("mqtt", frame, detections)
         if detections and topic != "siot/摄像头":
             self.log_result(f"MQTT ({topic})", detections)
 
@@ -895,6 +1578,8 @@ class MainWindow(QMainWindow):
         # Save MQTT Server Settings
         self.config_manager.set("mqtt.server_host", self.edit_server_host.text())
         self.config_manager.set("mqtt.server_port", self.edit_server_port.value())
+        self.config_manager.set("mqtt.slow_client_policy", self.combo_slow_client_policy.currentData())
+        self.config_manager.set("mqtt.outbound_max_packets", self.spin_outbound_packets.value())
         
         # Save Inference Settings
         new_conf = self.spin_conf.value()
@@ -912,115 +1597,82 @@ class MainWindow(QMainWindow):
         # Update local instance immediately
         if self.yolo:
             self.yolo.conf_threshold = new_conf
-        
-        # Save Device Settings
+        if self.mqtt_inference_thread and self.mqtt_inference_thread.isRunning():
+            self.mqtt_inference_thread.set_config(new_conf)
+
+        # Save Motion Gate Settings and apply to running threads
+        self.config_manager.set("motion.enabled", self.chk_motion_enabled.isChecked())
+        self.config_manager.set("motion.threshold", self.spin_motion_threshold.value())
+        self.config_manager.set("motion.min_changed_blocks", self.spin_motion_blocks.value())
+        self.config_manager.set("motion.refresh_interval", self.spin_motion_refresh.value())
+        motion_config = self.config_manager.get("motion", {})
+        for thread in (self.video_thread, self.http_thread, self.rtsp_thread, self.mqtt_inference_thread):
+            if thread and thread.isRunning():
+                thread.set_motion_config(motion_config)
+
+        # Save Tracking Settings (applied when the camera/HTTP stream is restarted)
+        self.config_manager.set("tracking.enabled", self.chk_tracking_enabled.isChecked())
+        self.config_manager.set("tracking.detect_interval", self.spin_detect_interval.value())
+        self.config_manager.set("tracking.min_confidence", self.spin_track_min_conf.value())
+
+        # Save Recording Settings; recorders restart with the new settings on the next frame
+        record_settings = {
+            "enabled": self.chk_record_enabled.isChecked(),
+            "dir": self.edit_record_dir.text().strip() or "recordings",
+            "fps": self.spin_record_fps.value(),
+            "segment_minutes": self.spin_record_segment.value(),
+            "max_total_mb": self.spin_record_max_mb.value(),
+            "max_files": self.spin_record_max_files.value()
+        }
+        if record_settings != self.config_manager.get("recording", {}):
+            self.stop_recorders()
+        for key, value in record_settings.items():
+            self.config_manager.set(f"recording.{key}", value)
+
+        # Save Event Clip Settings; clip buffers restart with the new settings on the next frame
+        clip_settings = {
+            "enabled": self.chk_clip_enabled.isChecked(),
+            "classes": [c.strip() for c in self.edit_clip_classes.text().replace("，", ",").split(",") if c.strip()],
+            "min_confidence": self.spin_clip_conf.value(),
+            "pre_seconds": self.spin_clip_pre.value(),
+            "post_seconds": self.spin_clip_post.value(),
+            "dir": self.edit_clip_dir.text().strip() or "clips"
+        }
+        if any(self.config_manager.get(f"event_clips.{key}") != value for key, value in clip_settings.items()):
+            self.stop_clip_buffers()
+        for key, value in clip_settings.items():
+            self.config_manager.set(f"event_clips.{key}", value)
+
+        # Save Scheduler Settings (batch size / latency apply to the running scheduler)
+        self.config_manager.set("scheduler.enabled", self.chk_scheduler_enabled.isChecked())
+        self.config_manager.set("scheduler.max_batch", self.spin_sched_batch.value())
+        self.config_manager.set("scheduler.max_latency_ms", self.spin_sched_latency.value())
+        if self.inference_scheduler:
+            self.inference_scheduler.max_batch = self.spin_sched_batch.value()
+            self.inference_scheduler.max_latency = self.spin_sched_latency.value() / 1000.0
+            self.inference_scheduler.conf_threshold = new_conf
+
+        # Save Tiling Settings (used by the next local image / folder)
+        self.config_manager.set("tiling.enabled", self.chk_tiling_enabled.isChecked())
+        self.config_manager.set("tiling.tile_size", self.spin_tile_size.value())
+        self.config_manager.set("tiling.overlap", self.spin_tile_overlap.value())
+        self.config_manager.set("tiling.include_full", self.chk_tile_full.isChecked())
+        
+        # Model / Device / Backend: loaded in the background and hot-swapped into
+        # every running inference thread between frames (no thread restarts)
         new_device = "cpu" if self.radio_cpu.isChecked() else "cuda"
-        old_device = self.config_manager.get("yolo.device", "cpu")
-        
-        # Save Model Path
         new_model_path = self.edit_model_name.text().strip()
         if not new_model_path:
             new_model_path = "best.pt" # Default
             self.edit_model_name.setText(new_model_path)
-            
-        old_model_path = self.config_manager.get("yolo.model_path", "best.pt")
-        
-        need_restart_threads = False
-        
-        # Check if Model or Device changed
-        if new_model_path != old_model_path:
-            self.config_manager.set("yolo.model_path", new_model_path)
-            if self.yolo:
-                self.yolo.model_path = os.path.join(os.path.dirname(self.yolo.model_path), new_model_path)
-                # Re-init will happen below if device also changes, or we force it
-                need_restart_threads = True
-                print(f"[Settings] 模型名称已更改: {old_model_path} -> {new_model_path}")
-
-        if new_device != old_device:
-            self.config_manager.set("yolo.device", new_device)
-            need_restart_threads = True
-            
-            # Try to switch device for local instance
-            if new_device == "cuda":
-                try:
-                    self.yolo.set_device(new_device)
-                    QMessageBox.information(self, "硬件加速", "GPU加速已启用！\n相关后台线程将自动重启以应用新设置。")
-                    self.lbl_gpu_check.setVisible(True)
-                    self.lbl_cpu_check.setVisible(False)
-                except Exception as e:
-                    self.show_gpu_error_dialog(str(e))
-                    self.radio_cpu.setChecked(True)
-                    self.config_manager.set("yolo.device", "cpu")
-                    self.yolo.set_device("cpu")
-                    self.lbl_cpu_check.setVisible(True)
-                    self.lbl_gpu_check.setVisible(False)
-                    new_device = "cpu"
-                    need_restart_threads = False # Cancel restart if failed (or restart with cpu?)
-                    # If model changed but GPU failed, we still might want to restart threads with CPU
-                    if new_model_path != old_model_path:
-                         need_restart_threads = True
-            else:
-                self.yolo.set_device(new_device)
-                QMessageBox.information(self, "硬件加速", "已切换至CPU运行模式！\n相关后台线程将自动重启以应用新设置。")
-                self.lbl_cpu_check.setVisible(True)
-                self.lbl_gpu_check.setVisible(False)
-        
-        # Re-initialize local model if only model path changed (and device didn't trigger init logic above)
-        if new_model_path != old_model_path and new_device == old_device:
-             if self.yolo:
-                 # Need to reconstruct full path logic roughly or just trust relative
-                 # Inference class handles relative paths well usually if cwd is correct
-                 # But YoloInference does: os.path.join(base_path, model_path)
-                 self.yolo.model_path = new_model_path # YoloInference handles join internally if we pass to init, but here we are setting attr
-                 # Actually self.yolo.model_path in __init__ stores the FULL path. 
-                 # We need to be careful. 
-                 # Let's just re-instantiate or call init_model? 
-                 # The init_model uses self.model_path. 
-                 # We need to update self.model_path to the full path.
-                 
-                 # Simpler: Just make YoloInference reload from the filename
-                 # But YoloInference.__init__ calculates base_path. 
-                 # We can hack it or add a method. 
-                 # For now, let's just use the logic from __init__ roughly:
-                 if getattr(sys, 'frozen', False):
-                    base_path = sys._MEIPASS
-                 else:
-                    base_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-                 self.yolo.model_path = os.path.join(base_path, new_model_path)
-                 
-                 self.yolo.init_model()
-                 QMessageBox.information(self, "模型设置", f"模型已切换为: {new_model_path}")
-
-
-        if need_restart_threads:
-            # Restart MqttInferenceThread if running
-            if self.mqtt_inference_thread and self.mqtt_inference_thread.isRunning():
-                print(f"[Settings] 重启 MQTT 推理线程以应用新设置")
-                self.mqtt_inference_thread.stop()
-                self.mqtt_inference_thread.wait() # Ensure it stops
-                # Re-create and start
-                self.mqtt_inference_thread = MqttInferenceThread(
-                    model_path=self.config_manager.get("yolo.model_path", "yolov8n.pt"),
-                    conf_threshold=self.config_manager.get("yolo.conf_threshold", 0.5),
-                    classes_dict=self.config_manager.classes,
-                    device=self.config_manager.get("yolo.device", "cpu")
-                )
-                self.mqtt_inference_thread.inference_finished.connect(self.on_mqtt_inference_finished)
-                self.mqtt_inference_thread.error_occurred.connect(lambda err: self.log_mqtt_message(f"推理错误: {err}"))
-                self.mqtt_inference_thread.start()
-                
-            # Restart VideoThread if running (Local Camera)
-            if self.video_thread and self.video_thread.isRunning():
-                 print(f"[Settings] 重启摄像头线程以应用新设置")
-                 self.on_btn_start_cam_clicked() # Stop
-                 self.on_btn_start_cam_clicked() # Start (will read new config)
-            
-            # Restart HTTP Thread if running
-            if self.http_thread and self.http_thread.isRunning():
-                 print(f"[Settings] 重启HTTP监控线程以应用新设置")
-                 self.on_btn_start_http_clicked() # Stop
-                 self.on_btn_start_http_clicked() # Start
-            
+        new_backend = self.combo_backend.currentData()
+
+        current = (self.config_manager.get("yolo.model_path", "best.pt"),
+                   self.config_manager.get("yolo.device", "cpu"),
+                   self.config_manager.get("yolo.backend", "torch"))
+        if (new_model_path, new_device, new_backend) != current:
+            self.start_model_swap(new_model_path, new_device, new_backend)
+        
         # Save UI Settings
         new_mode = "dark" if self.combo_mode.currentIndex() == 0 else "light"
         new_color = self.combo_color.currentData()
@@ -1039,6 +1691,183 @@ class MainWindow(QMainWindow):
         self.config_manager.set("mqtt.topics", topics)
         QMessageBox.information(self, "设置", "配置保存成功！")
 
+    def browse_folder(self, line_edit):
+        folder = QFileDialog.getExistingDirectory(self, "选择文件夹", line_edit.text())
+        if folder:
+            line_edit.setText(folder)
+
+    # --- Model Hot Swap ---
+
+    def start_model_swap(self, model_path, device, backend):
+        if self.model_swap_thread and self.model_swap_thread.isRunning():
+            QMessageBox.information(self, "模型切换", "上一次模型切换仍在进行中，请稍后再保存。")
+            return
+        print(f"[Settings] 后台加载新模型: {model_path} ({device}/{backend})，当前模型继续推理")
+        self.btn_save_config.setText("保存配置 (正在加载新模型...)")
+        self.model_swap_thread = ModelSwapThread(model_path, device, backend)
+        self.model_swap_thread.swap_finished.connect(self.on_model_swap_finished)
+        self.model_swap_thread.error_occurred.connect(self.on_model_swap_error)
+        self.model_swap_thread.start()
+
+    def on_model_swap_finished(self, model_path, device, backend):
+        self.btn_save_config.setText("保存配置")
+        requested_backend = self.model_swap_thread.backend
+        self.config_manager.set("yolo.model_path", model_path)
+        self.config_manager.set("yolo.device", device)
+        self.config_manager.set("yolo.backend", backend)
+        # The UI-owned instance switches now; worker threads switch before their next frame
+        if self.yolo:
+            self.yolo.sync_active_model()
+        self.update_device_check_mark()
+
+        if backend != requested_backend:
+            QMessageBox.warning(self, "推理后端", f"{requested_backend} 模型导出或加载失败，已回退到 PyTorch 后端。")
+            self.combo_backend.setCurrentIndex(self.combo_backend.findData(backend))
+        else:
+            QMessageBox.information(self, "模型设置",
+                                    f"已切换为: {model_path} ({device}/{backend})\n正在运行的推理会在下一帧使用新模型。")
+
+    def on_model_swap_error(self, error_message):
+        self.btn_save_config.setText("保存配置")
+        # The old model is still serving; restore the widgets to the settings in effect
+        if self.model_swap_thread.device != "cpu":
+            self.show_gpu_error_dialog(error_message)
+        else:
+            QMessageBox.warning(self, "模型设置", error_message)
+        self.edit_model_name.setText(self.config_manager.get("yolo.model_path", "best.pt"))
+        if self.config_manager.get("yolo.device", "cpu") == "cuda":
+            self.radio_gpu.setChecked(True)
+        else:
+            self.radio_cpu.setChecked(True)
+        self.combo_backend.setCurrentIndex(self.combo_backend.findData(self.config_manager.get("yolo.backend", "torch")))
+
+    # --- INT8 Quantization ---
+
+    def start_quantization(self):
+        if self.quantization_thread and self.quantization_thread.isRunning():
+            return
+
+        calib_dir = self.edit_calib_dir.text().strip()
+        val_dir = self.edit_val_dir.text().strip()
+        if not os.path.isdir(calib_dir) or not os.path.isdir(val_dir):
+            QMessageBox.warning(self, "错误", "请选择有效的校准文件夹和验证文件夹")
+            return
+
+        self.config_manager.set("yolo.int8_calib_dir", calib_dir)
+        self.config_manager.set("yolo.int8_val_dir", val_dir)
+
+        self.quantization_thread = QuantizationThread(
+            model_path=self.yolo.model_path,
+            calib_dir=calib_dir,
+            val_dir=val_dir,
+            imgsz=self.config_manager.get("yolo.imgsz", 640),
+            conf_threshold=self.config_manager.get("yolo.conf_threshold", 0.5),
+            device=self.config_manager.get("yolo.device", "cpu")
+        )
+        self.quantization_thread.progress_updated.connect(self.lbl_quant_status.setText)
+        self.quantization_thread.quantization_finished.connect(self.on_quantization_finished)
+        self.quantization_thread.error_occurred.connect(self.on_quantization_error)
+        self.quantization_thread.start()
+        self.btn_quantize.setEnabled(False)
+
+    def on_quantization_finished(self, report):
+        self.btn_quantize.setEnabled(True)
+        summary = (f"FP32: {report['fp32_ms']:.1f} ms | INT8: {report['int8_ms']:.1f} ms | "
+                   f"加速比: {report['speedup']:.2f}x | 检测一致性: {report['agreement'] * 100:.1f}%")
+        self.lbl_quant_status.setText(summary)
+
+        reply = QMessageBox.question(
+            self, "INT8 量化完成",
+            f"验证图片: {report['images']} 张\n"
+            f"FP32 平均耗时: {report['fp32_ms']:.1f} ms\n"
+            f"INT8 平均耗时: {report['int8_ms']:.1f} ms\n"
+            f"加速比: {report['speedup']:.2f}x\n"
+            f"检测一致性: {report['agreement'] * 100:.1f}% (FP32 {report['fp32_boxes']} 框 / INT8 {report['int8_boxes']} 框)\n\n"
+            f"是否切换到 INT8 模型?"
+        )
+        if reply == QMessageBox.Yes:
+            self.combo_backend.setCurrentIndex(self.combo_backend.findData("onnx_int8"))
+            self.save_settings()
+
+    def on_quantization_error(self, error_message):
+        self.btn_quantize.setEnabled(True)
+        self.lbl_quant_status.setText("量化失败")
+        QMessageBox.warning(self, "INT8 量化", error_message)
+
+    def refresh_runtime_stats(self):
+        # Only refresh while the settings tab is visible
+        if not self.settings_tab.isVisible():
+            return
+
+        lines = []
+        for m in get_model_pool().stats():
+            lines.append(
+                f"模型: {os.path.basename(m['model_path'])} | 设备: {m['device']} | 后端: {m['backend']} | "
+                f"引用: {m['ref_count']} | 内存: {m['memory_bytes'] / 1024 / 1024:.1f} MB | 推理次数: {m['inference_count']}"
+            )
+        if not lines:
+            lines.append("暂无已加载模型")
+
+        cache = get_result_cache().stats()
+        lines.append(f"结果缓存: 命中 {cache['hits']} / 未命中 {cache['misses']} ({cache['hit_ratio'] * 100:.1f}%) | "
+                     f"条目 {cache['entries']} | 内存: {cache['bytes'] / 1024 / 1024:.1f} MB")
+
+        scheduler = self.inference_scheduler
+        if scheduler and (scheduler.is_running() or scheduler.error):
+            if scheduler.error:
+                lines.append(f"多路调度: 模型加载失败 ({scheduler.error})")
+            sched = scheduler.stats()
+            lines.append(f"多路调度: 平均批次 {sched['avg_batch']:.2f} 帧")
+            for s in sched['sources']:
+                lines.append(f"  {s['name']} (优先级 {s['priority']:g}): {s['fps']:.1f} FPS | 排队 {s['wait_ms']:.1f} ms | "
+                             f"已处理 {s['processed']} | 丢弃 {s['dropped']}")
+
+        for source, recorder in self.recorders.items():
+            r = recorder.stats()
+            lines.append(f"录像 {source}: 已写入 {r['written']} 帧 | 丢弃 {r['dropped']} | 队列 {r['queued']} | "
+                         f"分段 {r['segments']} ({os.path.basename(r['current_file'] or '')})")
+
+        for source, buffer in self.clip_buffers.items():
+            c = buffer.stats()
+            state = "录制中" if c['recording'] else f"缓冲 {c['buffered_frames']} 帧 ({c['buffer_bytes'] / 1024 / 1024:.1f} MB)"
+            lines.append(f"事件片段 {source}: {state} | 已保存 {c['clips']} | 丢弃 {c['dropped']}")
+
+        for name, thread in (("摄像头", self.video_thread), ("HTTP 监控", self.http_thread), ("RTSP 监控", self.rtsp_thread),
+                             ("MQTT 服务端", self.mqtt_inference_thread)):
+            if thread and thread.isRunning():
+                lines.extend(self.format_thread_stats(name, thread.get_stats()))
+
+        if self.mqtt_server and self.mqtt_server.is_running():
+            clients = sorted(self.mqtt_server.get_client_stats(), key=lambda c: c['queued_bytes'], reverse=True)
+            for c in clients[:10]:
+                lines.append(f"MQTT 客户端 {c['id']} ({c['address']}): 队列 {c['queued']} 包 "
+                             f"({c['queued_bytes'] / 1024:.0f} KB, 峰值 {c['max_queued']}) | 已发送 {c['sent_packets']} | "
+                             f"丢弃 {c['dropped']}")
+                if c['inflight'] or c['qos_pending'] or c['retries'] or c['duplicates']:
+                    lines.append(f"  QoS: 未确认 {c['inflight']} | 等待窗口 {c['qos_pending']} | 重发 {c['retries']} | "
+                                 f"收到重复包 {c['duplicates']}")
+        self.lbl_runtime_stats.setText("\n".join(lines))
+
+    def format_thread_stats(self, name, stats):
+        lines = []
+        pipeline = stats.get('pipeline')
+        if pipeline:
+            lines.append(f"{name}: 采集 {pipeline['capture_fps']:.1f} FPS | 推理 {pipeline['inference_fps']:.1f} FPS | "
+                         f"帧延迟 {pipeline['frame_age_ms']:.0f} ms | 丢弃旧帧 {pipeline['dropped']}")
+            if pipeline.get('display_latency_ms'):
+                lines.append(f"{name}: 采集到显示延迟 {pipeline['display_latency_ms']:.0f} ms")
+            if pipeline.get('skipped_decode'):
+                lines.append(f"{name}: 未转换的旧帧 {pipeline['skipped_decode']}")
+        motion = stats.get('motion')
+        if motion:
+            lines.append(f"{name}: 运动检测跳过推理 {motion['skipped']}/{motion['checked']} 帧 "
+                         f"(节省 {motion['saved_ratio'] * 100:.1f}%)")
+        tracking = stats.get('tracking')
+        if tracking:
+            lines.append(f"{name}: 跟踪目标 {tracking['tracks']} 个 | 检测帧 {tracking['detected_frames']} | "
+                         f"跟踪帧 {tracking['tracked_frames']} ({tracking['tracked_ratio'] * 100:.1f}%)")
+        return lines
+
     def show_gpu_error_dialog(self, error_message):
         error_dialog = QMessageBox(self)
         error_dialog.setIcon(QMessageBox.Warning)
@@ -1078,7 +1907,10 @@ class MainWindow(QMainWindow):
             model_path=self.config_manager.get("yolo.model_path", "yolov8n.pt"),
             conf_threshold=self.config_manager.get("yolo.conf_threshold", 0.5),
             classes_dict=self.config_manager.classes,
-            device=device
+            device=device,
+            batch_size=self.config_manager.get("yolo.batch_size", 8),
+            backend=self.config_manager.get("yolo.backend", "torch"),
+            tiling_config=self.config_manager.get("tiling", {})
         )
         
         self.batch_inference_thread.progress_updated.connect(self.on_batch_progress)
@@ -1100,15 +1932,15 @@ class MainWindow(QMainWindow):
         
         self.batch_inference_thread.start()
     
-    def on_batch_progress(self, current, total, message):
+    def on_batch_progress(self, current, total, message, throughput):
         self.batch_progress.setValue(current)
-        self.batch_progress_label.setText(f"{message} ({current}/{total})")
+        self.batch_progress_label.setText(f"{message} ({current}/{total}) - {throughput:.1f} 张/秒")
     
-    def on_batch_result(self, filename, original_image, annotated_image, detections):
+    def on_batch_result(self, filename, original_image, detections):
+        # Only detections are kept; the annotated image is drawn when a result is shown
         result = {
             'filename': filename,
             'original_image': original_image,
-            'annotated_image': annotated_image,
             'detections': detections
         }
         self.batch_results.append(result)
@@ -1140,7 +1972,7 @@ class MainWindow(QMainWindow):
         if 0 <= index < len(self.batch_results):
             result = self.batch_results[index]
             self.local_display_orig.update_image(result['original_image'])
-            self.local_display_res.update_image(result['annotated_image'])
+            self.show_detections(self.local_display_res, result['original_image'], result['detections'])
             
             if result['detections']:
                 self.log_result(f"批量推理[{index+1}]", result['detections'])
@@ -1255,10 +2087,22 @@ class MainWindow(QMainWindow):
             self.video_thread.stop()
         if self.http_thread:
             self.http_thread.stop()
+        if self.rtsp_thread:
+            self.rtsp_thread.stop()
         if self.mqtt_worker:
             self.mqtt_worker.stop()
         if self.mqtt_inference_thread:
             self.mqtt_inference_thread.stop()
         if self.batch_inference_thread:
             self.batch_inference_thread.stop()
+        if self.video_file_thread:
+            self.video_file_thread.stop()
+        if self.quantization_thread:
+            self.quantization_thread.wait()
+        if self.model_swap_thread:
+            self.model_swap_thread.wait()
+        if self.inference_scheduler:
+            self.inference_scheduler.stop()
+        self.stop_recorders()
+        self.stop_clip_buffers()
         event.accept()